@@ -0,0 +1,163 @@
+"""
+Structured access log and non-blocking log handlers
+
+One JSON record per request from a pure ASGI middleware. Handlers of the
+root and uvicorn loggers are moved behind a QueueHandler, so writing log
+lines happens in a listener thread instead of on the event loop.
+"""
+import os
+import json
+import time
+import random
+import logging
+import logging.handlers
+import queue
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode
+
+logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("access")
+
+# Fraction of successful (2xx/3xx) requests logged, errors and slow requests are always logged
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0"))
+ACCESS_LOG_SLOW_MS = float(os.getenv("ACCESS_LOG_SLOW_MS", "1000"))
+# Successful requests to these paths are never logged (probes and scrapes)
+ACCESS_LOG_SKIP_PATHS = {
+    path.strip() for path in os.getenv("ACCESS_LOG_SKIP_PATHS", "/health,/metrics").split(",") if path.strip()
+}
+
+REDACTED = "[REDACTED]"
+# Query parameters and path parameters carrying credentials
+SENSITIVE_PARAMS = {"hash", "initdata", "tgwebappdata", "token", "password", "secret", "path_secret"}
+
+# Loggers whose handlers are moved to the listener thread
+QUEUED_LOGGERS = ("", "uvicorn", "uvicorn.access", "uvicorn.error", "tracing.spans")
+
+_listeners: list[logging.handlers.QueueListener] = []
+
+
+def start_log_queue() -> None:
+    """Move handlers of QUEUED_LOGGERS behind queues drained by listener threads"""
+    if _listeners:
+        return
+
+    for name in QUEUED_LOGGERS:
+        target = logging.getLogger(name)
+        handlers = [h for h in target.handlers if not isinstance(h, logging.handlers.QueueHandler)]
+        if not handlers:
+            continue
+
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        for handler in handlers:
+            target.removeHandler(handler)
+        target.addHandler(logging.handlers.QueueHandler(log_queue))
+        listener.start()
+        _listeners.append(listener)
+
+
+def stop_log_queue() -> None:
+    """Flush queued records and put the original handlers back"""
+    while _listeners:
+        listener = _listeners.pop()
+        listener.stop()
+
+        for name in QUEUED_LOGGERS:
+            target = logging.getLogger(name)
+            for handler in list(target.handlers):
+                if isinstance(handler, logging.handlers.QueueHandler) and handler.queue is listener.queue:
+                    target.removeHandler(handler)
+                    for original in listener.handlers:
+                        target.addHandler(original)
+
+
+def redact_query(query_string: str) -> str:
+    """Replace values of credential query parameters"""
+    if not query_string:
+        return ""
+    params = parse_qsl(query_string, keep_blank_values=True)
+    return urlencode([
+        (key, REDACTED if key.lower() in SENSITIVE_PARAMS else value)
+        for key, value in params
+    ], safe="[]")
+
+
+def redact_path(path: str, path_params: dict) -> str:
+    """Replace path segments that are credentials (e.g. the webhook secret)"""
+    for name, value in path_params.items():
+        if name.lower() in SENSITIVE_PARAMS and value:
+            path = path.replace(str(value), REDACTED)
+    return path
+
+
+def _client_address(scope: dict, headers: dict) -> Optional[str]:
+    """Client address, nginx passes the original one in X-Real-IP"""
+    real_ip = headers.get(b"x-real-ip")
+    if real_ip:
+        return real_ip.decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else None
+
+
+def _should_log(path: str, status_code: int, duration_ms: float) -> bool:
+    if status_code >= 400 or duration_ms >= ACCESS_LOG_SLOW_MS:
+        return True
+    if path in ACCESS_LOG_SKIP_PATHS:
+        return False
+    return ACCESS_LOG_SAMPLE_RATE >= 1 or random.random() < ACCESS_LOG_SAMPLE_RATE
+
+
+class AccessLogMiddleware:
+    """
+    Log one structured record per HTTP request
+
+    Headers are never logged, credentials in the query string and path are
+    redacted. Successful requests are sampled with ACCESS_LOG_SAMPLE_RATE.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        response_bytes = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            if _should_log(scope["path"], status_code, duration_ms):
+                self._log(scope, status_code, duration_ms, response_bytes)
+
+    def _log(self, scope: dict, status_code: int, duration_ms: float, response_bytes: int) -> None:
+        headers = dict(scope.get("headers") or [])
+        route = scope.get("route")
+
+        record = {
+            "method": scope["method"],
+            "path": redact_path(scope["path"], scope.get("path_params") or {}),
+            "route": route.path if route is not None else None,
+            "query": redact_query(scope.get("query_string", b"").decode("latin-1")),
+            "status": status_code,
+            "duration_ms": round(duration_ms, 2),
+            "bytes": response_bytes,
+            "client": _client_address(scope, headers),
+            "user_agent": headers.get(b"user-agent", b"").decode("latin-1"),
+            "trace_id": (scope.get("state") or {}).get("trace_id"),
+        }
+
+        level = logging.ERROR if status_code >= 500 else logging.WARNING if status_code >= 400 else logging.INFO
+        access_logger.log(level, json.dumps(record, ensure_ascii=False, separators=(",", ":")))
@@ -1,18 +1,153 @@
 import os
+import hmac
+import json
+import time
+import base64
+import hashlib
 import logging
-from fastapi import Header, HTTPException, status, Depends
-from aiogram.utils.web_app import safe_parse_webapp_init_data
-from database import get_user
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import parse_qsl
+from fastapi import Header, HTTPException, status
+from metrics import cache_hit, cache_miss
+from tracing import span
 
 logger = logging.getLogger(__name__)
 
+# initData older than this (by auth_date) is rejected
+INIT_DATA_MAX_AGE = int(os.getenv("INIT_DATA_MAX_AGE", "86400"))
+# Verified initData strings are remembered for this long (and at most until max age)
+INIT_DATA_CACHE_TTL = int(os.getenv("INIT_DATA_CACHE_TTL", "3600"))
+INIT_DATA_CACHE_SIZE = int(os.getenv("INIT_DATA_CACHE_SIZE", "10000"))
+
+# Lifetime of session tokens issued by /auth/session
+SESSION_TOKEN_TTL = int(os.getenv("SESSION_TOKEN_TTL", "900"))
+
+# HMAC keys derived from BOT_TOKEN, see init_auth()
+_secret_key: Optional[bytes] = None
+_session_key: Optional[bytes] = None
+
+# sha256 of initData -> (user_id, expires_at), least recently used first
+_verified_init_data: OrderedDict[bytes, tuple[int, float]] = OrderedDict()
+
+
+def init_auth() -> None:
+    """
+    Derive the WebAppData secret key from BOT_TOKEN
+
+    Called once at startup, verify_telegram_init_data falls back to calling
+    it lazily. Leaves the key unset if BOT_TOKEN is missing
+    """
+    global _secret_key, _session_key
+
+    bot_token = os.getenv("BOT_TOKEN")
+    if not bot_token:
+        logger.error("BOT_TOKEN not found in environment")
+        return
+
+    _secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    _session_key = hmac.new(b"SessionToken", bot_token.encode(), hashlib.sha256).digest()
+    _verified_init_data.clear()
+
+
+def _sign_session(payload: str) -> str:
+    """Compute truncated base64url HMAC of the session token payload"""
+    digest = hmac.new(_session_key, payload.encode(), hashlib.sha256).digest()[:16]
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def issue_session_token(user_id: int) -> tuple[str, int]:
+    """
+    Issue a signed session token for a verified user
+
+    Token format: <user_id>.<expires_at>.<signature>
+
+    The token only proves who the user is, like initData. Role and mode are
+    read from the user row on every request, so changing them takes effect
+    without revoking tokens
+
+    Returns:
+        tuple: token and its expiry (unix time)
+    """
+    if _session_key is None:
+        init_auth()
+
+    expires_at = int(time.time()) + SESSION_TOKEN_TTL
+    payload = f"{user_id}.{expires_at}"
+    return f"{payload}.{_sign_session(payload)}", expires_at
+
+
+def _verify_session_token(token: str) -> int:
+    """
+    Verify session token and return user_id
+
+    Raises:
+        ValueError: If token is malformed, forged or expired
+    """
+    payload, _, signature = token.rpartition(".")
+    if _session_key is None or not hmac.compare_digest(_sign_session(payload), signature):
+        raise ValueError("Invalid signature")
+
+    user_id, expires_at = payload.split(".")
+
+    if int(expires_at) <= time.time():
+        raise ValueError("Token expired")
+
+    return int(user_id)
+
+
+def _init_data_cache_key(init_data_str: str) -> bytes:
+    """Key of _verified_init_data, a fixed-size digest instead of the (up to a few KB) initData string"""
+    return hashlib.sha256(init_data_str.encode()).digest()
+
+
+def _parse_and_verify(init_data_str: str, secret_key: bytes) -> tuple[int, int]:
+    """
+    Check initData signature and extract user_id and auth_date
+
+    Same algorithm as aiogram's check_webapp_signature, but with the secret
+    key derived once instead of on every call
+
+    Raises:
+        ValueError: If initData is malformed or the signature doesn't match
+    """
+    try:
+        params = dict(parse_qsl(init_data_str, strict_parsing=True))
+    except ValueError:
+        raise ValueError("Malformed initData")
+
+    received_hash = params.pop("hash", None)
+    if not received_hash:
+        raise ValueError("Missing hash")
+
+    data_check_string = "\n".join(f"{key}={value}" for key, value in sorted(params.items()))
+    expected_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected_hash, received_hash):
+        raise ValueError("Hash mismatch")
+
+    try:
+        auth_date = int(params["auth_date"])
+    except (KeyError, ValueError):
+        raise ValueError("Missing auth_date")
+
+    try:
+        user_id = int(json.loads(params["user"])["id"])
+    except (KeyError, ValueError, TypeError):
+        user_id = None
+
+    return user_id, auth_date
+
 
 async def verify_telegram_init_data(authorization: str = Header(...)) -> int:
     """
-    Verify Telegram WebApp initData and extract user_id
+    Verify Telegram WebApp initData or session token and extract user_id
+
+    Verified initData strings are cached (bounded, with TTL), so repeated
+    requests of the same Mini App session cost a dict lookup
 
     Args:
         authorization: Authorization header in format "tma <initData>"
+            or "Bearer <token>" with a token from /auth/session
 
     Returns:
         int: Telegram user_id
@@ -20,6 +155,17 @@ async def verify_telegram_init_data(authorization: str = Header(...)) -> int:
     Raises:
         HTTPException: If authorization is invalid
     """
+    # Session token - a single MAC check
+    if authorization and authorization.startswith("Bearer "):
+        try:
+            return _verify_session_token(authorization[7:])
+        except ValueError as e:
+            logger.warning(f"Invalid session token: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid session token"
+            )
+
     # Check authorization header format
     if not authorization or not authorization.startswith("tma "):
         logger.warning("Invalid authorization header format")
@@ -29,7 +175,7 @@ async def verify_telegram_init_data(authorization: str = Header(...)) -> int:
         )
 
     # Extract initData from header
-    init_data_str = authorization.replace("tma ", "", 1)
+    init_data_str = authorization[4:]
 
     if not init_data_str:
         logger.warning("Empty initData")
@@ -38,35 +184,32 @@ async def verify_telegram_init_data(authorization: str = Header(...)) -> int:
             detail="Empty initData"
         )
 
-    # Get bot token from environment
-    bot_token = os.getenv("BOT_TOKEN")
-    if not bot_token:
-        logger.error("BOT_TOKEN not found in environment")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Server configuration error"
-        )
+    now = time.time()
 
-    try:
-        # Validate initData signature using aiogram
-        # safe_parse_webapp_init_data returns WebAppInitData object
-        init_data = safe_parse_webapp_init_data(
-            token=bot_token,
-            init_data=init_data_str
-        )
+    # Fast path - initData already verified
+    cache_key = _init_data_cache_key(init_data_str)
+    cached = _verified_init_data.get(cache_key)
+    if cached is not None:
+        user_id, expires_at = cached
+        if expires_at > now:
+            _verified_init_data.move_to_end(cache_key)
+            cache_hit("init_data")
+            return user_id
+        del _verified_init_data[cache_key]
+
+    cache_miss("init_data")
 
-        # Extract user_id
-        if not init_data.user:
-            logger.warning("No user data in initData")
+    if _secret_key is None:
+        init_auth()
+        if _secret_key is None:
             raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="No user data"
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Server configuration error"
             )
 
-        user_id = init_data.user.id
-        logger.info(f"Successfully authenticated user {user_id}")
-        return user_id
-
+    try:
+        with span("cache.init_data.miss"):
+            user_id, auth_date = _parse_and_verify(init_data_str, _secret_key)
     except ValueError as e:
         logger.warning(f"Invalid initData signature: {e}")
         raise HTTPException(
@@ -74,37 +217,24 @@ async def verify_telegram_init_data(authorization: str = Header(...)) -> int:
             detail="Invalid initData signature"
         )
 
-
-async def verify_admin_mode(user_id: int = Depends(verify_telegram_init_data)) -> int:
-    """
-    Verify that user has ADMIN role
-
-    Args:
-        user_id: Telegram user_id from verify_telegram_init_data dependency
-
-    Returns:
-        int: Telegram user_id
-
-    Raises:
-        HTTPException: If user doesn't have ADMIN role
-    """
-    # Get user from database
-    user = await get_user(user_id)
-
-    if not user:
-        logger.warning(f"User {user_id} not found in database")
+    # Signed initData can be replayed, so only accept it within max age
+    if auth_date + INIT_DATA_MAX_AGE <= now:
+        logger.warning(f"Expired initData (auth_date={auth_date})")
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="initData expired"
         )
 
-    # Check if user has ADMIN role (not mode!)
-    if user.get("role") != "ADMIN":
-        logger.warning(f"User {user_id} attempted to access ADMIN endpoint with role={user.get('role')}")
+    if user_id is None:
+        logger.warning("No user data in initData")
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin role required"
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="No user data"
         )
 
-    logger.info(f"User {user_id} authenticated with ADMIN role")
+    _verified_init_data[cache_key] = (user_id, min(now + INIT_DATA_CACHE_TTL, auth_date + INIT_DATA_MAX_AGE))
+    if len(_verified_init_data) > INIT_DATA_CACHE_SIZE:
+        _verified_init_data.popitem(last=False)
+
+    logger.info(f"Successfully authenticated user {user_id}")
     return user_id
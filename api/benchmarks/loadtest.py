@@ -0,0 +1,371 @@
+"""
+Load test of the API against a synthetic dataset (see seed.py)
+
+Boots fastapi_app with uvicorn in a background thread against a temporary
+SQLite database, drives it over real HTTP connections and writes latency
+percentiles per endpoint as JSON, so runs on different commits can be
+compared.
+
+Telegram initData is signed with a test bot token. Telegram and SMTP are
+replaced with in-process stand-ins that only wait NOTIFY_LATENCY_MS, so
+checkout includes notification delivery without leaving the machine.
+
+Usage (from the api directory):
+    python -m benchmarks.loadtest [--goods 10000 --images 50000 --orders 200000]
+        [--scenarios catalog_browse,search,checkout,admin_orders]
+        [--duration 10] [--concurrency 10] [--db path/to/reused.db]
+        [--output loadtest.json]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import platform
+import subprocess
+import threading
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+BOT_TOKEN = "123456789:BENCHMARK-TOKEN-not-a-real-bot"
+NOTIFY_LATENCY_MS = 50
+
+
+def _configure_environment(workdir: Path, db_path: Path) -> None:
+    """Point the app at the temporary directory (must run before importing it)"""
+    os.environ["DB_PATH"] = str(db_path)
+    os.environ["UPLOAD_DIR"] = str(workdir / "uploads")
+    os.environ["UPLOAD_TMP_DIR"] = str(workdir / "tmp")
+    os.environ["IMAGE_CACHE_DIR"] = str(workdir / "cache")
+    os.environ["BOT_TOKEN"] = BOT_TOKEN
+    os.environ.setdefault("ACCESS_LOG_SAMPLE_RATE", "0")
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def _add_notification_settings(db_path: Path) -> None:
+    """Notification settings, so checkout notifies the stand-ins"""
+    import sqlite3
+
+    stamp = datetime.now().isoformat()
+    connection = sqlite3.connect(db_path)
+    with connection:
+        connection.executemany(
+            "INSERT INTO settings (type, value, createstamp, changestamp, createuser, changeuser) VALUES (?, ?, ?, ?, 1, 1)",
+            [(key, value, stamp, stamp) for key, value in {
+                "MANAGER_CHAT_ID": "1",
+                "ORDER_EMAIL": "shop@localhost",
+                "ORDER_EMAIL_TO": "manager@localhost",
+                "ORDER_EMAIL_PASSWORD": "benchmark",
+                "SMTP_HOST": "localhost",
+                "SMTP_PORT": "587"
+            }.items()]
+        )
+    connection.close()
+
+
+def _install_stand_ins(latency: float) -> None:
+    """Replace the Telegram client and SMTP used by notifications.py"""
+    import smtplib
+    import notifications
+
+    class StandInBot:
+        def __init__(self, token: str):
+            self.session = self
+
+        async def send_message(self, **kwargs):
+            await asyncio.sleep(latency)
+
+        async def close(self):
+            pass
+
+    class StandInSMTP:
+        def __init__(self, host: str, port: int):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+        def starttls(self):
+            pass
+
+        def login(self, user: str, password: str):
+            time.sleep(latency)
+
+        def send_message(self, msg):
+            pass
+
+    notifications.Bot = StandInBot
+    smtplib.SMTP = StandInSMTP
+
+
+def _sign_init_data(user_id: int) -> str:
+    """Telegram WebApp initData for the user, signed with the test bot token"""
+    import hashlib
+    import hmac
+    from urllib.parse import urlencode
+
+    data = {
+        "auth_date": str(int(time.time())),
+        "query_id": f"bench{user_id}",
+        "user": json.dumps({"id": user_id, "first_name": "Bench"})
+    }
+    check_string = "\n".join(f"{key}={value}" for key, value in sorted(data.items()))
+    secret = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest()
+    data["hash"] = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    return "tma " + urlencode(data)
+
+
+class Server:
+    """uvicorn serving fastapi_app in a background thread"""
+
+    def __init__(self, port: int):
+        import uvicorn
+        from fastapi_app import app
+
+        config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, name="uvicorn", daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *args):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+class Scenario:
+    """Weighted mix of requests one simulated client keeps sending"""
+
+    def __init__(self, name: str, steps: list[tuple[int, Callable[[random.Random], tuple]]]):
+        self.name = name
+        self.steps = steps
+
+
+def _scenarios(goods: int, orders: int, users: int) -> dict[str, Scenario]:
+    """Requests are (method, url, endpoint label, headers, json body)"""
+    from seed import ADMIN_ID, FIRST_USER_ID
+
+    admin = {"Authorization": _sign_init_data(ADMIN_ID)}
+    user_headers = [
+        {"Authorization": _sign_init_data(user_id)}
+        for user_id in range(FIRST_USER_ID, FIRST_USER_ID + min(users, 200))
+    ]
+
+    def user(rng):
+        return rng.choice(user_headers)
+
+    def checkout(rng):
+        headers = user(rng)
+        user_id = FIRST_USER_ID + user_headers.index(headers)
+        body = {
+            "status": "NEW",
+            "user_id": user_id,
+            "delivery_type": rng.choice(["PICK_UP", "COURIER"]),
+            "delivery_address": "ул. Цветочная, 1",
+            "cart_items": [
+                {"good_id": good_id, "count": rng.choice([1, 1, 2])}
+                for good_id in rng.sample(range(1, goods + 1), rng.choice([1, 2, 3]))
+            ]
+        }
+        return "POST", "/orders", "POST /orders", {**headers, "Idempotency-Key": str(uuid.uuid4())}, body
+
+    return {
+        # Opening the Mini App: storefront data and the user's profile
+        "catalog_browse": Scenario("catalog_browse", [
+            (5, lambda rng: ("GET", "/goods", "GET /goods", None, None)),
+            (2, lambda rng: ("GET", "/categories", "GET /categories", None, None)),
+            (2, lambda rng: ("GET", "/promo", "GET /promo", None, None)),
+            (1, lambda rng: ("GET", "/shop/addresses", "GET /shop/addresses", None, None)),
+            (2, lambda rng: ("GET", "/users/me", "GET /users/me", user(rng), None)),
+        ]),
+        # Search and category filters run in the client over the goods list,
+        # so searching costs the server fresh loads of the list it filters
+        "search": Scenario("search", [
+            (3, lambda rng: ("GET", "/goods", "GET /goods", None, None)),
+            (1, lambda rng: ("GET", "/categories", "GET /categories", None, None)),
+        ]),
+        "checkout": Scenario("checkout", [
+            (1, lambda rng: ("GET", "/users/me", "GET /users/me", user(rng), None)),
+            (2, checkout),
+            (1, lambda rng: ("GET", "/orders/my", "GET /orders/my", user(rng), None)),
+        ]),
+        "admin_orders": Scenario("admin_orders", [
+            (1, lambda rng: ("GET", "/orders", "GET /orders", admin, None)),
+            (3, lambda rng: ("GET", "/orders?status=NEW", "GET /orders?status", admin, None)),
+            (3, lambda rng: ("GET", f"/orders/{rng.randint(1, max(orders, 1))}", "GET /orders/{order_id}", admin, None)),
+            (2, lambda rng: ("GET", "/orders/stats/daily", "GET /orders/stats/daily", admin, None)),
+            (1, lambda rng: ("GET", "/orders/stats/goods", "GET /orders/stats/goods", admin, None)),
+        ]),
+    }
+
+
+def _percentile(ordered: list[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _summarize(latencies: dict[str, list[float]], errors: dict[str, int], elapsed: float) -> dict:
+    endpoints = {}
+    for label in sorted(set(latencies) | set(errors)):
+        ordered = sorted(latencies.get(label, []))
+        endpoints[label] = {
+            "requests": len(ordered),
+            "errors": errors.get(label, 0),
+            "throughput_rps": round(len(ordered) / elapsed, 2),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else 0.0,
+            "p50_ms": round(_percentile(ordered, 0.5) * 1000, 2),
+            "p95_ms": round(_percentile(ordered, 0.95) * 1000, 2),
+            "p99_ms": round(_percentile(ordered, 0.99) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0
+        }
+
+    total = sum(len(values) for values in latencies.values())
+    return {
+        "requests": total,
+        "errors": sum(errors.values()),
+        "duration_s": round(elapsed, 2),
+        "throughput_rps": round(total / elapsed, 2),
+        "endpoints": endpoints
+    }
+
+
+async def _run_scenario(base_url: str, scenario: Scenario, duration: float, concurrency: int, seed: int) -> dict:
+    """Run concurrent clients for the duration, each picking weighted steps"""
+    import aiohttp
+
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    weights = [weight for weight, _ in scenario.steps]
+    builders = [builder for _, builder in scenario.steps]
+    deadline = time.monotonic() + duration
+
+    async def client(session: aiohttp.ClientSession, rng: random.Random):
+        while time.monotonic() < deadline:
+            method, url, label, headers, body = rng.choices(builders, weights)[0](rng)
+            start = time.perf_counter()
+            try:
+                async with session.request(method, base_url + url, headers=headers, json=body) as response:
+                    await response.read()
+                    ok = response.status < 400
+            except aiohttp.ClientError:
+                ok = False
+            if ok:
+                latencies[label].append(time.perf_counter() - start)
+            else:
+                errors[label] += 1
+
+    start = time.monotonic()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(
+            client(session, random.Random(f"{seed}-{scenario.name}-{i}"))
+            for i in range(concurrency)
+        ))
+    return _summarize(latencies, errors, time.monotonic() - start)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _free_port() -> int:
+    import socket
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--goods", type=int, default=10000)
+    parser.add_argument("--images", type=int, default=50000)
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--scenarios", default="catalog_browse,search,checkout,admin_orders")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--notify-latency-ms", type=float, default=NOTIFY_LATENCY_MS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", help="reuse this database file, generated on first use")
+    parser.add_argument("--output", default="-", help="JSON report path, - for stdout")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="flower-shop-loadtest-"))
+    db_path = Path(args.db).resolve() if args.db else workdir / "loadtest.db"
+    generate = not db_path.exists()
+    _configure_environment(workdir, db_path)
+
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+
+    import seed
+
+    try:
+        if generate:
+            started = time.monotonic()
+            dataset = asyncio.run(seed.seed_database(
+                str(db_path), goods=args.goods, images=args.images, orders=args.orders,
+                users=args.users, seed=args.seed
+            ))
+            _add_notification_settings(db_path)
+            print(f"Generated dataset in {time.monotonic() - started:.1f}s", file=sys.stderr)
+        else:
+            # Sizes of the reused database, not of the arguments
+            dataset = seed.count_rows(str(db_path))
+
+        _install_stand_ins(args.notify_latency_ms / 1000)
+        scenarios = _scenarios(dataset["goods"], dataset["orders"], dataset["user_info"] - 1)
+        port = _free_port()
+
+        results = {}
+        with Server(port):
+            for name in args.scenarios.split(","):
+                print(f"Running {name} for {args.duration:g}s...", file=sys.stderr)
+                results[name] = asyncio.run(_run_scenario(
+                    f"http://127.0.0.1:{port}", scenarios[name], args.duration, args.concurrency, args.seed
+                ))
+
+        report = {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dataset": {**dataset, "seed": args.seed, "reused": not generate},
+            "concurrency": args.concurrency,
+            "notify_latency_ms": args.notify_latency_ms,
+            "scenarios": results
+        }
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if args.output == "-":
+            print(output)
+        else:
+            Path(args.output).write_text(output + "\n")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
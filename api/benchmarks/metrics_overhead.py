@@ -0,0 +1,103 @@
+"""
+Overhead of metrics collection
+
+Compares a bare ASGI app with the same app wrapped in MetricsMiddleware,
+and database calls with and without the metrics call observer, against a
+temporary database.
+
+Usage (from the api directory):
+    python -m benchmarks.metrics_overhead [--requests 20000] [--queries 2000]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import database
+import metrics
+from metrics import MetricsMiddleware
+
+
+ROUNDS = 5
+
+
+class _Route:
+    path = "/benchmark/{item_id}"
+
+
+async def _endpoint(scope, receive, send):
+    """Smallest possible ASGI app, sets the route like the FastAPI router does"""
+    scope["route"] = _Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    pass
+
+
+async def _time_requests(app, count: int) -> float:
+    """Seconds per request"""
+    start = time.perf_counter()
+    for _ in range(count):
+        scope = {"type": "http", "method": "GET", "path": "/benchmark/1", "headers": []}
+        await app(scope, _receive, _send)
+    return (time.perf_counter() - start) / count
+
+
+async def _time_queries(count: int) -> float:
+    """Seconds per database call"""
+    start = time.perf_counter()
+    for _ in range(count):
+        await database.get_user(1)
+    return (time.perf_counter() - start) / count
+
+
+async def run(requests: int, queries: int) -> None:
+    # Warm up label children so the first request doesn't pay for creating them
+    await _time_requests(MetricsMiddleware(_endpoint), 100)
+
+    bare = await _time_requests(_endpoint, requests)
+    wrapped = await _time_requests(MetricsMiddleware(_endpoint), requests)
+    print(f"ASGI request:  bare {bare * 1e6:8.2f} us, with metrics {wrapped * 1e6:8.2f} us, "
+          f"overhead {(wrapped - bare) * 1e6:6.2f} us")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "benchmark.db")
+        await database.init_db()
+        await database.add_or_update_user(1, "benchmark")
+
+        await _time_queries(100)
+
+        # Alternate rounds and keep the best of each, disk and thread
+        # scheduling noise is larger than the difference being measured
+        observers = list(database._call_observers)
+        plain = observed = float("inf")
+        for _ in range(ROUNDS):
+            database._call_observers.clear()
+            plain = min(plain, await _time_queries(queries // ROUNDS))
+            database._call_observers.extend(observers)
+            observed = min(observed, await _time_queries(queries // ROUNDS))
+
+    print(f"DB call:       bare {plain * 1e6:8.2f} us, with metrics {observed * 1e6:8.2f} us, "
+          f"overhead {(observed - plain) * 1e6:6.2f} us")
+
+    if metrics.MULTIPROC_DIR:
+        print("Note: PROMETHEUS_MULTIPROC_DIR is set, numbers include mmap file writes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.queries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Micro-benchmarks of hot database and auth functions
+
+Times each function against databases generated by seed.py at a few sizes
+(every table grows by the same scale factor) and compares the results with
+benchmarks/baselines.json. Fails when a function got slower than its
+baseline by more than the tolerance (a tighter one for calls taking
+milliseconds), or when its time grows faster with the
+dataset than its expected complexity allows (e.g. a linear scan turning
+quadratic). The exponent check doesn't depend on the machine, baselines do:
+re-record them with --update-baselines when running on a different machine.
+
+Usage (from the api directory):
+    python -m benchmarks.micro [--sizes small,medium,large] [--only get_orders,create_order]
+        [--tolerance 1.0] [--slow-tolerance 0.5] [--curves curves.json] [--update-baselines]
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import logging
+import platform
+import sqlite3
+import tempfile
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from benchmarks.loadtest import BOT_TOKEN, _git_commit, _sign_init_data
+
+BASELINES_PATH = Path(__file__).resolve().parent / "baselines.json"
+ROUNDS = 7
+# Allowed slowdown over the baseline: run to run noise of the small
+# benchmarks reaches +50% on shared machines, complexity regressions are
+# caught by the exponent check regardless of the tolerance
+DEFAULT_TOLERANCE = 1.0
+# Calls taking at least SLOW_CALL_SECONDS (queries over a dataset) stay
+# within about +35% between runs, so they get a tighter tolerance
+SLOW_CALL_SECONDS = 0.001
+DEFAULT_SLOW_TOLERANCE = 0.5
+
+SIZES = {
+    "small": 1,
+    "medium": 4,
+    "large": 16,
+}
+# Dataset at scale 1
+BASE_DATASET = {"goods": 250, "images": 1000, "users": 500, "orders": 1000}
+
+
+def _dataset(scale: int) -> dict:
+    return {table: rows * scale for table, rows in BASE_DATASET.items()}
+
+
+class Benchmark:
+    """
+    A function call timed at every dataset size
+
+    setup(db_path, rng) prepares what the calls need and returns the call,
+    an async function of the call index. max_exponent bounds how time may
+    grow with the dataset: t ~ scale ** exponent
+    """
+
+    def __init__(self, name: str, calls: int, max_exponent: float,
+                 setup: Callable[[str, random.Random], Callable[[int], Awaitable]]):
+        self.name = name
+        self.calls = calls
+        self.max_exponent = max_exponent
+        self.setup = setup
+
+
+def _query(db_path: str, sql: str, params: tuple = ()) -> list[tuple]:
+    connection = sqlite3.connect(db_path)
+    try:
+        return connection.execute(sql, params).fetchall()
+    finally:
+        connection.close()
+
+
+def _setup_goods_by_status(db_path, rng):
+    import database
+    return lambda i: database.get_goods_by_status("NEW")
+
+
+def _setup_all_goods(db_path, rng):
+    import database
+    return lambda i: database.get_all_goods()
+
+
+def _setup_orders(db_path, rng):
+    import database
+    return lambda i: database.get_orders()
+
+
+def _setup_create_order(db_path, rng):
+    import database
+    goods = [row[0] for row in _query(db_path, "SELECT id FROM goods WHERE status = 'NEW'")]
+    buyers = [row[0] for row in _query(db_path, "SELECT id FROM user_info WHERE phone IS NOT NULL")]
+
+    def call(i):
+        user_id = rng.choice(buyers)
+        return database.create_order(
+            "NEW", user_id, "PICK_UP", "Самовывоз",
+            [{"good_id": good_id, "count": 1} for good_id in rng.sample(goods, 2)],
+            user_id
+        )
+    return call
+
+
+def _setup_images_order(db_path, rng):
+    import database
+    images: dict[int, list[str]] = {}
+    for good_id, image_url in _query(
+        db_path, "SELECT good_id, image_url FROM goods_images ORDER BY good_id, display_order"
+    ):
+        images.setdefault(good_id, []).append(image_url)
+    goods = [good_id for good_id, urls in images.items() if len(urls) > 1]
+
+    def call(i):
+        good_id = rng.choice(goods)
+        urls = images[good_id]
+        urls.reverse()
+        return database.update_images_order(good_id, urls)
+    return call
+
+
+def _setup_setting(db_path, rng):
+    import database
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+    connection = sqlite3.connect(db_path)
+    with connection:
+        connection.execute(
+            "INSERT OR IGNORE INTO settings (type, value, createstamp, changestamp) VALUES ('MANAGER_CHAT_ID', '1', ?, ?)",
+            (stamp, stamp)
+        )
+    connection.close()
+    return lambda i: database.get_setting_by_type("MANAGER_CHAT_ID")
+
+
+def _setup_verify(cached: bool):
+    def setup(db_path, rng):
+        import auth
+        users = [row[0] for row in _query(db_path, "SELECT id FROM user_info")]
+        headers = [_sign_init_data(rng.choice(users)) for _ in range(100)]
+        auth._verified_init_data.clear()
+
+        def call(i):
+            header = headers[i % len(headers)]
+            if not cached:
+                # Verify the signature on every call
+                auth._verified_init_data.pop(auth._init_data_cache_key(header[4:]), None)
+            return auth.verify_telegram_init_data(header)
+        return call
+    return setup
+
+
+BENCHMARKS = [
+    Benchmark("get_goods_by_status", 10, 1.25, _setup_goods_by_status),
+    Benchmark("get_all_goods", 10, 1.25, _setup_all_goods),
+    Benchmark("get_orders", 2, 1.25, _setup_orders),
+    Benchmark("create_order", 50, 0.3, _setup_create_order),
+    Benchmark("update_images_order", 50, 0.3, _setup_images_order),
+    Benchmark("get_setting_by_type", 200, 0.3, _setup_setting),
+    Benchmark("verify_telegram_init_data", 1000, 0.3, _setup_verify(cached=False)),
+    Benchmark("verify_telegram_init_data:cached", 1000, 0.3, _setup_verify(cached=True)),
+]
+
+
+async def _time(benchmark: Benchmark, db_path: str, seed: int) -> float:
+    """Seconds per call, best of ROUNDS"""
+    import database
+
+    database.DB_PATH = db_path
+    call = benchmark.setup(db_path, random.Random(f"{seed}-{benchmark.name}"))
+    await call(0)
+
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for i in range(benchmark.calls):
+            await call(i)
+        best = min(best, (time.perf_counter() - start) / benchmark.calls)
+    return best
+
+
+def _exponent(points: list[tuple[int, float]]) -> float:
+    """Least squares slope of log(time) over log(scale)"""
+    xs = [math.log(scale) for scale, _ in points]
+    ys = [math.log(seconds) for _, seconds in points]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    return (
+        sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+        / sum((x - mean_x) ** 2 for x in xs)
+    )
+
+
+async def run(sizes: list[str], benchmarks: list[Benchmark], workdir: Path, seed: int) -> tuple[dict, dict]:
+    """Seconds per call by benchmark and size, and rows generated per size"""
+    import seed as seeder
+
+    results: dict[str, dict[str, float]] = {benchmark.name: {} for benchmark in benchmarks}
+    datasets = {}
+    for size in sizes:
+        db_path = str(workdir / f"{size}.db")
+        started = time.monotonic()
+        datasets[size] = await seeder.seed_database(db_path, seed=seed, **_dataset(SIZES[size]))
+        print(f"Seeded {size} ({datasets[size]}) in {time.monotonic() - started:.1f}s", file=sys.stderr)
+
+        # In list order, so the benchmarks changing data run after the ones reading it
+        for benchmark in benchmarks:
+            results[benchmark.name][size] = await _time(benchmark, db_path, seed)
+    return results, datasets
+
+
+def _report(results: dict, baselines: dict, benchmarks: list[Benchmark], sizes: list[str],
+            tolerance: float, slow_tolerance: float) -> list[str]:
+    """Print the comparison table, returns the failures"""
+    failures = []
+    print(f"{'benchmark':34} {'size':7} {'us/call':>12} {'baseline':>12} {'change':>8}  exponent")
+    for benchmark in benchmarks:
+        timings = results[benchmark.name]
+        for size in sizes:
+            seconds = timings[size]
+            baseline = baselines.get(benchmark.name, {}).get(size)
+            change = ""
+            if baseline:
+                ratio = seconds / baseline - 1
+                change = f"{ratio:+.0%}"
+                if ratio > (slow_tolerance if baseline >= SLOW_CALL_SECONDS else tolerance):
+                    failures.append(f"{benchmark.name} [{size}] {seconds * 1e6:.1f} us, "
+                                    f"baseline {baseline * 1e6:.1f} us ({change})")
+            print(f"{benchmark.name:34} {size:7} {seconds * 1e6:12.1f} "
+                  f"{f'{baseline * 1e6:.1f}' if baseline else '-':>12} {change:>8}")
+
+        if len(sizes) > 1:
+            exponent = _exponent([(SIZES[size], timings[size]) for size in sizes])
+            verdict = "ok" if exponent <= benchmark.max_exponent else "TOO STEEP"
+            print(f"{'':34} {'':7} {'':>12} {'':>12} {'':>8}  {exponent:.2f} (max {benchmark.max_exponent}) {verdict}")
+            if exponent > benchmark.max_exponent:
+                failures.append(f"{benchmark.name} grows as scale^{exponent:.2f}, "
+                                f"expected at most scale^{benchmark.max_exponent}")
+    return failures
+
+
+def _curves(results: dict, datasets: dict, benchmarks: list[Benchmark], sizes: list[str]) -> dict:
+    """Time vs rows per benchmark"""
+    return {
+        benchmark.name: [
+            {"size": size, "scale": SIZES[size], "rows": datasets[size],
+             "seconds": results[benchmark.name][size]}
+            for size in sizes
+        ]
+        for benchmark in benchmarks
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(SIZES))
+    parser.add_argument("--only", help="comma separated benchmark names")
+    parser.add_argument("--tolerance", type=float, help="allowed slowdown over baseline, default from baselines file")
+    parser.add_argument("--slow-tolerance", type=float,
+                        help=f"allowed slowdown of calls taking over {SLOW_CALL_SECONDS * 1000:g} ms, default from baselines file")
+    parser.add_argument("--baselines", default=str(BASELINES_PATH))
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument("--curves", help="write scaling curves as JSON to this path, - for stdout")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    sizes = args.sizes.split(",")
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(unknown)}")
+    benchmarks = BENCHMARKS
+    if args.only:
+        names = args.only.split(",")
+        benchmarks = [benchmark for benchmark in BENCHMARKS if benchmark.name in names]
+        if len(benchmarks) != len(names):
+            parser.error(f"unknown benchmarks, choose from: {', '.join(b.name for b in BENCHMARKS)}")
+
+    with tempfile.TemporaryDirectory(prefix="flower-shop-micro-") as tmp:
+        workdir = Path(tmp)
+        os.environ["BOT_TOKEN"] = BOT_TOKEN
+        os.environ["UPLOAD_DIR"] = str(workdir / "uploads")
+        os.environ["IMAGE_CACHE_DIR"] = str(workdir / "cache")
+        os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+        logging.basicConfig(level=logging.WARNING)
+
+        results, datasets = asyncio.run(run(sizes, benchmarks, workdir, args.seed))
+
+    baselines_path = Path(args.baselines)
+    stored = json.loads(baselines_path.read_text()) if baselines_path.exists() else {}
+    tolerance = args.tolerance if args.tolerance is not None else stored.get("tolerance", DEFAULT_TOLERANCE)
+    slow_tolerance = (args.slow_tolerance if args.slow_tolerance is not None
+                      else stored.get("slow_tolerance", DEFAULT_SLOW_TOLERANCE))
+
+    if args.curves:
+        output = json.dumps(_curves(results, datasets, benchmarks, sizes), indent=2)
+        if args.curves == "-":
+            print(output)
+        else:
+            Path(args.curves).write_text(output + "\n")
+
+    # Compare with the baselines before they are replaced
+    failures = _report(
+        results, {} if args.update_baselines else stored.get("benchmarks", {}), benchmarks, sizes, tolerance, slow_tolerance
+    )
+
+    if args.update_baselines:
+        timings = stored.get("benchmarks", {})
+        for name, by_size in results.items():
+            timings.setdefault(name, {}).update({size: round(seconds, 9) for size, seconds in by_size.items()})
+        baselines_path.write_text(json.dumps({
+            # Baselines of functions changed after this commit need re-recording
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "tolerance": tolerance,
+            "slow_tolerance": slow_tolerance,
+            "benchmarks": timings
+        }, indent=2) + "\n")
+        print(f"Baselines written to {baselines_path}", file=sys.stderr)
+
+    if failures:
+        print("\nFAILED:\n  " + "\n  ".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
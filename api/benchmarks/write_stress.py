@@ -0,0 +1,336 @@
+"""
+Concurrent write stress test of the database layer
+
+Runs a mix of concurrent workers calling the real database functions
+against a database generated by seed.py: checkouts (create_order), /start
+(add_or_update_user), admin edits (update_good_card, update_good_status,
+update_order) and readers (get_goods_by_status, get_orders of a user).
+Every call opens its own connection like the API does, and --processes
+runs the mix in several processes like the API workers and the bot.
+
+A call failing with "database is locked" is retried up to --retries times
+with jittered backoff. The report has write TPS (committed write calls,
+so update_good_status counts two), lock errors, retries and
+latency percentiles (including retries) per operation, together with the
+connection settings, so DB_BUSY_TIMEOUT, DB_JOURNAL_MODE and
+DB_SYNCHRONOUS can be compared between runs. Rates are per second of the
+measured run time, which includes calls still finishing after --duration.
+
+Usage (from the api directory):
+    python -m benchmarks.write_stress [--mix orders=8,users=8,admin=2,reads=4]
+        [--duration 10] [--processes 1] [--retries 3]
+        [--busy-timeout 5] [--journal-mode WAL] [--synchronous NORMAL]
+        [--output stress.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+import platform
+import sqlite3
+import tempfile
+import multiprocessing
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.loadtest import _percentile, _git_commit
+
+DEFAULT_MIX = "orders=8,users=8,admin=2,reads=4"
+WRITE_KINDS = {"orders", "users", "admin"}
+RETRY_BACKOFF = 0.01
+
+
+def _parse_mix(mix: str) -> dict[str, int]:
+    """"orders=8,reads=4" -> {"orders": 8, "reads": 4}"""
+    workers = {}
+    for part in mix.split(","):
+        kind, _, count = part.partition("=")
+        if kind not in WRITE_KINDS | {"reads"}:
+            raise ValueError(f"Unknown worker kind: {kind}")
+        workers[kind] = int(count)
+    return workers
+
+
+def _is_lock_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+class Stats:
+    """Outcomes and latencies per operation"""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.writes: dict[str, int] = defaultdict(int)
+        self.lock_errors: dict[str, int] = defaultdict(int)
+        self.retries: dict[str, int] = defaultdict(int)
+        self.failures: dict[str, int] = defaultdict(int)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    def to_dict(self) -> dict:
+        return {
+            "latencies": dict(self.latencies),
+            "writes": dict(self.writes),
+            "lock_errors": dict(self.lock_errors),
+            "retries": dict(self.retries),
+            "failures": dict(self.failures),
+            "errors": dict(self.errors)
+        }
+
+
+def _operations(db_path: str) -> dict:
+    """
+    Operation name -> async function of the worker's rng, by worker kind
+
+    Every operation returns the number of database writes it committed
+    """
+    import database
+
+    def query(sql: str) -> list:
+        connection = sqlite3.connect(db_path)
+        try:
+            return [row[0] for row in connection.execute(sql).fetchall()]
+        finally:
+            connection.close()
+
+    goods = query("SELECT id FROM goods WHERE status = 'NEW'")
+    categories = query("SELECT id FROM categories")
+    buyers = query("SELECT id FROM user_info WHERE phone IS NOT NULL")
+    users = query("SELECT id FROM user_info")
+    max_order_id = max(query("SELECT id FROM orders") or [1])
+
+    async def create_order(rng):
+        user_id = rng.choice(buyers)
+        await database.create_order(
+            "NEW", user_id, "PICK_UP", "Самовывоз",
+            [{"good_id": good_id, "count": rng.randint(1, 2)} for good_id in rng.sample(goods, rng.randint(1, 3))],
+            user_id
+        )
+        return 1
+
+    async def start_command(rng):
+        # Mostly returning users, some new ones
+        user_id = rng.choice(users) if rng.random() < 0.8 else rng.randrange(10 ** 9, 2 * 10 ** 9)
+        await database.add_or_update_user(user_id, f"user{user_id}")
+        return 1
+
+    async def update_good_card(rng):
+        good_id = rng.choice(goods)
+        await database.update_good_card(
+            good_id, f"Букет {good_id}", rng.choice(categories), rng.randrange(1000, 15000, 100), "Свежие цветы"
+        )
+        return 1
+
+    async def update_good_status(rng):
+        # Toggles and restores, so the set of goods on sale stays the same
+        good_id = rng.choice(goods)
+        await database.update_good_status(good_id, "BLOCKED")
+        await database.update_good_status(good_id, "NEW")
+        return 2
+
+    async def update_order(rng):
+        try:
+            order = await database.get_order_by_id(rng.randint(1, max_order_id))
+        except ValueError:
+            # Gap in the ids
+            return 0
+        if not order["cart_items"]:
+            return 0
+        await database.update_order(
+            order["id"], rng.choice(["PROCESSING", "SENT", "COMPLETED"]), order["delivery_type"],
+            order["delivery_address"],
+            [{"good_id": item["good_id"], "count": item["count"]} for item in order["cart_items"]],
+            1
+        )
+        return 1
+
+    async def get_goods(rng):
+        await database.get_goods_by_status("NEW")
+        return 0
+
+    async def get_user_orders(rng):
+        await database.get_orders(user_id_filter=rng.choice(buyers))
+        return 0
+
+    return {
+        "orders": [create_order],
+        "users": [start_command],
+        "admin": [update_good_card, update_good_status, update_order],
+        "reads": [get_goods, get_user_orders],
+    }
+
+
+async def _worker(operations: list, deadline: float, retries: int, stats: Stats, rng: random.Random) -> None:
+    while time.monotonic() < deadline:
+        operation = rng.choice(operations)
+        name = operation.__name__
+        start = time.perf_counter()
+        for attempt in range(retries + 1):
+            try:
+                writes = await operation(rng)
+            except Exception as e:
+                if not _is_lock_error(e):
+                    stats.errors[f"{name}: {type(e).__name__}: {e}"] += 1
+                    break
+                stats.lock_errors[name] += 1
+                if attempt == retries:
+                    stats.failures[name] += 1
+                    break
+                stats.retries[name] += 1
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt * (0.5 + rng.random()))
+            else:
+                stats.latencies[name].append(time.perf_counter() - start)
+                stats.writes[name] += writes
+                break
+
+
+async def _run_mix(db_path: str, workers: dict[str, int], duration: float, retries: int, seed: str) -> dict:
+    import database
+    database.DB_PATH = db_path
+
+    operations = _operations(db_path)
+    stats = Stats()
+    # Calls in flight at the deadline still finish, up to DB_BUSY_TIMEOUT
+    # later, so the run is timed until the last one returns. Wall clock
+    # stamps, comparable between the processes
+    started = time.time()
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(
+        _worker(operations[kind], deadline, retries, stats, random.Random(f"{seed}-{kind}-{i}"))
+        for kind, count in workers.items()
+        for i in range(count)
+    ))
+    return {**stats.to_dict(), "started": started, "finished": time.time()}
+
+
+def _process_main(args: tuple) -> dict:
+    """Entry point of a stress process"""
+    db_path, workers, duration, retries, seed = args
+    logging.basicConfig(level=logging.WARNING)
+    return asyncio.run(_run_mix(db_path, workers, duration, retries, seed))
+
+
+def _summarize(results: list[dict], elapsed: float) -> dict:
+    operations = {}
+    latencies = defaultdict(list)
+    counters = {key: defaultdict(int) for key in ("writes", "lock_errors", "retries", "failures")}
+    errors = defaultdict(int)
+    for result in results:
+        for name, values in result["latencies"].items():
+            latencies[name].extend(values)
+        for key, by_name in counters.items():
+            for name, count in result[key].items():
+                by_name[name] += count
+        for error, count in result["errors"].items():
+            errors[error] += count
+
+    names = sorted(set(latencies) | set(counters["lock_errors"]) | set(counters["failures"]))
+    for name in names:
+        ordered = sorted(latencies[name])
+        operations[name] = {
+            "ok": len(ordered),
+            "per_second": round(len(ordered) / elapsed, 2),
+            "writes": counters["writes"][name],
+            "lock_errors": counters["lock_errors"][name],
+            "retries": counters["retries"][name],
+            "failed": counters["failures"][name],
+            "p50_ms": round(_percentile(ordered, 0.50) * 1000, 2),
+            "p95_ms": round(_percentile(ordered, 0.95) * 1000, 2),
+            "p99_ms": round(_percentile(ordered, 0.99) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0
+        }
+
+    reads = {"get_goods", "get_user_orders"}
+    return {
+        "write_tps": round(sum(counters["writes"].values()) / elapsed, 2),
+        "read_rps": round(sum(stats["ok"] for name, stats in operations.items() if name in reads) / elapsed, 2),
+        "lock_errors": sum(counters["lock_errors"].values()),
+        "retries": sum(counters["retries"].values()),
+        "failed": sum(counters["failures"].values()),
+        "errors": dict(errors),
+        "operations": operations
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="workers per kind: orders, users, admin, reads")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--retries", type=int, default=3, help="retries of a call failing with a lock error")
+    parser.add_argument("--busy-timeout", type=float, help="DB_BUSY_TIMEOUT in seconds")
+    parser.add_argument("--journal-mode", help="DB_JOURNAL_MODE, e.g. WAL or DELETE")
+    parser.add_argument("--synchronous", help="DB_SYNCHRONOUS, e.g. NORMAL or FULL")
+    parser.add_argument("--goods", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="-", help="JSON report path, - for stdout")
+    args = parser.parse_args()
+
+    try:
+        workers = _parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Read by database at import, also inherited by the stress processes
+    for variable, value in (("DB_BUSY_TIMEOUT", args.busy_timeout), ("DB_JOURNAL_MODE", args.journal_mode),
+                            ("DB_SYNCHRONOUS", args.synchronous)):
+        if value is not None:
+            os.environ[variable] = str(value)
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    logging.basicConfig(level=logging.WARNING)
+
+    import database
+    import seed
+
+    with tempfile.TemporaryDirectory(prefix="flower-shop-stress-") as tmp:
+        db_path = str(Path(tmp) / "stress.db")
+        asyncio.run(seed.seed_database(
+            db_path, goods=args.goods, images=args.goods * 3, orders=args.orders, users=args.users, seed=args.seed
+        ))
+
+        print(f"Running {workers} in {args.processes} process(es) for {args.duration:g}s...", file=sys.stderr)
+        jobs = [(db_path, workers, args.duration, args.retries, f"{args.seed}-{i}") for i in range(args.processes)]
+        if args.processes == 1:
+            results = [asyncio.run(_run_mix(*jobs[0]))]
+        else:
+            with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+                results = pool.map(_process_main, jobs)
+
+    # From the first process starting its workers to the last one finishing
+    elapsed = max(result["finished"] for result in results) - min(result["started"] for result in results)
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "settings": {
+            "busy_timeout": database.DB_BUSY_TIMEOUT,
+            "journal_mode": database.DB_JOURNAL_MODE,
+            "synchronous": database.DB_SYNCHRONOUS or "default",
+            "retries": args.retries
+        },
+        "mix": workers,
+        "processes": args.processes,
+        "duration_s": args.duration,
+        "elapsed_s": round(elapsed, 2),
+        **_summarize(results, elapsed)
+    }
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output == "-":
+        print(output)
+    else:
+        Path(args.output).write_text(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,190 @@
 import aiosqlite
+import json
 import logging
-# import os
+import os
+import secrets
+import sqlite3
+import time
 # import stat
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Optional
+
+from query_stats import QUERY_STATS_ENABLED, TimedConnection
 
 logger = logging.getLogger(__name__)
 
 
-DB_PATH = "/app/data/flower_shop.db"
+DB_PATH = os.getenv("DB_PATH", "/app/data/flower_shop.db")
+
+# Seconds a connection waits for another connection's write lock before
+# failing with "database is locked" (5 is the sqlite3 module default)
+DB_BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT", "5"))
+# Set by init_db, stored in the database file
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL").upper()
+# PRAGMA synchronous of every connection, empty keeps SQLite's default (FULL)
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "").upper()
+# Rows read per query by the iter_* functions
+ORDERS_PAGE_SIZE = 200
+GOODS_PAGE_SIZE = 500
+
+if DB_JOURNAL_MODE not in {"WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF"}:
+    raise ValueError(f"Invalid DB_JOURNAL_MODE: {DB_JOURNAL_MODE}")
+if DB_SYNCHRONOUS not in {"", "OFF", "NORMAL", "FULL", "EXTRA"}:
+    raise ValueError(f"Invalid DB_SYNCHRONOUS: {DB_SYNCHRONOUS}")
+
+# Marks user_changes rows written by this process, see _process_origin()
+_origin: tuple[int, str] = (os.getpid(), secrets.token_hex(8))
+
+
+def _process_origin() -> str:
+    """Random id of this process (a forked child gets its own)"""
+    global _origin
+    if _origin[0] != os.getpid():
+        _origin = (os.getpid(), secrets.token_hex(8))
+    return _origin[1]
+
+
+# Callbacks notified after a user row is changed: callback(user_id, changes)
+_user_change_listeners: list[Callable[[int, dict], None]] = []
+
+
+def add_user_change_listener(listener: Callable[[int, dict], None]) -> None:
+    """Register callback called with user_id and dict of changed fields after a user is saved"""
+    _user_change_listeners.append(listener)
+
+
+def notify_user_changed(user_id: int, changes: dict) -> None:
+    """
+    Call user change listeners, a failing listener doesn't affect the others
+
+    Called after this process saved a user, and by user_events for users
+    saved by other processes (with None as the values of changed fields)
+    """
+    for listener in _user_change_listeners:
+        try:
+            listener(user_id, changes)
+        except Exception as e:
+            logger.error(f"User change listener failed for user {user_id}: {str(e)}")
+
+
+# Callbacks around every connection: started(function) when it's opened and
+# finished(function, seconds, statements) when it's closed
+_call_observers: list[tuple[Callable[[str], None], Callable[[str, float, int], None]]] = []
+
+
+def add_call_observer(
+    started: Callable[[str], None],
+    finished: Callable[[str, float, int], None]
+) -> None:
+    """Register callbacks called with the name of the function using a connection"""
+    _call_observers.append((started, finished))
+
+
+@asynccontextmanager
+async def _connect(function: str):
+    """
+    Open a connection to the database for the named database function
+
+    Statements are timed by query_stats, use of the connection is reported
+    to call observers under the function name
+    """
+    connection_class = TimedConnection if QUERY_STATS_ENABLED else sqlite3.Connection
+    trace_callback = None
+    statements = 0
+
+    def connection_factory(*args, **kwargs) -> sqlite3.Connection:
+        # Runs in the aiosqlite thread, saves round trips to it for the setup
+        connection = connection_class(*args, **kwargs)
+        if DB_SYNCHRONOUS:
+            connection.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+        if trace_callback is not None:
+            connection.set_trace_callback(trace_callback)
+        return connection
+
+    factory = connection_factory if DB_SYNCHRONOUS else connection_class
+
+    if not _call_observers:
+        async with aiosqlite.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT, factory=factory) as db:
+            yield db
+        return
+
+    def count_statement(sql: str) -> None:
+        nonlocal statements
+        statements += 1
+
+    trace_callback = count_statement
+
+    for started, _ in _call_observers:
+        started(function)
+
+    start = time.perf_counter()
+    try:
+        async with aiosqlite.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT, factory=connection_factory) as db:
+            yield db
+    finally:
+        duration = time.perf_counter() - start
+        for _, finished in _call_observers:
+            try:
+                finished(function, duration, statements)
+            except Exception as e:
+                logger.error(f"Database call observer failed for {function}: {str(e)}")
+
+
+class DuplicateIdempotencyKey(Exception):
+    """Raised when an order with the same idempotency key was already created"""
+
+
+class GoodNotFound(Exception):
+    """Raised when an order line refers to a good that doesn't exist"""
+
+    def __init__(self, good_id: int):
+        super().__init__(f"Good with id={good_id} not found")
+        self.good_id = good_id
+
+
+_order_event_listeners: list[Callable[[int], None]] = []
+
+
+def add_order_event_listener(listener: Callable[[int], None]) -> None:
+    """Register callback called with the event id after an order event is committed"""
+    _order_event_listeners.append(listener)
+
+
+def _notify_order_event(event_id: int) -> None:
+    """Call order event listeners, a failing listener doesn't affect the others"""
+    for listener in _order_event_listeners:
+        try:
+            listener(event_id)
+        except Exception as e:
+            logger.error(f"Order event listener failed for event {event_id}: {str(e)}")
+
+
+async def _ensure_columns(db: aiosqlite.Connection, table: str, columns: dict[str, str]) -> None:
+    """Add columns missing from tables created by an older schema version"""
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in await cursor.fetchall()}
+
+    for name, definition in columns.items():
+        if name not in existing:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+            logger.info(f"Added column {table}.{name}")
+
 
 async def init_db():
-    """Initialize database and create tables if they don't exist"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    """Initialize database and create tables if they don't exist
+
+    Safe to call from several processes at once (API server and bot)"""
+    async with _connect("init_db") as db:
         db.row_factory = aiosqlite.Row
+
+        # WAL lets readers in other processes work while one process writes
+        await db.execute(f"PRAGMA journal_mode={DB_JOURNAL_MODE}")
+
+        # Hold the write lock for the whole migration so concurrent
+        # callers don't race on ALTER TABLE
+        await db.execute("BEGIN IMMEDIATE")
+
         await db.execute("""
             CREATE TABLE IF NOT EXISTS user_info (
                 id INTEGER PRIMARY KEY,
@@ -55,6 +226,9 @@ async def init_db():
                 good_id INTEGER NOT NULL,
                 image_url TEXT NOT NULL,
                 display_order INTEGER DEFAULT 0,
+                placeholder TEXT,
+                width INTEGER,
+                height INTEGER,
                 FOREIGN KEY (good_id) REFERENCES goods(id) ON DELETE CASCADE
             )
         """)
@@ -72,7 +246,10 @@ async def init_db():
                 status TEXT DEFAULT 'NEW',
                 display_order INTEGER DEFAULT 0,
                 image_url TEXT NOT NULL,
-                link INTEGER
+                link INTEGER,
+                placeholder TEXT,
+                width INTEGER,
+                height INTEGER
             )
         """)
         await db.execute("""
@@ -111,14 +288,150 @@ async def init_db():
                 FOREIGN KEY (good_id) REFERENCES goods(id)
             )
         """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS upload_sessions (
+                id TEXT PRIMARY KEY,
+                status TEXT DEFAULT 'NEW',
+                good_id INTEGER,
+                filename TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                upload_offset INTEGER DEFAULT 0,
+                image_url TEXT,
+                createstamp TIMESTAMP,
+                changestamp TIMESTAMP,
+                expirestamp TIMESTAMP,
+                createuser INTEGER
+            )
+        """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS order_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                type TEXT NOT NULL,
+                order_id INTEGER NOT NULL,
+                createstamp TIMESTAMP
+            )
+        """)
+        # Saved users, tailed by every API worker to invalidate what it
+        # cached about users changed by other processes (see user_events)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS user_changes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                fields TEXT NOT NULL,
+                origin TEXT NOT NULL,
+                createstamp TIMESTAMP
+            )
+        """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                key TEXT NOT NULL,
+                request_hash TEXT NOT NULL,
+                order_id INTEGER,
+                response TEXT,
+                createstamp TIMESTAMP
+            )
+        """)
+        await db.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_idempotency_keys_user_key
+            ON idempotency_keys (user_id, key)
+        """)
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_idempotency_keys_createstamp
+            ON idempotency_keys (createstamp)
+        """)
+
+        # Migrate tables created before image metadata was stored
+        image_metadata_columns = {
+            'placeholder': 'TEXT',
+            'width': 'INTEGER',
+            'height': 'INTEGER'
+        }
+        await _ensure_columns(db, 'goods_images', image_metadata_columns)
+        await _ensure_columns(db, 'promo_banner', image_metadata_columns)
+
+        # Order lines keep the good's name and price at order time
+        await _ensure_columns(db, 'cart', {
+            'good_name': 'TEXT',
+            'price': 'INTEGER',
+            'line_total': 'INTEGER'
+        })
+        await _ensure_columns(db, 'orders', {'total': 'INTEGER'})
+
+        # Backfill lines created before snapshots were stored (lines of
+        # goods deleted since then can't be recovered and stay empty)
+        await db.execute("""
+            UPDATE cart
+            SET good_name = (SELECT name FROM goods WHERE goods.id = cart.good_id),
+                price = (SELECT price FROM goods WHERE goods.id = cart.good_id),
+                line_total = count * (SELECT price FROM goods WHERE goods.id = cart.good_id)
+            WHERE good_name IS NULL
+              AND good_id IN (SELECT id FROM goods)
+        """)
+        await db.execute("""
+            UPDATE orders
+            SET total = (SELECT COALESCE(SUM(line_total), 0) FROM cart WHERE cart.order_id = orders.id)
+            WHERE total IS NULL
+        """)
+
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_cart_order_id ON cart (order_id)")
+        # Image lookups and updates by good, without scanning all images
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_goods_images_good_id
+            ON goods_images (good_id, display_order)
+        """)
+
+        # Sales rollups, kept up to date by create/update/delete_order
+        cursor = await db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sales_daily'"
+        )
+        rollups_exist = await cursor.fetchone() is not None
+
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS sales_daily (
+                day TEXT NOT NULL,
+                status TEXT NOT NULL,
+                delivery_type TEXT NOT NULL,
+                orders INTEGER NOT NULL DEFAULT 0,
+                revenue INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, status, delivery_type)
+            )
+        """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS sales_status (
+                status TEXT PRIMARY KEY,
+                orders INTEGER NOT NULL DEFAULT 0,
+                revenue INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS sales_goods (
+                good_id INTEGER PRIMARY KEY,
+                good_name TEXT,
+                units INTEGER NOT NULL DEFAULT 0,
+                revenue INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_sales_goods_units ON sales_goods (units DESC)")
+
+        if not rollups_exist:
+            await _rebuild_sales_rollups(db)
+        # Covers revenue queries by status and date without reading order rows
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_orders_status_createstamp_total
+            ON orders (status, createstamp, total)
+        """)
+
         await db.commit()
         logger.info("Database initialized successfully")
 
 
-async def add_or_update_user(user_id: int, username: Optional[str] = None, phone: Optional[str] = None) -> None:
+async def add_or_update_user(user_id: int, username: Optional[str] = None, phone: Optional[str] = None) -> dict:
     """Add new user or update existing user's changestamp, username, and phone.
-    Only updates fields that are explicitly provided (not None)."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    Only updates fields that are explicitly provided (not None).
+    Returns the saved user row."""
+    async with _connect("add_or_update_user") as db:
         current_time = datetime.now().isoformat()
 
         cursor = await db.execute(
@@ -155,12 +468,25 @@ async def add_or_update_user(user_id: int, username: Optional[str] = None, phone
             )
             logger.info(f"Created new user {user_id} with username={username}, phone={phone}")
 
+        changes = {"username": username, "phone": phone}
+        changes = {key: value for key, value in changes.items() if value is not None}
+        await _insert_user_change(db, user_id, list(changes), current_time)
         await db.commit()
 
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            "SELECT * FROM user_info WHERE id = ?",
+            (user_id,)
+        )
+        saved_user = dict(await cursor.fetchone())
+
+    notify_user_changed(user_id, changes)
+    return saved_user
+
 
 async def get_user(user_id: int) -> Optional[dict]:
     """Get user information by user_id"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("get_user") as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT * FROM user_info WHERE id = ?",
@@ -175,15 +501,75 @@ async def get_user(user_id: int) -> Optional[dict]:
 
 async def update_user_mode(user_id: int, mode: str) -> None:
     """Update user mode (ADMIN or USER)"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("update_user_mode") as db:
         current_time = datetime.now().isoformat()
         await db.execute(
             "UPDATE user_info SET mode = ?, changestamp = ? WHERE id = ?",
             (mode, current_time, user_id)
         )
+        await _insert_user_change(db, user_id, ["mode"], current_time)
         await db.commit()
         logger.info(f"Updated mode for user {user_id} to {mode}")
 
+    notify_user_changed(user_id, {"mode": mode})
+
+
+async def _insert_user_change(db: aiosqlite.Connection, user_id: int, fields: list[str], current_time: str) -> None:
+    """Record a saved user in the caller's transaction"""
+    await db.execute(
+        """INSERT INTO user_changes (user_id, fields, origin, createstamp)
+           VALUES (?, ?, ?, ?)""",
+        (user_id, json.dumps(fields), _process_origin(), current_time)
+    )
+
+
+async def get_user_changes(after_id: int, limit: int = 500) -> tuple[list[dict], int]:
+    """
+    Get users saved by other processes with change id greater than after_id
+
+    Returns:
+        tuple: changes (dicts with id, user_id and names of the changed
+        fields), oldest first, and id of the last change read - changes
+        made by this process are read but not returned
+    """
+    async with _connect("get_user_changes") as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """SELECT id, user_id, fields, origin
+               FROM user_changes
+               WHERE id > ?
+               ORDER BY id
+               LIMIT ?""",
+            (after_id, limit)
+        )
+        rows = await cursor.fetchall()
+
+    origin = _process_origin()
+    return [
+        {"id": row["id"], "user_id": row["user_id"], "fields": json.loads(row["fields"])}
+        for row in rows
+        if row["origin"] != origin
+    ], rows[-1]["id"] if rows else after_id
+
+
+async def get_last_user_change_id() -> int:
+    """Get id of the latest user change (0 if there are none)"""
+    async with _connect("get_last_user_change_id") as db:
+        cursor = await db.execute("SELECT MAX(id) FROM user_changes")
+        row = await cursor.fetchone()
+        return row[0] or 0
+
+
+async def delete_user_changes_before(timestamp: str) -> int:
+    """Delete user changes recorded before timestamp, returns number of deleted rows"""
+    async with _connect("delete_user_changes_before") as db:
+        cursor = await db.execute(
+            "DELETE FROM user_changes WHERE createstamp < ?",
+            (timestamp,)
+        )
+        await db.commit()
+        return cursor.rowcount
+
 
 async def create_good_card(
     name: str,
@@ -193,7 +579,7 @@ async def create_good_card(
     non_discount_price: Optional[int] = None
 ) -> dict:
     """Create a new good card"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("create_good_card") as db:
         db.row_factory = aiosqlite.Row
         current_time = datetime.now().isoformat()
 
@@ -232,7 +618,7 @@ async def update_good_card(
     non_discount_price: Optional[int] = None
 ) -> dict:
     """Update existing good card"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("update_good_card") as db:
         db.row_factory = aiosqlite.Row
         current_time = datetime.now().isoformat()
 
@@ -247,7 +633,7 @@ async def update_good_card(
 
         # Get the updated good with images
         cursor = await db.execute(
-            """SELECT g.*, c.title AS category, gi.image_url, gi.display_order
+            """SELECT g.*, c.title AS category, gi.image_url, gi.display_order, gi.placeholder, gi.width, gi.height
                FROM goods g
                LEFT JOIN categories c ON g.category_id = c.id
                LEFT JOIN goods_images gi ON g.id = gi.good_id
@@ -281,34 +667,56 @@ async def update_good_card(
             if row['image_url']:
                 result['images'].append({
                     'image_url': row['image_url'],
-                    'display_order': row['display_order']
+                    'display_order': row['display_order'],
+                    'placeholder': row['placeholder'],
+                    'width': row['width'],
+                    'height': row['height']
                 })
 
         logger.info(f"Updated good card with id={good_id}")
         return result
 
 
-async def save_good_images(good_id: int, image_urls: list[str]) -> None:
-    """Save list of image URLs for a good"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        for index, image_url in enumerate(image_urls):
-            await db.execute(
-                """INSERT INTO goods_images (good_id, image_url, display_order)
-                   VALUES (?, ?, ?)""",
-                (good_id, image_url, index)
-            )
+async def _insert_good_images(db: aiosqlite.Connection, good_id: int, images: list[dict]) -> list[int]:
+    """Append images after the ones the good already has, returns their display orders"""
+    cursor = await db.execute(
+        "SELECT COALESCE(MAX(display_order) + 1, 0) FROM goods_images WHERE good_id = ?",
+        (good_id,)
+    )
+    first_order = (await cursor.fetchone())[0]
+
+    for index, image in enumerate(images):
+        await db.execute(
+            """INSERT INTO goods_images (good_id, image_url, display_order, placeholder, width, height)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (good_id, image['image_url'], first_order + index, image.get('placeholder'), image.get('width'), image.get('height'))
+        )
+    return [first_order + index for index in range(len(images))]
+
+
+async def save_good_images(good_id: int, images: list[dict]) -> list[int]:
+    """Save list of images for a good after the images it already has
+
+    Each image is a dict with image_url and optional placeholder, width, height
+
+    Returns:
+        list of display orders assigned to the images
+    """
+    async with _connect("save_good_images") as db:
+        display_orders = await _insert_good_images(db, good_id, images)
         await db.commit()
-        logger.info(f"Saved {len(image_urls)} images for good_id={good_id}")
+        logger.info(f"Saved {len(images)} images for good_id={good_id}")
+        return display_orders
 
 
 async def get_goods_by_status(status: str = 'NEW') -> list[dict]:
     """Get all goods with specified status along with their images"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("get_goods_by_status") as db:
         db.row_factory = aiosqlite.Row
 
         # Get goods with their images via LEFT JOIN
         cursor = await db.execute(
-            """SELECT g.*, c.title AS category, gi.image_url, gi.display_order
+            """SELECT g.*, c.title AS category, gi.image_url, gi.display_order, gi.placeholder, gi.width, gi.height
                FROM goods g
                LEFT JOIN categories c ON g.category_id = c.id
                LEFT JOIN goods_images gi ON g.id = gi.good_id
@@ -340,7 +748,10 @@ async def get_goods_by_status(status: str = 'NEW') -> list[dict]:
             if row['image_url']:
                 goods_dict[good_id]['images'].append({
                     'image_url': row['image_url'],
-                    'display_order': row['display_order']
+                    'display_order': row['display_order'],
+                    'placeholder': row['placeholder'],
+                    'width': row['width'],
+                    'height': row['height']
                 })
 
         result = list(goods_dict.values())
@@ -350,12 +761,12 @@ async def get_goods_by_status(status: str = 'NEW') -> list[dict]:
 
 async def get_all_goods() -> list[dict]:
     """Get all goods regardless of status along with their images (for ADMIN)"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("get_all_goods") as db:
         db.row_factory = aiosqlite.Row
 
         # Get all goods with their images via LEFT JOIN
         cursor = await db.execute(
-            """SELECT g.*, c.title AS category, gi.image_url, gi.display_order
+            """SELECT g.*, c.title AS category, gi.image_url, gi.display_order, gi.placeholder, gi.width, gi.height
                FROM goods g
                LEFT JOIN categories c ON g.category_id = c.id
                LEFT JOIN goods_images gi ON g.id = gi.good_id
@@ -385,7 +796,10 @@ async def get_all_goods() -> list[dict]:
             if row['image_url']:
                 goods_dict[good_id]['images'].append({
                     'image_url': row['image_url'],
-                    'display_order': row['display_order']
+                    'display_order': row['display_order'],
+                    'placeholder': row['placeholder'],
+                    'width': row['width'],
+                    'height': row['height']
                 })
 
         result = list(goods_dict.values())
@@ -393,9 +807,157 @@ async def get_all_goods() -> list[dict]:
         return result
 
 
+async def import_goods_batch(goods: list[dict], category_ids: dict[str, int]) -> list[dict]:
+    """Insert a batch of goods with their images in one transaction
+
+    Each good is a dict with name, category, price, non_discount_price,
+    description, status and images (list of image dicts). Categories are
+    created on demand; category_ids caches title -> id across batches.
+    A failing good is rolled back on its own and doesn't affect the others.
+
+    Returns:
+        list of dicts with id (None on failure) and error (None on success)
+    """
+    async with _connect("import_goods_batch") as db:
+        current_time = datetime.now().isoformat()
+        results = []
+        new_categories = {}
+
+        # One transaction for the whole batch, a savepoint per good
+        await db.execute("BEGIN IMMEDIATE")
+
+        for good in goods:
+            await db.execute("SAVEPOINT import_good")
+            try:
+                category = good['category']
+                category_id = category_ids.get(category) or new_categories.get(category)
+                if category_id is None:
+                    cursor = await db.execute(
+                        "SELECT id FROM categories WHERE title = ?",
+                        (category,)
+                    )
+                    row = await cursor.fetchone()
+                    if row:
+                        category_id = row[0]
+                    else:
+                        cursor = await db.execute(
+                            """INSERT INTO categories (title, status, createstamp, changestamp)
+                               VALUES (?, 'NEW', ?, ?)""",
+                            (category, current_time, current_time)
+                        )
+                        category_id = cursor.lastrowid
+                        logger.info(f"Created category with id={category_id}, title={category}")
+
+                cursor = await db.execute(
+                    """INSERT INTO goods (createstamp, changestamp, status, name, category_id, price, non_discount_price, description)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (current_time, current_time, good['status'], good['name'], category_id,
+                     good['price'], good['non_discount_price'], good['description'])
+                )
+                good_id = cursor.lastrowid
+
+                await db.executemany(
+                    """INSERT INTO goods_images (good_id, image_url, display_order, placeholder, width, height)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    [
+                        (good_id, image['image_url'], index, image.get('placeholder'), image.get('width'), image.get('height'))
+                        for index, image in enumerate(good['images'])
+                    ]
+                )
+
+                await db.execute("RELEASE SAVEPOINT import_good")
+                new_categories[category] = category_id
+                results.append({'id': good_id, 'error': None})
+            except Exception as e:
+                await db.execute("ROLLBACK TO SAVEPOINT import_good")
+                await db.execute("RELEASE SAVEPOINT import_good")
+                logger.error(f"Failed to import good {good.get('name')}: {str(e)}")
+                results.append({'id': None, 'error': str(e)})
+
+        await db.commit()
+
+        # Only remember categories once they are committed
+        category_ids.update(new_categories)
+
+        imported = sum(1 for result in results if result['id'] is not None)
+        logger.info(f"Imported {imported} of {len(goods)} goods in batch")
+        return results
+
+
+async def iter_all_goods(batch_size: int = GOODS_PAGE_SIZE):
+    """Iterate over all goods with their images without loading them all in memory
+
+    Goods are read in pages of batch_size by descending id, each page with
+    its own connection, so no read transaction stays open while the caller
+    handles the goods
+
+    Yields:
+        dict: good in the same format as get_all_goods() items
+    """
+    before_id = None
+    count = 0
+
+    while True:
+        async with _connect("iter_all_goods") as db:
+            db.row_factory = aiosqlite.Row
+
+            cursor = await db.execute(
+                f"""SELECT g.*, c.title AS category, gi.image_url, gi.display_order, gi.placeholder, gi.width, gi.height
+                    FROM goods g
+                    LEFT JOIN categories c ON g.category_id = c.id
+                    LEFT JOIN goods_images gi ON g.id = gi.good_id
+                    WHERE g.id IN (
+                        SELECT id FROM goods {'WHERE id < ?' if before_id is not None else ''}
+                        ORDER BY id DESC LIMIT ?
+                    )
+                    ORDER BY g.id DESC, gi.display_order ASC""",
+                (before_id, batch_size) if before_id is not None else (batch_size,)
+            )
+            rows = await cursor.fetchall()
+            if not rows:
+                break
+
+        # Rows of one good are adjacent
+        goods = []
+        for row in rows:
+            if not goods or goods[-1]['id'] != row['id']:
+                goods.append({
+                    'id': row['id'],
+                    'createstamp': row['createstamp'],
+                    'changestamp': row['changestamp'],
+                    'status': row['status'],
+                    'name': row['name'],
+                    'category': row['category'],
+                    'price': row['price'],
+                    'non_discount_price': row['non_discount_price'],
+                    'description': row['description'],
+                    'images': []
+                })
+
+            # Add image with display_order if exists (LEFT JOIN may return NULL)
+            if row['image_url']:
+                goods[-1]['images'].append({
+                    'image_url': row['image_url'],
+                    'display_order': row['display_order'],
+                    'placeholder': row['placeholder'],
+                    'width': row['width'],
+                    'height': row['height']
+                })
+
+        for good in goods:
+            count += 1
+            yield good
+
+        if len(goods) < batch_size:
+            break
+        before_id = goods[-1]['id']
+
+    logger.info(f"Iterated over {count} goods (all statuses)")
+
+
 async def delete_good(good_id: int) -> None:
     """Delete good and its images (CASCADE)"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("delete_good") as db:
         # Check if good exists
         cursor = await db.execute(
             "SELECT id FROM goods WHERE id = ?",
@@ -418,7 +980,7 @@ async def delete_good(good_id: int) -> None:
 
 async def update_good_status(good_id: int, new_status: str) -> dict:
     """Update good status (NEW or BLOCKED)"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("update_good_status") as db:
         db.row_factory = aiosqlite.Row
         current_time = datetime.now().isoformat()
 
@@ -433,7 +995,7 @@ async def update_good_status(good_id: int, new_status: str) -> dict:
 
         # Get the updated good with images
         cursor = await db.execute(
-            """SELECT g.*, c.title AS category, gi.image_url, gi.display_order
+            """SELECT g.*, c.title AS category, gi.image_url, gi.display_order, gi.placeholder, gi.width, gi.height
                FROM goods g
                LEFT JOIN categories c ON g.category_id = c.id
                LEFT JOIN goods_images gi ON g.id = gi.good_id
@@ -467,7 +1029,10 @@ async def update_good_status(good_id: int, new_status: str) -> dict:
             if row['image_url']:
                 result['images'].append({
                     'image_url': row['image_url'],
-                    'display_order': row['display_order']
+                    'display_order': row['display_order'],
+                    'placeholder': row['placeholder'],
+                    'width': row['width'],
+                    'height': row['height']
                 })
 
         logger.info(f"Updated status for good_id={good_id} to {new_status}")
@@ -476,7 +1041,7 @@ async def update_good_status(good_id: int, new_status: str) -> dict:
 
 async def get_shop_addresses() -> list[dict]:
     """Get all shop addresses"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("get_shop_addresses") as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT id, address FROM shop_addresses ORDER BY id ASC"
@@ -490,7 +1055,7 @@ async def get_shop_addresses() -> list[dict]:
 
 async def create_shop_address(address: str) -> dict:
     """Create a new shop address"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("create_shop_address") as db:
         db.row_factory = aiosqlite.Row
 
         cursor = await db.execute(
@@ -514,7 +1079,7 @@ async def create_shop_address(address: str) -> dict:
 
 async def update_shop_address(address_id: int, address: str) -> dict:
     """Update existing shop address"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("update_shop_address") as db:
         db.row_factory = aiosqlite.Row
 
         # Update the address
@@ -542,7 +1107,7 @@ async def update_shop_address(address_id: int, address: str) -> dict:
 
 async def delete_shop_address(address_id: int) -> None:
     """Delete shop address"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("delete_shop_address") as db:
         # Check if address exists
         cursor = await db.execute(
             "SELECT id FROM shop_addresses WHERE id = ?",
@@ -565,7 +1130,7 @@ async def delete_shop_address(address_id: int) -> None:
 
 async def update_images_order(good_id: int, image_urls: list[str]) -> dict:
     """Update display order of images for a good based on provided URL order"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("update_images_order") as db:
         db.row_factory = aiosqlite.Row
         current_time = datetime.now().isoformat()
 
@@ -587,7 +1152,7 @@ async def update_images_order(good_id: int, image_urls: list[str]) -> dict:
 
         # Get the updated good with images
         cursor = await db.execute(
-            """SELECT g.*, c.title AS category, gi.image_url, gi.display_order
+            """SELECT g.*, c.title AS category, gi.image_url, gi.display_order, gi.placeholder, gi.width, gi.height
                FROM goods g
                LEFT JOIN categories c ON g.category_id = c.id
                LEFT JOIN goods_images gi ON g.id = gi.good_id
@@ -621,7 +1186,10 @@ async def update_images_order(good_id: int, image_urls: list[str]) -> dict:
             if row['image_url']:
                 result['images'].append({
                     'image_url': row['image_url'],
-                    'display_order': row['display_order']
+                    'display_order': row['display_order'],
+                    'placeholder': row['placeholder'],
+                    'width': row['width'],
+                    'height': row['height']
                 })
 
         logger.info(f"Updated image order for good_id={good_id}")
@@ -630,7 +1198,7 @@ async def update_images_order(good_id: int, image_urls: list[str]) -> dict:
 
 async def delete_good_image(good_id: int, image_url: str) -> None:
     """Delete a specific image from a good"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("delete_good_image") as db:
         current_time = datetime.now().isoformat()
 
         # Check if image exists for this good
@@ -662,10 +1230,10 @@ async def delete_good_image(good_id: int, image_url: str) -> None:
 
 async def get_promo_banners() -> list[dict]:
     """Get all promo banners with status NEW ordered by display_order"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("get_promo_banners") as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
-            """SELECT id, status, display_order, image_url, link
+            """SELECT id, status, display_order, image_url, link, placeholder, width, height
                FROM promo_banner
                WHERE status = 'NEW'
                ORDER BY display_order ASC"""
@@ -679,10 +1247,10 @@ async def get_promo_banners() -> list[dict]:
 
 async def get_all_promo_banners() -> list[dict]:
     """Get ALL promo banners (including BLOCKED) ordered by display_order (ADMIN only)"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("get_all_promo_banners") as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
-            """SELECT id, status, display_order, image_url, link
+            """SELECT id, status, display_order, image_url, link, placeholder, width, height
                FROM promo_banner
                ORDER BY display_order ASC"""
         )
@@ -693,9 +1261,14 @@ async def get_all_promo_banners() -> list[dict]:
         return result
 
 
-async def create_promo_banner(image_url: str) -> dict:
+async def create_promo_banner(
+    image_url: str,
+    placeholder: Optional[str] = None,
+    width: Optional[int] = None,
+    height: Optional[int] = None
+) -> dict:
     """Create a new promo banner"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("create_promo_banner") as db:
         db.row_factory = aiosqlite.Row
         current_time = datetime.now().isoformat()
 
@@ -708,16 +1281,16 @@ async def create_promo_banner(image_url: str) -> dict:
 
         # Insert new promo banner
         cursor = await db.execute(
-            """INSERT INTO promo_banner (createstamp, changestamp, status, display_order, image_url)
-               VALUES (?, ?, 'NEW', ?, ?)""",
-            (current_time, current_time, next_order, image_url)
+            """INSERT INTO promo_banner (createstamp, changestamp, status, display_order, image_url, placeholder, width, height)
+               VALUES (?, ?, 'NEW', ?, ?, ?, ?, ?)""",
+            (current_time, current_time, next_order, image_url, placeholder, width, height)
         )
         await db.commit()
 
         # Get the created promo banner
         banner_id = cursor.lastrowid
         cursor = await db.execute(
-            "SELECT id, status, display_order, image_url, link FROM promo_banner WHERE id = ?",
+            "SELECT id, status, display_order, image_url, link, placeholder, width, height FROM promo_banner WHERE id = ?",
             (banner_id,)
         )
         row = await cursor.fetchone()
@@ -729,7 +1302,7 @@ async def create_promo_banner(image_url: str) -> dict:
 
 async def delete_promo_banner(banner_id: int) -> None:
     """Delete promo banner"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("delete_promo_banner") as db:
         # Check if banner exists
         cursor = await db.execute(
             "SELECT id FROM promo_banner WHERE id = ?",
@@ -752,7 +1325,7 @@ async def delete_promo_banner(banner_id: int) -> None:
 
 async def update_promo_banner_status(banner_id: int, new_status: str) -> dict:
     """Update promo banner status (NEW or BLOCKED)"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("update_promo_banner_status") as db:
         db.row_factory = aiosqlite.Row
         current_time = datetime.now().isoformat()
 
@@ -767,7 +1340,7 @@ async def update_promo_banner_status(banner_id: int, new_status: str) -> dict:
 
         # Get the updated banner
         cursor = await db.execute(
-            "SELECT id, status, display_order, image_url, link FROM promo_banner WHERE id = ?",
+            "SELECT id, status, display_order, image_url, link, placeholder, width, height FROM promo_banner WHERE id = ?",
             (banner_id,)
         )
         row = await cursor.fetchone()
@@ -783,7 +1356,7 @@ async def update_promo_banner_status(banner_id: int, new_status: str) -> dict:
 
 async def update_promo_banner_link(banner_id: int, link: Optional[int]) -> dict:
     """Update promo banner link (product ID)"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("update_promo_banner_link") as db:
         db.row_factory = aiosqlite.Row
         current_time = datetime.now().isoformat()
 
@@ -798,7 +1371,7 @@ async def update_promo_banner_link(banner_id: int, link: Optional[int]) -> dict:
 
         # Get the updated banner
         cursor = await db.execute(
-            "SELECT id, status, display_order, image_url, link FROM promo_banner WHERE id = ?",
+            "SELECT id, status, display_order, image_url, link, placeholder, width, height FROM promo_banner WHERE id = ?",
             (banner_id,)
         )
         row = await cursor.fetchone()
@@ -814,7 +1387,7 @@ async def update_promo_banner_link(banner_id: int, link: Optional[int]) -> dict:
 
 async def get_categories_by_status(status: str = 'NEW') -> list[dict]:
     """Get all categories with specified status"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("get_categories_by_status") as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             """SELECT id, title, status
@@ -832,7 +1405,7 @@ async def get_categories_by_status(status: str = 'NEW') -> list[dict]:
 
 async def get_all_categories() -> list[dict]:
     """Get all categories regardless of status (for ADMIN)"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("get_all_categories") as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             """SELECT id, title, status
@@ -848,7 +1421,7 @@ async def get_all_categories() -> list[dict]:
 
 async def get_category_by_id(category_id: int) -> Optional[dict]:
     """Get category by id"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("get_category_by_id") as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT id, title, status FROM categories WHERE id = ?",
@@ -867,7 +1440,7 @@ async def get_category_by_id(category_id: int) -> Optional[dict]:
 
 async def get_category_by_title(title: str) -> Optional[dict]:
     """Get category by title (case-sensitive)"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("get_category_by_title") as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT id, title, status FROM categories WHERE title = ?",
@@ -886,7 +1459,7 @@ async def get_category_by_title(title: str) -> Optional[dict]:
 
 async def create_category(title: str) -> dict:
     """Create a new category"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("create_category") as db:
         db.row_factory = aiosqlite.Row
         current_time = datetime.now().isoformat()
 
@@ -912,7 +1485,7 @@ async def create_category(title: str) -> dict:
 
 async def update_category(category_id: int, title: str) -> dict:
     """Update existing category title"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("update_category") as db:
         db.row_factory = aiosqlite.Row
         current_time = datetime.now().isoformat()
 
@@ -943,7 +1516,7 @@ async def update_category(category_id: int, title: str) -> dict:
 
 async def delete_category(category_id: int) -> None:
     """Delete category"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("delete_category") as db:
         # Check if category exists
         cursor = await db.execute(
             "SELECT id FROM categories WHERE id = ?",
@@ -966,7 +1539,7 @@ async def delete_category(category_id: int) -> None:
 
 async def update_category_status(category_id: int, new_status: str) -> dict:
     """Update category status (NEW or BLOCKED)"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("update_category_status") as db:
         db.row_factory = aiosqlite.Row
         current_time = datetime.now().isoformat()
 
@@ -997,7 +1570,7 @@ async def update_category_status(category_id: int, new_status: str) -> dict:
 
 async def get_setting_by_type(setting_type: str) -> Optional[dict]:
     """Get setting by type"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("get_setting_by_type") as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT * FROM settings WHERE type = ? AND status = 'ACTIVE'",
@@ -1016,7 +1589,7 @@ async def get_setting_by_type(setting_type: str) -> Optional[dict]:
 
 async def get_all_settings() -> list[dict]:
     """Get all active settings"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("get_all_settings") as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT * FROM settings WHERE status = 'ACTIVE' ORDER BY id ASC"
@@ -1030,7 +1603,7 @@ async def get_all_settings() -> list[dict]:
 
 async def create_setting(setting_type: str, value: str, user_id: int) -> dict:
     """Create a new setting"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("create_setting") as db:
         db.row_factory = aiosqlite.Row
         current_time = datetime.now().isoformat()
 
@@ -1056,7 +1629,7 @@ async def create_setting(setting_type: str, value: str, user_id: int) -> dict:
 
 async def update_setting(setting_type: str, value: str, user_id: int) -> dict:
     """Update existing setting by type"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("update_setting") as db:
         db.row_factory = aiosqlite.Row
         current_time = datetime.now().isoformat()
 
@@ -1097,7 +1670,7 @@ async def upsert_setting(setting_type: str, value: str, user_id: int) -> dict:
 
 async def delete_setting(setting_type: str) -> None:
     """Delete setting by type (soft delete - set status to DELETED)"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("delete_setting") as db:
         current_time = datetime.now().isoformat()
 
         # Check if setting exists
@@ -1120,19 +1693,323 @@ async def delete_setting(setting_type: str) -> None:
         logger.info(f"Deleted setting with type={setting_type}")
 
 
+async def _insert_order_event(db: aiosqlite.Connection, event_type: str, order_id: int, current_time: str) -> int:
+    """Record order event in the caller's transaction, returns event id"""
+    cursor = await db.execute(
+        """INSERT INTO order_events (type, order_id, createstamp)
+           VALUES (?, ?, ?)""",
+        (event_type, order_id, current_time)
+    )
+    return cursor.lastrowid
+
+
+async def get_order_events(after_id: int, limit: int = 100) -> list[dict]:
+    """Get order events with id greater than after_id, oldest first"""
+    async with _connect("get_order_events") as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """SELECT id, type, order_id, createstamp
+               FROM order_events
+               WHERE id > ?
+               ORDER BY id
+               LIMIT ?""",
+            (after_id, limit)
+        )
+        rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+
+async def get_last_order_event_id() -> int:
+    """Get id of the latest order event (0 if there are none)"""
+    async with _connect("get_last_order_event_id") as db:
+        cursor = await db.execute("SELECT MAX(id) FROM order_events")
+        row = await cursor.fetchone()
+        return row[0] or 0
+
+
+async def delete_order_events_before(timestamp: str) -> int:
+    """Delete order events created before timestamp, returns number of deleted events"""
+    async with _connect("delete_order_events_before") as db:
+        cursor = await db.execute(
+            "DELETE FROM order_events WHERE createstamp < ?",
+            (timestamp,)
+        )
+        await db.commit()
+        return cursor.rowcount
+
+
+# Orders with this status don't count towards sales of goods
+CANCELLED_STATUS = 'CANCELLED'
+
+
+async def _get_order_rollup_state(db: aiosqlite.Connection, order_id: int) -> Optional[dict]:
+    """Get the order fields the sales rollups are computed from"""
+    cursor = await db.execute(
+        "SELECT status, delivery_type, createstamp, total FROM orders WHERE id = ?",
+        (order_id,)
+    )
+    row = await cursor.fetchone()
+    if not row:
+        return None
+
+    cursor = await db.execute(
+        """SELECT good_id, good_name, count, line_total FROM cart
+           WHERE order_id = ? AND good_name IS NOT NULL""",
+        (order_id,)
+    )
+    lines = await cursor.fetchall()
+
+    return {
+        'status': row[0],
+        'delivery_type': row[1] or '',
+        'day': (row[2] or '')[:10],
+        'total': row[3] or 0,
+        'lines': [(line[0], line[1], line[2], line[3] or 0) for line in lines]
+    }
+
+
+async def _apply_order_to_rollups(db: aiosqlite.Connection, state: Optional[dict], sign: int) -> None:
+    """Add (sign=1) or subtract (sign=-1) an order's contribution to the sales rollups"""
+    if state is None:
+        return
+
+    await db.execute(
+        """INSERT INTO sales_daily (day, status, delivery_type, orders, revenue)
+           VALUES (?, ?, ?, ?, ?)
+           ON CONFLICT (day, status, delivery_type) DO UPDATE SET
+               orders = orders + excluded.orders,
+               revenue = revenue + excluded.revenue""",
+        (state['day'], state['status'], state['delivery_type'], sign, sign * state['total'])
+    )
+    await db.execute(
+        """INSERT INTO sales_status (status, orders, revenue)
+           VALUES (?, ?, ?)
+           ON CONFLICT (status) DO UPDATE SET
+               orders = orders + excluded.orders,
+               revenue = revenue + excluded.revenue""",
+        (state['status'], sign, sign * state['total'])
+    )
+
+    if sign < 0:
+        # Don't keep rows nothing contributes to anymore
+        await db.execute(
+            "DELETE FROM sales_daily WHERE day = ? AND status = ? AND delivery_type = ? AND orders = 0",
+            (state['day'], state['status'], state['delivery_type'])
+        )
+        await db.execute(
+            "DELETE FROM sales_status WHERE status = ? AND orders = 0",
+            (state['status'],)
+        )
+
+    if state['status'] == CANCELLED_STATUS:
+        return
+
+    await db.executemany(
+        """INSERT INTO sales_goods (good_id, good_name, units, revenue)
+           VALUES (?, ?, ?, ?)
+           ON CONFLICT (good_id) DO UPDATE SET
+               good_name = excluded.good_name,
+               units = units + excluded.units,
+               revenue = revenue + excluded.revenue""",
+        [(good_id, good_name, sign * count, sign * line_total) for good_id, good_name, count, line_total in state['lines']]
+    )
+
+
+async def _rebuild_sales_rollups(db: aiosqlite.Connection) -> None:
+    """Recompute all sales rollups from orders and cart in the caller's transaction"""
+    await db.execute("DELETE FROM sales_daily")
+    await db.execute("DELETE FROM sales_status")
+    await db.execute("DELETE FROM sales_goods")
+
+    await db.execute("""
+        INSERT INTO sales_daily (day, status, delivery_type, orders, revenue)
+        SELECT substr(createstamp, 1, 10), status, COALESCE(delivery_type, ''), COUNT(*), COALESCE(SUM(total), 0)
+        FROM orders
+        GROUP BY 1, 2, 3
+    """)
+    await db.execute("""
+        INSERT INTO sales_status (status, orders, revenue)
+        SELECT status, COUNT(*), COALESCE(SUM(total), 0)
+        FROM orders
+        GROUP BY status
+    """)
+    await db.execute("""
+        INSERT INTO sales_goods (good_id, good_name, units, revenue)
+        SELECT c.good_id, MAX(c.good_name), SUM(c.count), COALESCE(SUM(c.line_total), 0)
+        FROM cart c
+        JOIN orders o ON o.id = c.order_id
+        WHERE o.status != ? AND c.good_name IS NOT NULL
+        GROUP BY c.good_id
+    """, (CANCELLED_STATUS,))
+    logger.info("Rebuilt sales rollups")
+
+
+async def rebuild_sales_rollups() -> None:
+    """Recompute all sales rollups from orders and cart"""
+    async with _connect("rebuild_sales_rollups") as db:
+        await db.execute("BEGIN IMMEDIATE")
+        await _rebuild_sales_rollups(db)
+        await db.commit()
+
+
+async def get_sales_daily(date_from: str, date_to: str) -> list[dict]:
+    """Get orders and revenue per day (cancelled orders excluded), both dates inclusive"""
+    async with _connect("get_sales_daily") as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """SELECT day, SUM(orders) AS orders, SUM(revenue) AS revenue
+               FROM sales_daily
+               WHERE day BETWEEN ? AND ? AND status != ?
+               GROUP BY day
+               HAVING SUM(orders) > 0
+               ORDER BY day ASC""",
+            (date_from, date_to, CANCELLED_STATUS)
+        )
+        return [dict(row) for row in await cursor.fetchall()]
+
+
+async def get_sales_by_delivery_type(date_from: str, date_to: str) -> list[dict]:
+    """Get orders and revenue per delivery type (cancelled orders excluded), both dates inclusive"""
+    async with _connect("get_sales_by_delivery_type") as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """SELECT delivery_type, SUM(orders) AS orders, SUM(revenue) AS revenue
+               FROM sales_daily
+               WHERE day BETWEEN ? AND ? AND status != ?
+               GROUP BY delivery_type
+               HAVING SUM(orders) > 0
+               ORDER BY revenue DESC""",
+            (date_from, date_to, CANCELLED_STATUS)
+        )
+        return [dict(row) for row in await cursor.fetchall()]
+
+
+async def get_sales_by_status() -> list[dict]:
+    """Get number of orders and their total per status"""
+    async with _connect("get_sales_by_status") as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """SELECT status, orders, revenue FROM sales_status
+               WHERE orders > 0
+               ORDER BY status ASC"""
+        )
+        return [dict(row) for row in await cursor.fetchall()]
+
+
+async def get_top_goods(limit: int = 10) -> list[dict]:
+    """Get best selling goods by units (cancelled orders excluded)"""
+    async with _connect("get_top_goods") as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """SELECT good_id, good_name, units, revenue FROM sales_goods
+               WHERE units > 0
+               ORDER BY units DESC
+               LIMIT ?""",
+            (limit,)
+        )
+        return [dict(row) for row in await cursor.fetchall()]
+
+
+async def _insert_cart_items(
+    db: aiosqlite.Connection,
+    order_id: int,
+    cart_items: list[dict],
+    snapshots: Optional[dict[int, tuple[str, int]]] = None
+) -> int:
+    """Insert order lines with the good's current name and price, returns order total
+
+    snapshots maps good_id to (good_name, price) to keep instead of the current values"""
+    snapshots = dict(snapshots or {})
+
+    missing = list({item['good_id'] for item in cart_items} - snapshots.keys())
+    if missing:
+        cursor = await db.execute(
+            f"SELECT id, name, price FROM goods WHERE id IN ({', '.join('?' * len(missing))})",
+            missing
+        )
+        for row in await cursor.fetchall():
+            snapshots[row[0]] = (row[1], row[2])
+
+    total = 0
+    for item in cart_items:
+        snapshot = snapshots.get(item['good_id'])
+        if snapshot is None:
+            logger.error(f"Good with id={item['good_id']} not found")
+            raise GoodNotFound(item['good_id'])
+
+        good_name, price = snapshot
+        line_total = price * item['count']
+        await db.execute(
+            """INSERT INTO cart (order_id, good_id, count, good_name, price, line_total)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (order_id, item['good_id'], item['count'], good_name, price, line_total)
+        )
+        total += line_total
+
+    return total
+
+
+async def get_idempotency_key(user_id: int, key: str) -> Optional[dict]:
+    """Get stored idempotency key with its order id and response"""
+    async with _connect("get_idempotency_key") as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            "SELECT * FROM idempotency_keys WHERE user_id = ? AND key = ?",
+            (user_id, key)
+        )
+        row = await cursor.fetchone()
+        return dict(row) if row else None
+
+
+async def save_idempotency_response(user_id: int, key: str, response: str) -> None:
+    """Store the response returned for an idempotency key"""
+    async with _connect("save_idempotency_response") as db:
+        await db.execute(
+            "UPDATE idempotency_keys SET response = ? WHERE user_id = ? AND key = ?",
+            (response, user_id, key)
+        )
+        await db.commit()
+
+
+async def delete_idempotency_keys_before(timestamp: str) -> int:
+    """Delete idempotency keys created before timestamp, returns number of deleted keys"""
+    async with _connect("delete_idempotency_keys_before") as db:
+        cursor = await db.execute(
+            "DELETE FROM idempotency_keys WHERE createstamp < ?",
+            (timestamp,)
+        )
+        await db.commit()
+        return cursor.rowcount
+
+
 async def create_order(
     status: str,
     user_id: int,
     delivery_type: str,
     delivery_address: str,
     cart_items: list[dict],
-    createuser: int
+    createuser: int,
+    idempotency_key: Optional[str] = None,
+    request_hash: Optional[str] = None
 ) -> dict:
-    """Create a new order with cart items"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    """Create a new order with cart items
+
+    With idempotency_key the key is claimed for createuser in the same
+    transaction, raises DuplicateIdempotencyKey if it's already taken"""
+    async with _connect("create_order") as db:
         db.row_factory = aiosqlite.Row
         current_time = datetime.now().isoformat()
 
+        if idempotency_key is not None:
+            cursor = await db.execute(
+                """INSERT OR IGNORE INTO idempotency_keys (user_id, key, request_hash, createstamp)
+                   VALUES (?, ?, ?, ?)""",
+                (createuser, idempotency_key, request_hash, current_time)
+            )
+            if cursor.rowcount == 0:
+                await db.rollback()
+                raise DuplicateIdempotencyKey(idempotency_key)
+
         # Create order
         cursor = await db.execute(
             """INSERT INTO orders (status, user_id, createstamp, changestamp, createuser, changeuser, delivery_type, delivery_address)
@@ -1142,15 +2019,25 @@ async def create_order(
         order_id = cursor.lastrowid
 
         # Create cart items
-        for item in cart_items:
+        total = await _insert_cart_items(db, order_id, cart_items)
+        await db.execute(
+            "UPDATE orders SET total = ? WHERE id = ?",
+            (total, order_id)
+        )
+        await _apply_order_to_rollups(db, await _get_order_rollup_state(db, order_id), 1)
+
+        if idempotency_key is not None:
             await db.execute(
-                """INSERT INTO cart (order_id, good_id, count)
-                   VALUES (?, ?, ?)""",
-                (order_id, item['good_id'], item['count'])
+                "UPDATE idempotency_keys SET order_id = ? WHERE user_id = ? AND key = ?",
+                (order_id, createuser, idempotency_key)
             )
 
+        # Written in the same transaction, so the event exists iff the order does
+        event_id = await _insert_order_event(db, 'order.created', order_id, current_time)
+
         await db.commit()
         logger.info(f"Created order with id={order_id}")
+        _notify_order_event(event_id)
 
         # Return the created order
         return await get_order_by_id(order_id)
@@ -1165,10 +2052,13 @@ async def update_order(
     changeuser: int
 ) -> dict:
     """Update existing order and its cart items"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("update_order") as db:
         db.row_factory = aiosqlite.Row
         current_time = datetime.now().isoformat()
 
+        # Lock before reading, the rollups are adjusted by the difference
+        await db.execute("BEGIN IMMEDIATE")
+
         # Check if order exists
         cursor = await db.execute(
             "SELECT id FROM orders WHERE id = ?",
@@ -1180,13 +2070,15 @@ async def update_order(
             logger.error(f"Order with id={order_id} not found")
             raise ValueError(f"Order with id={order_id} not found")
 
-        # Update order
-        await db.execute(
-            """UPDATE orders
-               SET status = ?, delivery_type = ?, delivery_address = ?, changestamp = ?, changeuser = ?
-               WHERE id = ?""",
-            (status, delivery_type, delivery_address, current_time, changeuser, order_id)
+        await _apply_order_to_rollups(db, await _get_order_rollup_state(db, order_id), -1)
+
+        # Goods already in the order keep the price they were ordered at
+        cursor = await db.execute(
+            """SELECT good_id, good_name, price FROM cart
+               WHERE order_id = ? AND good_name IS NOT NULL""",
+            (order_id,)
         )
+        snapshots = {row['good_id']: (row['good_name'], row['price']) for row in await cursor.fetchall()}
 
         # Delete existing cart items
         await db.execute(
@@ -1195,15 +2087,22 @@ async def update_order(
         )
 
         # Create new cart items
-        for item in cart_items:
-            await db.execute(
-                """INSERT INTO cart (order_id, good_id, count)
-                   VALUES (?, ?, ?)""",
-                (order_id, item['good_id'], item['count'])
-            )
+        total = await _insert_cart_items(db, order_id, cart_items, snapshots)
+
+        # Update order
+        await db.execute(
+            """UPDATE orders
+               SET status = ?, delivery_type = ?, delivery_address = ?, changestamp = ?, changeuser = ?, total = ?
+               WHERE id = ?""",
+            (status, delivery_type, delivery_address, current_time, changeuser, total, order_id)
+        )
+        await _apply_order_to_rollups(db, await _get_order_rollup_state(db, order_id), 1)
+
+        event_id = await _insert_order_event(db, 'order.updated', order_id, current_time)
 
         await db.commit()
         logger.info(f"Updated order with id={order_id}")
+        _notify_order_event(event_id)
 
         # Return the updated order
         return await get_order_by_id(order_id)
@@ -1211,12 +2110,15 @@ async def update_order(
 
 async def get_order_by_id(order_id: int) -> dict:
     """Get order by id with cart items and good details"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("get_order_by_id") as db:
         db.row_factory = aiosqlite.Row
 
         # Get order details
         cursor = await db.execute(
-            "SELECT * FROM orders WHERE id = ?",
+            """SELECT o.*, u.phone AS user_phone
+               FROM orders o
+               LEFT JOIN user_info u ON o.user_id = u.id
+               WHERE o.id = ?""",
             (order_id,)
         )
         order_row = await cursor.fetchone()
@@ -1227,10 +2129,10 @@ async def get_order_by_id(order_id: int) -> dict:
 
         # Get cart items with good details
         cursor = await db.execute(
-            """SELECT c.id, c.good_id, c.count, g.name as good_name, g.price
-               FROM cart c
-               JOIN goods g ON c.good_id = g.id
-               WHERE c.order_id = ?""",
+            """SELECT id, good_id, count, good_name, price, line_total
+               FROM cart
+               WHERE order_id = ? AND good_name IS NOT NULL
+               ORDER BY id ASC""",
             (order_id,)
         )
         cart_rows = await cursor.fetchall()
@@ -1240,19 +2142,22 @@ async def get_order_by_id(order_id: int) -> dict:
             'id': order_row['id'],
             'status': order_row['status'],
             'user_id': order_row['user_id'],
+            'user_phone': order_row['user_phone'],
             'createstamp': order_row['createstamp'],
             'changestamp': order_row['changestamp'],
             'createuser': order_row['createuser'],
             'changeuser': order_row['changeuser'],
             'delivery_type': order_row['delivery_type'],
             'delivery_address': order_row['delivery_address'],
+            'total': order_row['total'],
             'cart_items': [
                 {
                     'id': row['id'],
                     'good_id': row['good_id'],
                     'good_name': row['good_name'],
                     'count': row['count'],
-                    'price': row['price']
+                    'price': row['price'],
+                    'line_total': row['line_total']
                 }
                 for row in cart_rows
             ]
@@ -1262,77 +2167,144 @@ async def get_order_by_id(order_id: int) -> dict:
         return result
 
 
+def _cart_item_from_row(row: aiosqlite.Row) -> dict:
+    """Convert cart row to the cart item format of orders"""
+    return {
+        'id': row['id'],
+        'good_id': row['good_id'],
+        'good_name': row['good_name'],
+        'count': row['count'],
+        'price': row['price'],
+        'line_total': row['line_total']
+    }
+
+
+def _order_from_row(order_row: aiosqlite.Row, cart_items: list[dict]) -> dict:
+    """Convert orders row and its cart items to the format of get_orders() items"""
+    return {
+        'id': order_row['id'],
+        'status': order_row['status'],
+        'user_id': order_row['user_id'],
+        'createstamp': order_row['createstamp'],
+        'changestamp': order_row['changestamp'],
+        'createuser': order_row['createuser'],
+        'changeuser': order_row['changeuser'],
+        'delivery_type': order_row['delivery_type'],
+        'delivery_address': order_row['delivery_address'],
+        'total': order_row['total'],
+        'cart_items': cart_items
+    }
+
+
+async def _get_cart_items(db: aiosqlite.Connection, order_ids: list[int]) -> dict[int, list[dict]]:
+    """Get cart items of several orders with one query: order id -> cart items"""
+    cursor = await db.execute(
+        f"""SELECT id, order_id, good_id, count, good_name, price, line_total
+            FROM cart
+            WHERE order_id IN ({', '.join('?' * len(order_ids))}) AND good_name IS NOT NULL
+            ORDER BY id ASC""",
+        order_ids
+    )
+    cart_items = {order_id: [] for order_id in order_ids}
+    for row in await cursor.fetchall():
+        cart_items[row['order_id']].append(_cart_item_from_row(row))
+    return cart_items
+
+
+def _orders_query(
+    columns: str,
+    order_id_filter: Optional[int],
+    status_filter: Optional[str],
+    user_id_filter: Optional[int] = None
+) -> tuple[str, list]:
+    """Build the filtered orders query (without ORDER BY) and its parameters"""
+    query = f"SELECT {columns} FROM orders o LEFT JOIN user_info u ON o.user_id = u.id WHERE 1=1"
+    params = []
+
+    if order_id_filter is not None:
+        query += " AND o.id = ?"
+        params.append(order_id_filter)
+
+    if status_filter is not None:
+        query += " AND o.status = ?"
+        params.append(status_filter)
+
+    if user_id_filter is not None:
+        query += " AND o.user_id = ?"
+        params.append(user_id_filter)
+
+    return query, params
+
+
 async def get_orders(order_id_filter: Optional[int] = None, status_filter: Optional[str] = None, user_id_filter: Optional[int] = None) -> list[dict]:
     """Get all orders with optional filters"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("get_orders") as db:
         db.row_factory = aiosqlite.Row
 
-        # Build query with filters
-        query = "SELECT * FROM orders WHERE 1=1"
-        params = []
+        query, params = _orders_query("o.*", order_id_filter, status_filter, user_id_filter)
+        cursor = await db.execute(query + " ORDER BY o.id DESC", params)
+        order_rows = await cursor.fetchall()
 
-        if order_id_filter is not None:
-            query += " AND id = ?"
-            params.append(order_id_filter)
+        # Get cart items in batches, keeps the IN lists within SQLite limits
+        results = []
+        for start in range(0, len(order_rows), ORDERS_PAGE_SIZE):
+            page = order_rows[start:start + ORDERS_PAGE_SIZE]
+            cart_items = await _get_cart_items(db, [order_row['id'] for order_row in page])
+            results.extend(_order_from_row(order_row, cart_items[order_row['id']]) for order_row in page)
 
-        if status_filter is not None:
-            query += " AND status = ?"
-            params.append(status_filter)
+        logger.info(f"Retrieved {len(results)} orders")
+        return results
 
-        if user_id_filter is not None:
-            query += " AND user_id = ?"
-            params.append(user_id_filter)
 
-        query += " ORDER BY id DESC"
+async def iter_orders(order_id_filter: Optional[int] = None, status_filter: Optional[str] = None, batch_size: int = ORDERS_PAGE_SIZE):
+    """Iterate over orders with optional filters without loading them all in memory
 
-        # Get orders
-        cursor = await db.execute(query, params)
-        order_rows = await cursor.fetchall()
+    Orders are read in pages of batch_size by descending id, each page with
+    its own connection, so no read transaction stays open while the caller
+    handles the orders (e.g. while a slow client downloads them)
+
+    Yields:
+        dict: order in the same format as get_orders() items plus user_phone
+    """
+    query, params = _orders_query("o.*, u.phone AS user_phone", order_id_filter, status_filter)
+    before_id = None
+    count = 0
+
+    while True:
+        async with _connect("iter_orders") as db:
+            db.row_factory = aiosqlite.Row
+
+            if before_id is None:
+                cursor = await db.execute(query + " ORDER BY o.id DESC LIMIT ?", [*params, batch_size])
+            else:
+                cursor = await db.execute(
+                    query + " AND o.id < ? ORDER BY o.id DESC LIMIT ?", [*params, before_id, batch_size]
+                )
+            order_rows = await cursor.fetchall()
+            if not order_rows:
+                break
+
+            cart_items = await _get_cart_items(db, [order_row['id'] for order_row in order_rows])
 
-        # Build results with cart items
-        results = []
         for order_row in order_rows:
-            order_id = order_row['id']
+            order = _order_from_row(order_row, cart_items[order_row['id']])
+            order['user_phone'] = order_row['user_phone']
+            count += 1
+            yield order
 
-            # Get cart items for this order
-            cursor = await db.execute(
-                """SELECT c.id, c.good_id, c.count, g.name as good_name, g.price
-                   FROM cart c
-                   JOIN goods g ON c.good_id = g.id
-                   WHERE c.order_id = ?""",
-                (order_id,)
-            )
-            cart_rows = await cursor.fetchall()
-
-            results.append({
-                'id': order_row['id'],
-                'status': order_row['status'],
-                'user_id': order_row['user_id'],
-                'createstamp': order_row['createstamp'],
-                'changestamp': order_row['changestamp'],
-                'createuser': order_row['createuser'],
-                'changeuser': order_row['changeuser'],
-                'delivery_type': order_row['delivery_type'],
-                'delivery_address': order_row['delivery_address'],
-                'cart_items': [
-                    {
-                        'id': row['id'],
-                        'good_id': row['good_id'],
-                        'good_name': row['good_name'],
-                        'count': row['count'],
-                        'price': row['price']
-                    }
-                    for row in cart_rows
-                ]
-            })
+        if len(order_rows) < batch_size:
+            break
+        before_id = order_rows[-1]['id']
 
-        logger.info(f"Retrieved {len(results)} orders")
-        return results
+    logger.info(f"Iterated over {count} orders")
 
 
 async def delete_order(order_id: int) -> None:
     """Delete order and its cart items (CASCADE)"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _connect("delete_order") as db:
+        # Lock before reading, the rollups are adjusted by the removed order
+        await db.execute("BEGIN IMMEDIATE")
+
         # Check if order exists
         cursor = await db.execute(
             "SELECT id FROM orders WHERE id = ?",
@@ -1344,6 +2316,8 @@ async def delete_order(order_id: int) -> None:
             logger.error(f"Order with id={order_id} not found")
             raise ValueError(f"Order with id={order_id} not found")
 
+        await _apply_order_to_rollups(db, await _get_order_rollup_state(db, order_id), -1)
+
         # Delete order (cart items will be deleted automatically due to CASCADE)
         await db.execute(
             "DELETE FROM orders WHERE id = ?",
@@ -1351,3 +2325,149 @@ async def delete_order(order_id: int) -> None:
         )
         await db.commit()
         logger.info(f"Deleted order with id={order_id}")
+
+
+async def create_upload_session(
+    session_id: str,
+    filename: str,
+    size: int,
+    good_id: Optional[int],
+    expirestamp: str,
+    createuser: int
+) -> dict:
+    """Create a new resumable upload session"""
+    async with _connect("create_upload_session") as db:
+        db.row_factory = aiosqlite.Row
+        current_time = datetime.now().isoformat()
+
+        await db.execute(
+            """INSERT INTO upload_sessions (id, status, good_id, filename, size, upload_offset, createstamp, changestamp, expirestamp, createuser)
+               VALUES (?, 'NEW', ?, ?, ?, 0, ?, ?, ?, ?)""",
+            (session_id, good_id, filename, size, current_time, current_time, expirestamp, createuser)
+        )
+        await db.commit()
+
+        cursor = await db.execute(
+            "SELECT * FROM upload_sessions WHERE id = ?",
+            (session_id,)
+        )
+        row = await cursor.fetchone()
+
+        result = dict(row)
+        logger.info(f"Created upload session id={session_id} for {filename} ({size} bytes)")
+        return result
+
+
+async def get_upload_session(session_id: str) -> Optional[dict]:
+    """Get upload session by id (expired sessions are not returned)"""
+    async with _connect("get_upload_session") as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            "SELECT * FROM upload_sessions WHERE id = ? AND expirestamp > ?",
+            (session_id, datetime.now().isoformat())
+        )
+        row = await cursor.fetchone()
+
+        if row:
+            return dict(row)
+        return None
+
+
+async def update_upload_session_offset(session_id: str, expected_offset: int, new_offset: int) -> bool:
+    """Advance upload offset if it still equals expected_offset
+
+    Returns False if another request has moved the offset in the meantime
+    """
+    async with _connect("update_upload_session_offset") as db:
+        current_time = datetime.now().isoformat()
+        cursor = await db.execute(
+            """UPDATE upload_sessions
+               SET upload_offset = ?, changestamp = ?
+               WHERE id = ? AND upload_offset = ? AND status = 'NEW'""",
+            (new_offset, current_time, session_id, expected_offset)
+        )
+        await db.commit()
+        return cursor.rowcount == 1
+
+
+async def claim_upload_session(session_id: str, stale_before: str) -> Optional[str]:
+    """Move a fully uploaded session to FINALIZING
+
+    A session left FINALIZING since before stale_before (its finalize
+    request died) is claimed again.
+
+    Returns:
+        claim stamp to pass to complete/release_upload_session, None if the
+        session is not complete or another finalize request holds it
+    """
+    async with _connect("claim_upload_session") as db:
+        current_time = datetime.now().isoformat()
+        cursor = await db.execute(
+            """UPDATE upload_sessions
+               SET status = 'FINALIZING', changestamp = ?
+               WHERE id = ? AND upload_offset = size
+                 AND (status = 'NEW' OR (status = 'FINALIZING' AND changestamp < ?))""",
+            (current_time, session_id, stale_before)
+        )
+        await db.commit()
+        return current_time if cursor.rowcount == 1 else None
+
+
+async def release_upload_session(session_id: str, claimed_at: str) -> None:
+    """Return a FINALIZING session to NEW after a failed finalize, so it can be retried"""
+    async with _connect("release_upload_session") as db:
+        current_time = datetime.now().isoformat()
+        await db.execute(
+            """UPDATE upload_sessions
+               SET status = 'NEW', changestamp = ?
+               WHERE id = ? AND status = 'FINALIZING' AND changestamp = ?""",
+            (current_time, session_id, claimed_at)
+        )
+        await db.commit()
+
+
+async def complete_upload_session(session_id: str, claimed_at: str, image: dict, good_id: Optional[int]) -> bool:
+    """Attach the image to good_id (if any) and mark the session completed in one transaction
+
+    Returns False without changing anything if the claim was lost, e.g. the
+    session was reclaimed as stale by another request
+    """
+    async with _connect("complete_upload_session") as db:
+        await db.execute("BEGIN IMMEDIATE")
+        current_time = datetime.now().isoformat()
+        cursor = await db.execute(
+            """UPDATE upload_sessions
+               SET status = 'COMPLETED', image_url = ?, changestamp = ?
+               WHERE id = ? AND status = 'FINALIZING' AND changestamp = ?""",
+            (image['image_url'], current_time, session_id, claimed_at)
+        )
+        if cursor.rowcount != 1:
+            await db.rollback()
+            return False
+
+        if good_id is not None:
+            await _insert_good_images(db, good_id, [image])
+        await db.commit()
+        logger.info(f"Completed upload session id={session_id}")
+        return True
+
+
+async def delete_expired_upload_sessions() -> list[str]:
+    """Delete expired upload sessions and return their ids"""
+    async with _connect("delete_expired_upload_sessions") as db:
+        current_time = datetime.now().isoformat()
+        cursor = await db.execute(
+            "SELECT id FROM upload_sessions WHERE expirestamp <= ?",
+            (current_time,)
+        )
+        session_ids = [row[0] for row in await cursor.fetchall()]
+
+        if session_ids:
+            await db.execute(
+                "DELETE FROM upload_sessions WHERE expirestamp <= ?",
+                (current_time,)
+            )
+            await db.commit()
+            logger.info(f"Deleted {len(session_ids)} expired upload sessions")
+
+        return session_ids
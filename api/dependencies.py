@@ -1,18 +1,30 @@
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 
 from auth import verify_telegram_init_data
-from database import get_user
+from user_cache import get_cached_user
 
 
-async def verify_admin_mode(user_id: int = Depends(verify_telegram_init_data)) -> int:
+async def get_current_user(user_id: int = Depends(verify_telegram_init_data)) -> Optional[dict]:
+    """
+    Get the authenticated user's row (None if the user isn't in the database)
+
+    FastAPI resolves a dependency once per request, so handlers and other
+    dependencies using this share a single (cached) user lookup
+    """
+    return await get_cached_user(user_id)
+
+
+async def verify_admin_mode(
+    user_id: int = Depends(verify_telegram_init_data),
+    user: Optional[dict] = Depends(get_current_user)
+) -> int:
     """
     Verify that the user has ADMIN role
 
     Requires valid Telegram WebApp initData in Authorization header
     Returns user_id if user has ADMIN role, raises 403 otherwise
     """
-    user = await get_user(user_id)
-
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1,34 +1,66 @@
+import asyncio
 import logging
+import os
+from contextlib import asynccontextmanager
 from pathlib import Path
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from routers import users, goods, uploads, shop_addresses, health, promo_banners, categories, orders
+from auth import init_auth
+from user_cache import UserLookupCounterMiddleware
+from metrics import MetricsMiddleware
+from access_log import AccessLogMiddleware, start_log_queue, stop_log_queue
+from loop_monitor import loop_monitor
+from tracing import TracingMiddleware
+from order_events import order_events
+from user_events import user_change_feed
+from idempotency import sweep_expired_keys
+from routers import users, goods, uploads, shop_addresses, health, promo_banners, categories, orders, images, upload_sessions, catalog, sessions, metrics, debug
 
 logger = logging.getLogger(__name__)
 
-# Create FastAPI app
-app = FastAPI(title="FanFanTulpan API", version="1.0.0")
+# Same switch as bot.py. The webhook router creates the bot on import, so
+# in polling mode (the bot runs as its own service) it isn't imported at all
+WEBHOOK_ENABLED = os.getenv("BOT_MODE", "polling") == "webhook"
+if WEBHOOK_ENABLED:
+    from routers import telegram_webhook
+
 
-# Middleware for logging all requests
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    logger.info(f"[REQUEST] {request.method} {request.url.path} - Client: {request.client.host if request.client else 'unknown'}")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Prepare shared state once before serving requests"""
+    # Write log lines from a listener thread instead of the event loop
+    start_log_queue()
+    # Measures event loop lag and logs what blocks the loop
+    loop_monitor.start()
+    # Derive Telegram initData secret key once instead of on every request
+    init_auth()
+    # Tails the order_events table for the admin order feed
+    order_events.start()
+    # Tails the user_changes table for users saved by other processes
+    user_change_feed.start()
+    # Deletes expired Idempotency-Key records of POST /orders
+    sweeper = asyncio.create_task(sweep_expired_keys())
+    yield
 
-    # Special logging for DELETE requests
-    if request.method == "DELETE":
-        logger.warning(f"[DELETE REQUEST DETECTED] Path: {request.url.path}, Headers: {dict(request.headers)}")
+    sweeper.cancel()
+    await user_change_feed.stop()
+    await order_events.stop()
+    await loop_monitor.stop()
 
-    response = await call_next(request)
+    if WEBHOOK_ENABLED:
+        await telegram_webhook.bot.session.close()
 
-    logger.info(f"[RESPONSE] {request.method} {request.url.path} - Status: {response.status_code}")
+    stop_log_queue()
 
-    return response
+
+# Create FastAPI app
+app = FastAPI(title="FanFanTulpan API", version="1.0.0", lifespan=lifespan)
 
 # Upload configuration
 # Use /app/data/uploads to leverage the Docker volume mount
-UPLOAD_DIR = Path("/app/data/uploads")
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "/app/data/uploads"))
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 # Configure CORS
@@ -43,10 +75,27 @@ app.add_middleware(
         "https://www.cadra.online"
     ],
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE"],
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE"],
     allow_headers=["*"],
+    expose_headers=["Upload-Offset", "X-User-Lookups", "X-Trace-Id"],
 )
 
+# Count user lookups per request (X-User-Lookups header)
+app.add_middleware(UserLookupCounterMiddleware)
+
+# One structured access log record per request (replaces uvicorn's access log)
+app.add_middleware(AccessLogMiddleware)
+
+# Wraps the middlewares above and times the whole request
+app.add_middleware(MetricsMiddleware)
+
+# Outermost, so every span of a request and its access log share a trace id.
+# Trace id in X-Trace-Id, spans viewable at /debug/traces
+app.add_middleware(TracingMiddleware)
+
+# Resized image variants - must be registered before the /static mount
+app.include_router(images.router)
+
 # Mount static files directory for serving uploaded images
 app.mount("/static", StaticFiles(directory=UPLOAD_DIR), name="static")
 
@@ -59,3 +108,12 @@ app.include_router(health.router)
 app.include_router(promo_banners.router)
 app.include_router(categories.router)
 app.include_router(orders.router)
+app.include_router(upload_sessions.router)
+app.include_router(catalog.router)
+app.include_router(sessions.router)
+app.include_router(metrics.router)
+app.include_router(debug.router)
+
+# Telegram posts bot updates here instead of bot.py polling for them
+if WEBHOOK_ENABLED:
+    app.include_router(telegram_webhook.router)
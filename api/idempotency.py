@@ -0,0 +1,54 @@
+"""
+Idempotency-Key support: in-process coalescing and expiry of stored keys
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Hashable
+
+from database import delete_idempotency_keys_before
+
+logger = logging.getLogger(__name__)
+
+# Keys (and their stored responses) are kept this long
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+SWEEP_INTERVAL = 3600
+
+# Requests currently being processed, by scope and key
+_in_flight: dict[Hashable, asyncio.Task] = {}
+
+
+async def run_once(key: Hashable, factory: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+    """
+    Run factory, or join the identical request already running in this process
+
+    Duplicates across processes are caught by the unique index instead
+
+    Returns:
+        tuple: factory result and whether it came from a request that was
+        already running (so this request is a replay)
+    """
+    task = _in_flight.get(key)
+    joined = task is not None
+    if not joined:
+        task = asyncio.ensure_future(factory())
+        _in_flight[key] = task
+        task.add_done_callback(lambda t: _in_flight.pop(key, None))
+
+    # Shield so a client giving up doesn't cancel the request others wait for
+    return await asyncio.shield(task), joined
+
+
+async def sweep_expired_keys() -> None:
+    """Delete expired idempotency keys every SWEEP_INTERVAL seconds"""
+    while True:
+        try:
+            before = (datetime.now() - timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS)).isoformat()
+            deleted = await delete_idempotency_keys_before(before)
+            if deleted:
+                logger.info(f"Deleted {deleted} expired idempotency keys")
+        except Exception as e:
+            logger.error(f"Failed to delete expired idempotency keys: {str(e)}")
+
+        await asyncio.sleep(SWEEP_INTERVAL)
@@ -0,0 +1,305 @@
+"""
+Image storage and resizing helpers shared by the image endpoints
+"""
+import asyncio
+import base64
+import io
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+from metrics import cache_hit, cache_miss, track_upload
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Upload configuration
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "/app/data/uploads"))
+PLACEHOLDER_SIZE = 16  # Longest side of the placeholder in pixels
+
+# On-demand resize configuration
+RESIZE_CACHE_DIR = Path(os.getenv("IMAGE_CACHE_DIR", "/app/data/cache/img"))
+RESIZE_WIDTHS = {160, 320, 480, 640, 960, 1280}
+# Every API worker keeps its own LRU index, so each gets an equal share of the
+# budget and the directory shared by all of them stays within IMAGE_CACHE_MAX_BYTES
+# (API_WORKERS default matches server.py)
+RESIZE_CACHE_MAX_BYTES = (
+    int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    // int(os.getenv("API_WORKERS", "2"))
+)
+RESIZE_WORKERS = int(os.getenv("IMAGE_RESIZE_WORKERS", "2"))
+RESIZABLE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+# Variants used this recently are not evicted, a response may be about to
+# open the file (once opened, it's safe to delete)
+RESIZE_EVICT_GRACE_SECONDS = 10
+
+
+def compute_image_metadata(contents: bytes) -> Optional[dict]:
+    """
+    Compute intrinsic size and a tiny base64 WebP placeholder for an image
+
+    Blocking (decodes the whole image) - call it from a worker thread
+
+    Returns:
+        dict with width, height and placeholder (data URI), or None if the
+        image can't be decoded
+    """
+    try:
+        with Image.open(io.BytesIO(contents)) as image:
+            # Phones store rotation in EXIF, browsers apply it when rendering
+            image = ImageOps.exif_transpose(image)
+            width, height = image.size
+
+            image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA")
+
+            buffer = io.BytesIO()
+            image.save(buffer, format="WEBP", quality=40)
+    except Exception as e:
+        logger.warning(f"Failed to compute image metadata: {str(e)}")
+        return None
+
+    placeholder = "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+    return {
+        "width": width,
+        "height": height,
+        "placeholder": placeholder
+    }
+
+
+def _write_image(file_path: Path, contents: bytes) -> Optional[dict]:
+    """Write image to disk and compute its metadata (runs in a worker thread)"""
+    with open(file_path, "wb") as f:
+        f.write(contents)
+    return compute_image_metadata(contents)
+
+
+async def save_image(contents: bytes, file_ext: str) -> dict:
+    """
+    Save uploaded image under a unique name and compute its metadata
+
+    Disk write and image decoding run off the event loop
+
+    Returns:
+        dict with image_url, width, height and placeholder
+        (metadata fields are None if the image can't be decoded)
+    """
+    # Generate unique filename
+    timestamp = int(datetime.now().timestamp())
+    unique_id = uuid.uuid4().hex[:8]
+    filename = f"{timestamp}-{unique_id}{file_ext}"
+    file_path = UPLOAD_DIR / filename
+
+    with track_upload("image", len(contents)):
+        metadata = await asyncio.to_thread(_write_image, file_path, contents)
+    logger.info(f"Image saved: {filename}")
+
+    metadata = metadata or {}
+    return {
+        # URL includes /api prefix for nginx proxy routing
+        "image_url": f"/api/static/{filename}",
+        "width": metadata.get("width"),
+        "height": metadata.get("height"),
+        "placeholder": metadata.get("placeholder")
+    }
+
+
+async def delete_images(images: list[dict]) -> None:
+    """Delete files of saved images that ended up not being used"""
+    for image in images:
+        file_path = UPLOAD_DIR / Path(image["image_url"]).name
+        try:
+            await asyncio.to_thread(file_path.unlink, missing_ok=True)
+        except OSError as e:
+            logger.error(f"Failed to delete unused image {file_path.name}: {str(e)}")
+
+
+def _resize_to_file(source: Path, target: Path, width: int) -> int:
+    """
+    Resize source image to the given width and write it to target
+
+    Never upscales. Writes to a temporary file first so readers never see
+    a partially written variant. Runs in the resize worker pool.
+
+    Returns:
+        int: size of the written file in bytes
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}.tmp")
+
+    with Image.open(source) as image:
+        image_format = image.format
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+
+        if image_format == "JPEG":
+            image.convert("RGB").save(tmp_path, format="JPEG", quality=82, optimize=True, progressive=True)
+        elif image_format == "WEBP":
+            image.save(tmp_path, format="WEBP", quality=80)
+        else:
+            image.save(tmp_path, format=image_format or "PNG", optimize=True)
+
+    os.replace(tmp_path, target)
+    return target.stat().st_size
+
+
+def _list_cache_files(cache_dir: Path) -> list[tuple[Path, int]]:
+    """Cached variants and their sizes, least recently accessed first (runs in a worker thread)"""
+    if not cache_dir.exists():
+        return []
+
+    files = []
+    for path in cache_dir.glob("*/*"):
+        if path.name.startswith("."):
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            # Evicted by another process meanwhile
+            continue
+        files.append((stat.st_atime, path, stat.st_size))
+
+    return [(path, size) for _, path, size in sorted(files)]
+
+
+def _unlink_files(paths: list[Path]) -> None:
+    """Delete files, skipping already deleted ones (runs in a worker thread)"""
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+
+class ResizedImageCache:
+    """
+    On-disk cache of resized image variants with an LRU size budget
+
+    Variants are rendered on first request in a worker pool. Concurrent
+    requests for the same variant share one render. The LRU index lives
+    in memory and is rebuilt from the directory on first use, so max_bytes
+    is the budget of one process. Variants used within
+    RESIZE_EVICT_GRACE_SECONDS are kept even over budget.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int, workers: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-resize")
+        # path -> (size, time.monotonic() of last use), least recently used first
+        self._entries: OrderedDict[Path, tuple[int, float]] = OrderedDict()
+        self._total_bytes = 0
+        self._pending: dict[Path, asyncio.Task] = {}
+        self._load_task: Optional[asyncio.Task] = None
+
+    async def _load(self) -> None:
+        """Seed the LRU index from files already on disk (oldest access first)"""
+        try:
+            files = await asyncio.to_thread(_list_cache_files, self.cache_dir)
+        except OSError as e:
+            logger.error(f"Failed to scan resized image cache, starting with an empty index: {str(e)}")
+            return
+
+        for path, size in files:
+            # Not used by this process yet, evictable right away
+            self._entries[path] = (size, 0.0)
+            self._total_bytes += size
+
+        logger.info(f"Loaded {len(self._entries)} resized images ({self._total_bytes} bytes) into cache index")
+        await self._evict()
+
+    async def _evict(self) -> None:
+        """Drop least recently used variants until the cache fits its budget"""
+        grace_start = time.monotonic() - RESIZE_EVICT_GRACE_SECONDS
+        evicted = []
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            path, (size, last_used) = next(iter(self._entries.items()))
+            if last_used > grace_start:
+                # Everything else was used even more recently, stay over
+                # budget until the next render
+                break
+            del self._entries[path]
+            self._total_bytes -= size
+            evicted.append(path)
+
+        if not evicted:
+            return
+        # Dropped from the index first, so concurrent renders don't evict them twice
+        try:
+            await asyncio.to_thread(_unlink_files, evicted)
+        except OSError as e:
+            logger.error(f"Failed to delete evicted resized images: {str(e)}")
+            return
+        logger.info(f"Evicted {len(evicted)} resized images")
+
+    async def get(self, width: int, filename: str) -> Path:
+        """
+        Get path of the resized variant, rendering it if needed
+
+        Raises:
+            ValueError: If width or filename is not allowed
+            FileNotFoundError: If the source image doesn't exist
+        """
+        if width not in RESIZE_WIDTHS:
+            raise ValueError(f"Width {width} is not allowed")
+        if Path(filename).name != filename or Path(filename).suffix.lower() not in RESIZABLE_EXTENSIONS:
+            raise ValueError(f"Invalid image filename {filename}")
+
+        if self._load_task is None:
+            self._load_task = asyncio.ensure_future(self._load())
+        await asyncio.shield(self._load_task)
+
+        target = self.cache_dir / str(width) / filename
+
+        entry = self._entries.get(target)
+        if entry is not None:
+            # Another process may have evicted the file
+            if target.exists():
+                self._entries[target] = (entry[0], time.monotonic())
+                self._entries.move_to_end(target)
+                cache_hit("resized_image")
+                return target
+            del self._entries[target]
+            self._total_bytes -= entry[0]
+
+        cache_miss("resized_image")
+
+        task = self._pending.get(target)
+        if task is None:
+            task = asyncio.ensure_future(self._render(width, filename, target))
+            self._pending[target] = task
+            task.add_done_callback(lambda t: self._pending.pop(target, None))
+
+        # Shield so a disconnecting client doesn't cancel a render others wait for
+        with span("cache.resized_image.miss", width=width):
+            return await asyncio.shield(task)
+
+    async def _render(self, width: int, filename: str, target: Path) -> Path:
+        """Render variant in the worker pool and add it to the index"""
+        source = UPLOAD_DIR / filename
+        if not source.exists():
+            raise FileNotFoundError(f"Image {filename} not found")
+
+        if target.exists():
+            # Rendered by another process sharing the cache directory
+            size = target.stat().st_size
+        else:
+            loop = asyncio.get_running_loop()
+            size = await loop.run_in_executor(self._executor, _resize_to_file, source, target, width)
+            logger.info(f"Rendered resized image {width}/{filename} ({size} bytes)")
+
+        self._entries[target] = (size, time.monotonic())
+        self._total_bytes += size
+        await self._evict()
+        return target
+
+
+resized_images = ResizedImageCache(RESIZE_CACHE_DIR, RESIZE_CACHE_MAX_BYTES, RESIZE_WORKERS)
@@ -0,0 +1,111 @@
+"""
+Event loop lag monitor
+
+A task on the loop sleeps for LOOP_MONITOR_INTERVAL and records how late it
+wakes up. A watchdog thread checks that the task keeps waking up, and while
+the loop is blocked for longer than LOOP_STALL_MS it logs the stack of the
+code holding the loop.
+
+LOOP_DEBUG=1 additionally turns on asyncio debug mode, which logs every
+callback or task step running longer than LOOP_SLOW_CALLBACK_MS on the loop
+thread (it slows the loop down, don't leave it on).
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from typing import Optional
+
+from metrics import EVENT_LOOP_LAG, EVENT_LOOP_STALLS
+
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1"))
+LOOP_STALL_MS = float(os.getenv("LOOP_STALL_MS", "200"))
+LOOP_DEBUG = os.getenv("LOOP_DEBUG", "0") == "1"
+LOOP_SLOW_CALLBACK_MS = float(os.getenv("LOOP_SLOW_CALLBACK_MS", "50"))
+
+
+class LoopMonitor:
+    """Measure event loop lag and report what blocks the loop"""
+
+    def __init__(self, interval: float, stall_threshold: float):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        """Start monitoring the running loop (does nothing if already started)"""
+        if self._task is not None:
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        if LOOP_DEBUG:
+            self._loop.set_debug(True)
+            self._loop.slow_callback_duration = LOOP_SLOW_CALLBACK_MS / 1000
+            logger.warning(f"asyncio debug mode on, logging loop steps over {LOOP_SLOW_CALLBACK_MS} ms")
+
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._measure())
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        """Stop the measuring task and the watchdog thread"""
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        self._stopping.set()
+        self._thread.join(timeout=1)
+        self._thread = None
+
+    async def _measure(self) -> None:
+        """Sleep in a loop and record how late each wakeup is"""
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+
+            lag = max(0.0, now - start - self.interval)
+            EVENT_LOOP_LAG.observe(lag)
+            if lag >= self.stall_threshold:
+                logger.warning(f"Event loop was blocked for {lag * 1000:.0f} ms")
+
+    def _watch(self) -> None:
+        """Watchdog thread: log the loop thread's stack once per stall"""
+        reported_heartbeat = None
+
+        while not self._stopping.wait(self.interval):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked < self.stall_threshold or heartbeat == reported_heartbeat:
+                continue
+            reported_heartbeat = heartbeat
+
+            EVENT_LOOP_STALLS.inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "unavailable\n"
+            task = asyncio.current_task(self._loop)
+            task_name = task.get_name() if task else "a callback"
+            logger.warning(f"Event loop blocked for over {blocked * 1000:.0f} ms by {task_name}, stack:\n{stack}")
+
+
+loop_monitor = LoopMonitor(LOOP_MONITOR_INTERVAL, LOOP_STALL_MS / 1000)
@@ -0,0 +1,203 @@
+"""
+Prometheus metrics for the API
+
+Request metrics are collected by a pure ASGI middleware, database metrics by
+a call observer of database.py. With several API workers set
+PROMETHEUS_MULTIPROC_DIR so /metrics reports the sum over all workers
+instead of the one that happened to serve the scrape.
+"""
+import os
+import time
+import logging
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess
+)
+
+from database import add_call_observer
+
+logger = logging.getLogger(__name__)
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Requests that didn't match any route share one label to keep cardinality bounded
+UNMATCHED_ROUTE = "unmatched"
+
+# Most endpoints answer in milliseconds, uploads and notifications take seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route template and status",
+    ["method", "route", "status"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route"], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being served",
+    ["method"], multiprocess_mode="livesum"
+)
+
+DB_CALLS = Counter(
+    "db_calls_total", "Connections opened by database.py functions",
+    ["function"]
+)
+DB_CALL_DURATION = Histogram(
+    "db_call_duration_seconds", "Time database.py functions hold a connection",
+    ["function"], buckets=LATENCY_BUCKETS
+)
+DB_STATEMENTS = Counter(
+    "db_statements_total", "SQL statements executed by database.py functions",
+    ["function"]
+)
+# Every aiosqlite connection is a worker thread with its own request queue,
+# so open connections is how many database calls are queued or running
+DB_CONNECTIONS_OPEN = Gauge(
+    "db_connections_open", "Open aiosqlite connections",
+    multiprocess_mode="livesum"
+)
+
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "In-process cache lookups (hit ratio = hit / all)",
+    ["cache", "result"]
+)
+
+NOTIFICATIONS = Counter(
+    "notifications_total", "Order notification deliveries by channel",
+    ["channel", "result"]
+)
+NOTIFICATION_DURATION = Histogram(
+    "notification_duration_seconds", "Order notification delivery latency by channel",
+    ["channel"], buckets=LATENCY_BUCKETS
+)
+
+UPLOAD_BYTES = Counter(
+    "upload_bytes_total", "Bytes received in uploads",
+    ["kind"]
+)
+UPLOAD_PROCESSING = Histogram(
+    "upload_processing_seconds", "Time spent storing and decoding uploads",
+    ["kind"], buckets=LATENCY_BUCKETS
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "How late the loop monitor wakes up",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+EVENT_LOOP_STALLS = Counter(
+    "event_loop_stalls_total", "Times the event loop was blocked for longer than LOOP_STALL_MS"
+)
+
+
+def cache_hit(cache: str) -> None:
+    """Count a cache hit"""
+    CACHE_REQUESTS.labels(cache, "hit").inc()
+
+
+def cache_miss(cache: str) -> None:
+    """Count a cache miss"""
+    CACHE_REQUESTS.labels(cache, "miss").inc()
+
+
+@contextmanager
+def track_notification(channel: str):
+    """Time a notification delivery, an exception inside the block counts as a failure"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        NOTIFICATIONS.labels(channel, "failed").inc()
+        raise
+    else:
+        NOTIFICATIONS.labels(channel, "sent").inc()
+    finally:
+        NOTIFICATION_DURATION.labels(channel).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def track_upload(kind: str, size: int):
+    """Count uploaded bytes and time their processing"""
+    UPLOAD_BYTES.labels(kind).inc(size)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        UPLOAD_PROCESSING.labels(kind).observe(time.perf_counter() - start)
+
+
+def _db_call_started(function: str) -> None:
+    DB_CONNECTIONS_OPEN.inc()
+
+
+def _db_call_finished(function: str, duration: float, statements: int) -> None:
+    DB_CONNECTIONS_OPEN.dec()
+    DB_CALLS.labels(function).inc()
+    DB_CALL_DURATION.labels(function).observe(duration)
+    DB_STATEMENTS.labels(function).inc(statements)
+
+
+add_call_observer(_db_call_started, _db_call_finished)
+
+
+def render_metrics() -> bytes:
+    """Render metrics in the Prometheus text format"""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def _route_label(scope: dict) -> str:
+    """Route template (e.g. /orders/{order_id}) of the request, set by the router"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Mounted apps (static files) don't set a route, their mount path is in root_path
+    return scope.get("root_path") or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """
+    Record latency, status and in-flight count of HTTP requests
+
+    Pure ASGI (no request/response objects), so it adds only a few
+    microseconds per request and doesn't buffer streamed responses
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            in_flight.dec()
+            route = _route_label(scope)
+            HTTP_REQUEST_DURATION.labels(method, route).observe(duration)
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
@@ -12,6 +12,14 @@ class UserInfoDTO(BaseModel):
     phone: Optional[str] = None
 
 
+class SessionTokenDTO(BaseModel):
+    """Signed session token exchanged for Telegram initData"""
+    token: str
+    expires_at: int
+    user_id: int
+    role: str
+
+
 class GoodCardRequest(BaseModel):
     """Request model for creating a new good card"""
     name: str
@@ -25,6 +33,9 @@ class ImageDTO(BaseModel):
     """Data transfer object for product images"""
     image_url: str
     display_order: int
+    placeholder: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
 
 
 class GoodDTO(BaseModel):
@@ -39,6 +50,20 @@ class GoodDTO(BaseModel):
     status: str
 
 
+class CatalogImportError(BaseModel):
+    """Error for a single catalog row that failed to import"""
+    row: int
+    error: str
+
+
+class CatalogImportResult(BaseModel):
+    """Result of a bulk catalog import"""
+    imported: int
+    failed: int
+    good_ids: list[int]
+    errors: list[CatalogImportError]
+
+
 class ShopAddressDTO(BaseModel):
     """Data transfer object for shop addresses"""
     id: int
@@ -55,6 +80,25 @@ class ImageReorderRequest(BaseModel):
     imageUrls: list[str]
 
 
+class UploadSessionRequest(BaseModel):
+    """Request model for starting a resumable image upload"""
+    filename: str
+    size: int
+    good_id: Optional[int] = None
+
+
+class UploadSessionDTO(BaseModel):
+    """Data transfer object for resumable upload sessions"""
+    id: str
+    status: str
+    filename: str
+    size: int
+    offset: int
+    good_id: Optional[int] = None
+    expirestamp: str
+    image_url: Optional[str] = None
+
+
 class PromoBannerDTO(BaseModel):
     """Data transfer object for promo banners"""
     id: int
@@ -62,6 +106,9 @@ class PromoBannerDTO(BaseModel):
     display_order: int
     image_url: str
     link: Optional[int] = None
+    placeholder: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
 
 
 class CategoryDTO(BaseModel):
@@ -116,7 +163,8 @@ class CartItemDTO(BaseModel):
     good_id: int
     good_name: str
     count: int
-    price: int
+    price: int  # Unit price at order time
+    line_total: Optional[int] = None
 
 
 class OrderRequest(BaseModel):
@@ -140,4 +188,49 @@ class OrderDTO(BaseModel):
     changeuser: Optional[int] = None
     delivery_type: str
     delivery_address: str
+    total: Optional[int] = None
     cart_items: list[CartItemDTO]
+
+
+class SalesDailyDTO(BaseModel):
+    """Orders and revenue for one day"""
+    day: str
+    orders: int
+    revenue: int
+
+
+class SalesByStatusDTO(BaseModel):
+    """Number of orders and their total for one status"""
+    status: str
+    orders: int
+    revenue: int
+
+
+class SalesByDeliveryTypeDTO(BaseModel):
+    """Orders and revenue for one delivery type"""
+    delivery_type: str
+    orders: int
+    revenue: int
+
+
+class SalesByGoodDTO(BaseModel):
+    """Units sold and revenue for one good"""
+    good_id: int
+    good_name: Optional[str] = None
+    units: int
+    revenue: int
+
+
+class QueryStatsDTO(BaseModel):
+    """Timings of one normalized SQL statement"""
+    sql: str
+    count: int
+    total_ms: float
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    slow_count: int
+    param_shapes: list[str]
+    plan: Optional[list[str]] = None
@@ -2,6 +2,7 @@
 Notifications module for sending order notifications via Telegram and email
 """
 import os
+import asyncio
 import logging
 import smtplib
 from email.mime.text import MIMEText
@@ -11,6 +12,8 @@ from typing import Optional
 from aiogram import Bot
 
 from database import get_setting_by_type, get_user
+from metrics import track_notification
+from tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -41,7 +44,8 @@ async def send_order_notification_to_manager(order_data: dict) -> bool:
         
         manager_chat_id = manager_setting['value']
         
-        # Get user information
+        # Get user information (from the database, the phone may have just
+        # been saved by the bot and not reached this worker's cache yet)
         user = await get_user(order_data['user_id'])
         username = (user.get('username') or 'не указан') if user else 'не указан'
         phone = (user.get('phone') or 'не указан') if user else 'не указан'
@@ -50,12 +54,12 @@ async def send_order_notification_to_manager(order_data: dict) -> bool:
         delivery_type_text = "Самовывоз" if order_data['delivery_type'] == 'PICK_UP' else "Курьером"
         
         # Calculate total price
-        total_price = sum(item['price'] * item['count'] for item in order_data['cart_items'])
+        total_price = order_data['total']
         
         # Format order items
         items_text = ""
         for idx, item in enumerate(order_data['cart_items'], 1):
-            item_total = item['price'] * item['count']
+            item_total = item['line_total']
             items_text += f"{idx}. {item['good_name']} x{item['count']} - {item_total}₽\n"
         
         # Format creation timestamp
@@ -88,11 +92,12 @@ async def send_order_notification_to_manager(order_data: dict) -> bool:
         # Send notification
         bot = Bot(token=bot_token)
         try:
-            await bot.send_message(
-                chat_id=manager_chat_id,
-                text=message,
-                parse_mode="HTML"
-            )
+            with span("notification.telegram"), track_notification("telegram"):
+                await bot.send_message(
+                    chat_id=manager_chat_id,
+                    text=message,
+                    parse_mode="HTML"
+                )
             logger.info(f"Successfully sent order notification for order #{order_data['id']} to manager chat {manager_chat_id}")
             return True
         finally:
@@ -104,6 +109,19 @@ async def send_order_notification_to_manager(order_data: dict) -> bool:
         return False
 
 
+def _send_email(smtp_host: str, smtp_port: int, login: str, password: str, msg: MIMEMultipart) -> None:
+    """Send email over SMTP with STARTTLS (blocking, runs in a worker thread)"""
+    with span("smtp.connect", host=smtp_host, port=smtp_port):
+        server = smtplib.SMTP(smtp_host, smtp_port)
+    with server:
+        with span("smtp.starttls"):
+            server.starttls()
+        with span("smtp.login"):
+            server.login(login, password)
+        with span("smtp.send"):
+            server.send_message(msg)
+
+
 async def send_order_notification_to_email(order_data: dict) -> bool:
     """
     Send order notification via email
@@ -155,7 +173,8 @@ async def send_order_notification_to_email(order_data: dict) -> bool:
         smtp_host = smtp_host_setting['value']
         smtp_port = int(smtp_port_setting['value'])
 
-        # Get user information
+        # Get user information (from the database, the phone may have just
+        # been saved by the bot and not reached this worker's cache yet)
         user = await get_user(order_data['user_id'])
         username = (user.get('username') or 'не указан') if user else 'не указан'
         phone = (user.get('phone') or 'не указан') if user else 'не указан'
@@ -164,12 +183,12 @@ async def send_order_notification_to_email(order_data: dict) -> bool:
         delivery_type_text = "Самовывоз" if order_data['delivery_type'] == 'PICK_UP' else "Курьером"
 
         # Calculate total price
-        total_price = sum(item['price'] * item['count'] for item in order_data['cart_items'])
+        total_price = order_data['total']
 
         # Format order items
         items_text = ""
         for idx, item in enumerate(order_data['cart_items'], 1):
-            item_total = item['price'] * item['count']
+            item_total = item['line_total']
             items_text += f"{idx}. {item['good_name']} x{item['count']} - {item_total} руб.\n"
 
         # Format creation timestamp
@@ -209,10 +228,8 @@ Username: {'@' + username if username != 'не указан' else 'не указ
         # Send email
         logger.info(f"Sending email notification for order #{order_data['id']} via {smtp_host}:{smtp_port}")
 
-        with smtplib.SMTP(smtp_host, smtp_port) as server:
-            server.starttls()
-            server.login(order_email, order_password)
-            server.send_message(msg)
+        with span("notification.email"), track_notification("email"):
+            await asyncio.to_thread(_send_email, smtp_host, smtp_port, order_email, order_password, msg)
 
         logger.info(f"Successfully sent email notification for order #{order_data['id']}")
         return True
@@ -0,0 +1,184 @@
+"""
+Pub/sub of committed order events for the admin order feed
+
+Events are read from the order_events table, so events committed by other
+API workers are delivered too and reconnecting clients can resume from the
+last event id they received
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from database import (
+    get_order_by_id,
+    get_order_events,
+    get_last_order_event_id,
+    delete_order_events_before,
+    add_order_event_listener
+)
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per subscriber before it's considered too slow and dropped
+ORDER_EVENTS_QUEUE_SIZE = int(os.getenv("ORDER_EVENTS_QUEUE_SIZE", "100"))
+# How often the table is checked for events committed by other processes
+ORDER_EVENTS_POLL_INTERVAL = float(os.getenv("ORDER_EVENTS_POLL_INTERVAL", "1"))
+# Clients missing more events than this have to reload the order list
+ORDER_EVENTS_REPLAY_LIMIT = int(os.getenv("ORDER_EVENTS_REPLAY_LIMIT", "500"))
+ORDER_EVENTS_RETENTION_DAYS = int(os.getenv("ORDER_EVENTS_RETENTION_DAYS", "7"))
+
+BATCH_SIZE = 100
+PRUNE_INTERVAL = 3600
+
+
+class Subscription:
+    """Queue of hydrated events for one client, None in the queue means it was dropped"""
+
+    def __init__(self, after_id: int):
+        self.after_id = after_id
+        self.queue: asyncio.Queue[Optional[dict]] = asyncio.Queue(ORDER_EVENTS_QUEUE_SIZE)
+
+
+class OrderEventBroker:
+    """
+    Fan out order events to subscribers
+
+    A single background task tails the order_events table (woken up right
+    away for events committed by this process) and loads each order once,
+    however many subscribers there are
+    """
+
+    def __init__(self):
+        self._subscribers: set[Subscription] = set()
+        self._position: Optional[int] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the background task (call from a running event loop)"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and drop all subscribers"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for subscription in list(self._subscribers):
+            self._drop(subscription)
+
+    def notify(self, event_id: int) -> None:
+        """Wake up the background task after this process committed an event"""
+        self._wakeup.set()
+
+    async def subscribe(self, after_id: Optional[int] = None) -> tuple[Subscription, bool]:
+        """
+        Subscribe to events with id greater than after_id (new events only if None)
+
+        Returns:
+            tuple: subscription and whether the client missed too many events
+            to catch up (it then only gets new events and should reload)
+        """
+        last_id = await get_last_order_event_id()
+
+        reset = after_id is not None and (after_id > last_id or last_id - after_id > ORDER_EVENTS_REPLAY_LIMIT)
+        if after_id is None or reset:
+            after_id = last_id
+
+        subscription = Subscription(after_id)
+        self._subscribers.add(subscription)
+
+        # Rewind so missed events are read again for this subscriber
+        if self._position is None or after_id < self._position:
+            self._position = after_id
+        self._wakeup.set()
+
+        return subscription, reset
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove subscription"""
+        self._subscribers.discard(subscription)
+        if not self._subscribers:
+            # Nothing to catch up on, next subscriber sets the position
+            self._position = None
+
+    def _drop(self, subscription: Subscription) -> None:
+        """Disconnect a subscriber, it can resume from its last event id"""
+        self._subscribers.discard(subscription)
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+    def _publish(self, event: dict) -> None:
+        """Put event into queues of subscribers that haven't seen it"""
+        for subscription in list(self._subscribers):
+            if event["id"] <= subscription.after_id:
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+                subscription.after_id = event["id"]
+            except asyncio.QueueFull:
+                logger.warning(f"Dropping slow order events subscriber at event {subscription.after_id}")
+                self._drop(subscription)
+
+    async def _hydrate(self, event: dict) -> Optional[dict]:
+        """Attach the current order to an event, None if the order was deleted"""
+        try:
+            order = await get_order_by_id(event["order_id"])
+        except ValueError:
+            return None
+        return {"id": event["id"], "type": event["type"], "order": order}
+
+    async def _deliver(self) -> None:
+        """Read events after the current position and publish them"""
+        while self._subscribers and self._position is not None:
+            position = self._position
+            events = await get_order_events(position, BATCH_SIZE)
+            for event in events:
+                hydrated = await self._hydrate(event)
+                if self._position != position:
+                    # A subscriber rewound the position meanwhile, start over
+                    break
+                if hydrated:
+                    self._publish(hydrated)
+                position = self._position = event["id"]
+            else:
+                if len(events) < BATCH_SIZE:
+                    return
+
+    async def _run(self) -> None:
+        """Tail the order_events table while there are subscribers"""
+        last_prune = 0.0
+        loop = asyncio.get_running_loop()
+
+        while True:
+            # asyncio.timeout, unlike wait_for, doesn't lose a stop() that
+            # arrives together with a wakeup
+            try:
+                async with asyncio.timeout(ORDER_EVENTS_POLL_INTERVAL):
+                    await self._wakeup.wait()
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self._deliver()
+
+                if loop.time() - last_prune > PRUNE_INTERVAL:
+                    last_prune = loop.time()
+                    before = (datetime.now() - timedelta(days=ORDER_EVENTS_RETENTION_DAYS)).isoformat()
+                    deleted = await delete_order_events_before(before)
+                    if deleted:
+                        logger.info(f"Deleted {deleted} old order events")
+            except Exception as e:
+                logger.error(f"Failed to deliver order events: {str(e)}")
+
+
+order_events = OrderEventBroker()
+add_order_event_listener(order_events.notify)
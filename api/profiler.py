@@ -0,0 +1,174 @@
+"""
+On-demand sampling profiler and heap growth report
+
+The profiler samples the stacks of all threads of the process (the event
+loop, aiosqlite connection threads, image resize workers) with
+sys._current_frames() from a background thread, so nothing has to be
+installed or restarted and the profiled code isn't slowed down beyond the
+sampling itself.
+"""
+import os
+import re
+import sys
+import time
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Optional
+
+import aiosqlite
+
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "10"))
+
+# Leaf frames of threads waiting for work, left out unless idle samples are requested
+IDLE_FILES = ("selectors.py", "threading.py", "queue.py")
+
+_THREAD_NUMBER = re.compile(r"[-_]?\d+")
+
+
+def _thread_label(thread: Optional[threading.Thread], loop_thread_id: int, ident: int) -> str:
+    """Group threads by role, numbered threads of one kind share a label"""
+    if ident == loop_thread_id:
+        return "event-loop"
+    if isinstance(thread, aiosqlite.Connection):
+        return "aiosqlite"
+    if thread is None:
+        return "unknown"
+    return _THREAD_NUMBER.sub("", thread.name.split(" ")[0]) or thread.name
+
+
+def _frame_label(code) -> tuple[str, str, int]:
+    return code.co_name, os.path.basename(code.co_filename), code.co_firstlineno
+
+
+def sample_stacks(seconds: float, loop_thread_id: int, include_idle: bool = False) -> tuple[Counter, int]:
+    """
+    Sample stacks of all threads for the given time (blocking, run it in a worker thread)
+
+    Returns:
+        tuple: Counter of (thread label, frames root first) and the number
+        of sampling rounds
+    """
+    interval = PROFILE_INTERVAL_MS / 1000
+    own_id = threading.get_ident()
+    stacks: Counter = Counter()
+    rounds = 0
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        threads = {thread.ident: thread for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_id:
+                continue
+            if not include_idle and os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                continue
+
+            frames = []
+            while frame is not None:
+                frames.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            frames.reverse()
+
+            label = _thread_label(threads.get(ident), loop_thread_id, ident)
+            stacks[(label, tuple(frames))] += 1
+
+        rounds += 1
+        time.sleep(interval)
+
+    return stacks, rounds
+
+
+def to_collapsed(stacks: Counter) -> str:
+    """Brendan Gregg's collapsed stack format, one 'thread;root;...;leaf count' line per stack"""
+    lines = []
+    for (thread, frames), count in stacks.most_common():
+        names = [thread] + [f"{name} ({file}:{line})" for name, file, line in frames]
+        lines.append(f"{';'.join(names)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def to_speedscope(stacks: Counter, seconds: float) -> dict:
+    """speedscope.app file with one sampled profile per thread label"""
+    interval = PROFILE_INTERVAL_MS / 1000
+    frame_index: dict[tuple, int] = {}
+    frames: list[dict] = []
+    profiles: dict[str, dict] = {}
+
+    for (thread, stack), count in stacks.items():
+        indexes = []
+        for frame in stack:
+            if frame not in frame_index:
+                frame_index[frame] = len(frames)
+                name, file, line = frame
+                frames.append({"name": name, "file": file, "line": line})
+            indexes.append(frame_index[frame])
+
+        profile = profiles.setdefault(thread, {
+            "type": "sampled",
+            "name": thread,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": 0,
+            "samples": [],
+            "weights": []
+        })
+        profile["samples"].append(indexes)
+        profile["weights"].append(count * interval)
+        profile["endValue"] += count * interval
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"FanFanTulpan API {seconds:g}s profile",
+        "exporter": "flower-shop profiler",
+        "shared": {"frames": frames},
+        "profiles": sorted(profiles.values(), key=lambda profile: profile["name"])
+    }
+
+
+def heap_growth(seconds: float, limit: int, group_by: str) -> dict:
+    """
+    Diff tracemalloc snapshots taken seconds apart (blocking, run it in a worker thread)
+
+    Tracing is switched on for the window if it isn't on already
+    (PYTHONTRACEMALLOC), so only allocations made during the window are seen
+
+    Returns:
+        dict with totals and the allocation sites that grew the most
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    try:
+        before = tracemalloc.take_snapshot()
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started:
+            tracemalloc.stop()
+
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>")
+    ]
+    before = before.filter_traces(filters)
+    after = after.filter_traces(filters)
+    diff = after.compare_to(before, group_by)
+
+    return {
+        "seconds": seconds,
+        "traced_since_start": not started,
+        "size_before": sum(stat.size for stat in before.statistics("filename")),
+        "size_after": sum(stat.size for stat in after.statistics("filename")),
+        "top": [
+            {
+                "size_diff": stat.size_diff,
+                "size": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+                "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+            }
+            for stat in diff[:limit]
+        ]
+    }
@@ -0,0 +1,256 @@
+"""
+Per-statement timing of SQL executed by database.py
+
+Connections opened by database._connect() are TimedConnection instances.
+Every statement is timed in the aiosqlite thread (execute plus fetching its
+rows) and aggregated by normalized SQL text. Statements slower than
+SLOW_QUERY_MS are logged with their EXPLAIN QUERY PLAN and the shapes of
+their bound parameters.
+"""
+import os
+import re
+import time
+import logging
+import sqlite3
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "1") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+# The same statement is logged as slow at most once per interval
+SLOW_QUERY_LOG_INTERVAL = float(os.getenv("SLOW_QUERY_LOG_INTERVAL", "60"))
+# Durations kept per statement for percentiles
+QUERY_STATS_WINDOW = int(os.getenv("QUERY_STATS_WINDOW", "500"))
+# Distinct statements tracked, the rest are counted under OTHER_STATEMENTS
+QUERY_STATS_MAX_STATEMENTS = int(os.getenv("QUERY_STATS_MAX_STATEMENTS", "500"))
+
+OTHER_STATEMENTS = "<other>"
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace, literals and placeholder lists so one query shape is one key"""
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    return _PLACEHOLDER_LIST.sub("?, ...", sql)
+
+
+def param_shape(params) -> str:
+    """Types of bound parameters without their values, e.g. (int, str, NoneType)"""
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in params.items()) + "}"
+    try:
+        return "(" + ", ".join(type(value).__name__ for value in params) + ")"
+    except TypeError:
+        return type(params).__name__
+
+
+class StatementStats:
+    """Rolling timings of one normalized statement"""
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow_count = 0
+        self.durations: deque[float] = deque(maxlen=QUERY_STATS_WINDOW)
+        self.param_shapes: set[str] = set()
+        self.plan: Optional[list[str]] = None
+        self.last_logged = 0.0
+
+    def percentile(self, fraction: float) -> float:
+        if not self.durations:
+            return 0.0
+        ordered = sorted(self.durations)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def to_dict(self) -> dict:
+        return {
+            "sql": self.sql,
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.5) * 1000, 3),
+            "p95_ms": round(self.percentile(0.95) * 1000, 3),
+            "p99_ms": round(self.percentile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+            "slow_count": self.slow_count,
+            "param_shapes": sorted(self.param_shapes),
+            "plan": self.plan
+        }
+
+
+_stats: dict[str, StatementStats] = {}
+_lock = threading.Lock()
+
+
+def _explain(connection: "TimedConnection", sql: str, params) -> list[str]:
+    """EXPLAIN QUERY PLAN rows of a statement, run on the connection that executed it"""
+    try:
+        rows = sqlite3.Connection.execute(connection, f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    except sqlite3.Error as e:
+        return [f"unavailable: {str(e)}"]
+    return [str(row[-1]) for row in rows]
+
+
+def record(connection: "TimedConnection", sql: str, params, duration: float) -> None:
+    """Add a statement execution to the stats, log it if it was slow"""
+    key = normalize_sql(sql)
+    shape = param_shape(params)
+    slow = duration * 1000 >= SLOW_QUERY_MS
+
+    with _lock:
+        stats = _stats.get(key)
+        if stats is None:
+            if len(_stats) >= QUERY_STATS_MAX_STATEMENTS:
+                key = OTHER_STATEMENTS
+                stats = _stats.get(key)
+            if stats is None:
+                stats = _stats[key] = StatementStats(key)
+
+        stats.count += 1
+        stats.total += duration
+        stats.max = max(stats.max, duration)
+        stats.durations.append(duration)
+        if len(stats.param_shapes) < 10:
+            stats.param_shapes.add(shape)
+
+        log_now = False
+        if slow:
+            stats.slow_count += 1
+            now = time.monotonic()
+            if now - stats.last_logged >= SLOW_QUERY_LOG_INTERVAL:
+                stats.last_logged = now
+                log_now = True
+
+    if not log_now:
+        return
+
+    plan = None
+    if key != OTHER_STATEMENTS and sql.lstrip().upper().startswith(EXPLAINABLE):
+        plan = _explain(connection, sql, params)
+        with _lock:
+            stats.plan = plan
+
+    logger.warning(
+        f"Slow query {duration * 1000:.1f} ms (params {shape}): {key}"
+        + (f" | plan: {'; '.join(plan)}" if plan else "")
+    )
+
+
+def get_query_stats(sort: str = "total_ms", limit: int = 20) -> list[dict]:
+    """Statements ordered by the given stat, worst first"""
+    with _lock:
+        rows = [stats.to_dict() for stats in _stats.values()]
+    rows.sort(key=lambda row: row[sort], reverse=True)
+    return rows[:limit]
+
+
+def reset_query_stats() -> None:
+    """Forget all collected timings"""
+    with _lock:
+        _stats.clear()
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor recording the time of each statement
+
+    A statement's time includes fetching its rows, so it's recorded after
+    fetchone, when the rows are exhausted, when the next statement starts or
+    when the cursor is closed
+    """
+
+    _pending: Optional[tuple[str, object, float]] = None
+
+    def _finish(self) -> None:
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            try:
+                record(self.connection, *pending)
+            except Exception as e:
+                logger.error(f"Failed to record query stats: {str(e)}")
+
+    def _add_time(self, elapsed: float) -> None:
+        if self._pending is not None:
+            sql, params, duration = self._pending
+            self._pending = (sql, params, duration + elapsed)
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._pending = (sql, parameters, time.perf_counter() - start)
+            if self.description is None:
+                # Not a query, there are no rows to fetch
+                self._finish()
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        seq_of_parameters = list(seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            params = seq_of_parameters[0] if seq_of_parameters else ()
+            self._pending = (sql, params, time.perf_counter() - start)
+            self._finish()
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._add_time(time.perf_counter() - start)
+        # Mostly used for single row lookups, later rows aren't timed
+        self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._add_time(time.perf_counter() - start)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._add_time(time.perf_counter() - start)
+        self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Rows never fetched, the connection may be gone so there's no plan
+        self._finish()
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection whose cursors are TimedCursor"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
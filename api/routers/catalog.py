@@ -0,0 +1,337 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import zipfile
+from pathlib import Path
+from typing import Iterator, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
+from fastapi.responses import StreamingResponse
+
+from dependencies import verify_admin_mode
+from images import save_image, delete_images
+from models import CatalogImportResult, CatalogImportError
+from database import import_goods_batch, iter_all_goods
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/goods", tags=["catalog"])
+
+# Catalog file configuration
+CATALOG_FIELDS = ["id", "name", "category", "price", "non_discount_price", "description", "status", "images"]
+CATALOG_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+GOOD_STATUSES = {"NEW", "BLOCKED"}
+IMPORT_BATCH_SIZE = 100
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Image configuration (same limits as regular uploads)
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+
+
+def _iter_catalog_rows(file, catalog_format: str) -> Iterator[tuple[int, dict | Exception]]:
+    """Yield (row number, raw row or parse error) from a CSV/JSONL file object"""
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+
+    if catalog_format == "csv":
+        reader = csv.DictReader(text)
+        for row_number, row in enumerate(reader, start=1):
+            yield row_number, row
+        return
+
+    for row_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield row_number, ValueError(f"invalid JSON: {str(e)}")
+            continue
+
+        if not isinstance(row, dict):
+            yield row_number, ValueError("row must be a JSON object")
+            continue
+        yield row_number, row
+
+
+def _read_batch(rows: Iterator, size: int) -> list:
+    """Read up to size rows (runs in a worker thread, file reads may block)"""
+    batch = []
+    for item in rows:
+        batch.append(item)
+        if len(batch) >= size:
+            break
+    return batch
+
+
+def _to_int(value, field: str, required: bool) -> Optional[int]:
+    """Parse integer catalog field"""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise ValueError(f"{field} is required")
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be an integer")
+
+
+def _parse_catalog_row(raw: dict) -> dict:
+    """
+    Validate raw catalog row and convert it to import format
+
+    images is a list of filenames inside the images archive (JSONL) or the
+    same names separated by '|' (CSV)
+
+    Raises:
+        ValueError: If the row is invalid
+    """
+    name = str(raw.get("name") or "").strip()
+    if not name:
+        raise ValueError("name is required")
+
+    category = str(raw.get("category") or "").strip()
+    if not category:
+        raise ValueError("category is required")
+
+    good_status = str(raw.get("status") or "NEW").strip().upper()
+    if good_status not in GOOD_STATUSES:
+        raise ValueError(f"status must be one of {', '.join(sorted(GOOD_STATUSES))}")
+
+    images = raw.get("images") or []
+    if isinstance(images, str):
+        images = [image.strip() for image in images.split("|") if image.strip()]
+
+    return {
+        "name": name,
+        "category": category,
+        "price": _to_int(raw.get("price"), "price", required=True),
+        "non_discount_price": _to_int(raw.get("non_discount_price"), "non_discount_price", required=False),
+        "description": str(raw.get("description") or ""),
+        "status": good_status,
+        "image_names": images
+    }
+
+
+async def _save_archive_images(archive: Optional[zipfile.ZipFile], image_names: list[str]) -> list[dict]:
+    """
+    Save images referenced by a catalog row from the images archive
+
+    Images saved before a failure are deleted again
+
+    Raises:
+        ValueError: If an image is missing, not allowed or can't be read or saved
+    """
+    if image_names and archive is None:
+        raise ValueError("row references images but no images archive was uploaded")
+
+    saved_images = []
+    try:
+        for image_name in image_names:
+            file_ext = Path(image_name).suffix.lower()
+            if file_ext not in ALLOWED_EXTENSIONS:
+                raise ValueError(f"image {image_name}: only {', '.join(ALLOWED_EXTENSIONS)} are allowed")
+
+            try:
+                info = archive.getinfo(image_name)
+            except KeyError:
+                raise ValueError(f"image {image_name} not found in archive")
+
+            if info.file_size > MAX_FILE_SIZE:
+                raise ValueError(f"image {image_name} size exceeds 5MB limit")
+
+            try:
+                contents = await asyncio.to_thread(archive.read, info)
+                saved_images.append(await save_image(contents, file_ext))
+            except (OSError, zipfile.BadZipFile) as e:
+                logger.error(f"Failed to import image {image_name}: {str(e)}")
+                raise ValueError(f"image {image_name} could not be saved")
+    except Exception:
+        await delete_images(saved_images)
+        raise
+
+    return saved_images
+
+
+@router.post("/import", response_model=CatalogImportResult)
+async def import_catalog(
+    catalog: UploadFile = File(...),
+    images: Optional[UploadFile] = File(None),
+    format: Optional[str] = Query(None, description="Catalog format: csv or jsonl (default: by file extension)"),
+    user_id: int = Depends(verify_admin_mode)
+):
+    """
+    Bulk import goods from a CSV or JSONL catalog (ADMIN only)
+
+    Columns/keys: name, category, price, non_discount_price, description,
+    status (NEW or BLOCKED), images (filenames inside the optional ZIP archive).
+    Rows are streamed and inserted in batched transactions. Invalid rows are
+    skipped and reported with their row number
+    """
+    catalog_format = format or CATALOG_FORMATS.get(Path(catalog.filename or "").suffix.lower())
+    if catalog_format not in CATALOG_FORMATS.values():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Catalog must be a .csv or .jsonl file"
+        )
+
+    logger.info(f"User {user_id} importing {catalog_format} catalog {catalog.filename}")
+
+    archive = None
+    if images is not None:
+        try:
+            archive = zipfile.ZipFile(images.file)
+        except zipfile.BadZipFile:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Images must be a ZIP archive"
+            )
+
+    good_ids = []
+    errors = []
+    category_ids = {}
+    rows = _iter_catalog_rows(catalog.file, catalog_format)
+
+    try:
+        while True:
+            batch = await asyncio.to_thread(_read_batch, rows, IMPORT_BATCH_SIZE)
+            if not batch:
+                break
+
+            # Validate rows and save their images, collect errors per row
+            goods = []
+            row_numbers = []
+            for row_number, raw in batch:
+                try:
+                    if isinstance(raw, Exception):
+                        raise raw
+                    good = _parse_catalog_row(raw)
+                    good["images"] = await _save_archive_images(archive, good.pop("image_names"))
+                except ValueError as e:
+                    errors.append(CatalogImportError(row=row_number, error=str(e)))
+                    continue
+                goods.append(good)
+                row_numbers.append(row_number)
+
+            if not goods:
+                continue
+
+            try:
+                results = await import_goods_batch(goods, category_ids)
+            except Exception:
+                await delete_images([image for good in goods for image in good["images"]])
+                raise
+
+            # Images of rows the database rejected are not referenced by any good
+            for row_number, good, result in zip(row_numbers, goods, results):
+                if result["error"] is None:
+                    good_ids.append(result["id"])
+                else:
+                    errors.append(CatalogImportError(row=row_number, error=result["error"]))
+                    await delete_images(good["images"])
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Catalog must be UTF-8 encoded"
+        )
+    except csv.Error as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid CSV: {str(e)}"
+        )
+    finally:
+        if archive is not None:
+            archive.close()
+
+    logger.info(f"User {user_id} imported {len(good_ids)} goods, {len(errors)} rows failed")
+
+    return CatalogImportResult(
+        imported=len(good_ids),
+        failed=len(errors),
+        good_ids=good_ids,
+        errors=errors
+    )
+
+
+def _export_row(good: dict) -> dict:
+    """Convert good to catalog row (images as filenames, same as import)"""
+    return {
+        "id": good["id"],
+        "name": good["name"],
+        "category": good["category"],
+        "price": good["price"],
+        "non_discount_price": good["non_discount_price"],
+        "description": good["description"],
+        "status": good["status"],
+        "images": [Path(image["image_url"]).name for image in good["images"]]
+    }
+
+
+async def _export_csv():
+    """Stream goods as CSV, flushing in chunks of EXPORT_CHUNK_SIZE"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CATALOG_FIELDS)
+    writer.writeheader()
+
+    async for good in iter_all_goods():
+        row = _export_row(good)
+        row["images"] = "|".join(row["images"])
+        writer.writerow(row)
+
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+async def _export_jsonl():
+    """Stream goods as JSON lines, flushing in chunks of EXPORT_CHUNK_SIZE"""
+    chunk = []
+    chunk_size = 0
+
+    async for good in iter_all_goods():
+        line = json.dumps(_export_row(good), ensure_ascii=False) + "\n"
+        chunk.append(line)
+        chunk_size += len(line)
+
+        if chunk_size >= EXPORT_CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+            chunk_size = 0
+
+    yield "".join(chunk)
+
+
+@router.get("/export")
+async def export_catalog(
+    format: str = Query("csv", description="Catalog format: csv or jsonl"),
+    user_id: int = Depends(verify_admin_mode)
+):
+    """
+    Export all goods as a CSV or JSONL catalog (ADMIN only)
+
+    Output uses the import format, so it can be imported back together with a
+    ZIP of the uploaded images. Rows are streamed straight from the database
+    """
+    logger.info(f"User {user_id} exporting catalog as {format}")
+
+    if format == "csv":
+        content = _export_csv()
+        media_type = "text/csv; charset=utf-8"
+    elif format == "jsonl":
+        content = _export_jsonl()
+        media_type = "application/x-ndjson; charset=utf-8"
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Format must be csv or jsonl"
+        )
+
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="catalog.{format}"'}
+    )
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from dependencies import verify_admin_mode
+from models import QueryStatsDTO
+from query_stats import get_query_stats, reset_query_stats
+from profiler import sample_stacks, to_collapsed, to_speedscope, heap_growth
+from tracing import get_traces, get_trace
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+# One profile or heap report at a time per worker
+_profiling = asyncio.Lock()
+
+
+@router.get("/queries", response_model=list[QueryStatsDTO])
+async def get_query_stats_endpoint(
+    sort: Literal["total_ms", "p95_ms", "p99_ms", "max_ms", "mean_ms", "count", "slow_count"] = "total_ms",
+    limit: int = Query(20, ge=1, le=500),
+    user_id: int = Depends(verify_admin_mode)
+):
+    """
+    SQL statements of this API worker, worst first (ADMIN only)
+
+    Each worker process keeps its own statistics. Plans are captured for
+    statements that were slower than SLOW_QUERY_MS.
+
+    Requires valid Telegram WebApp initData in Authorization header
+    User must be in ADMIN mode
+    """
+    return get_query_stats(sort, limit)
+
+
+@router.post("/queries/reset")
+async def reset_query_stats_endpoint(user_id: int = Depends(verify_admin_mode)):
+    """
+    Forget collected statement timings of this API worker (ADMIN only)
+
+    Requires valid Telegram WebApp initData in Authorization header
+    User must be in ADMIN mode
+    """
+    logger.info(f"User {user_id} reset query stats")
+    reset_query_stats()
+    return {"success": True, "message": "Query stats reset"}
+
+
+@router.get("/profile", include_in_schema=False)
+async def profile_endpoint(
+    seconds: float = Query(10, gt=0, le=60),
+    output: Literal["collapsed", "speedscope"] = Query("collapsed", alias="format"),
+    idle: bool = False,
+    user_id: int = Depends(verify_admin_mode)
+):
+    """
+    Sample stacks of all threads of this API worker for N seconds (ADMIN only)
+
+    Returns collapsed stacks (for flamegraph.pl / speedscope) or a
+    speedscope.app JSON file. Threads waiting for work are left out
+    unless idle=true.
+
+    Requires valid Telegram WebApp initData in Authorization header
+    User must be in ADMIN mode
+    """
+    if _profiling.locked():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Another profile is running"
+        )
+
+    async with _profiling:
+        logger.info(f"User {user_id} profiling for {seconds}s")
+        stacks, rounds = await asyncio.to_thread(sample_stacks, seconds, threading.get_ident(), idle)
+
+    filename = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    headers = {"X-Profile-Samples": str(rounds)}
+    if output == "speedscope":
+        headers["Content-Disposition"] = f'attachment; filename="{filename}.speedscope.json"'
+        return JSONResponse(to_speedscope(stacks, seconds), headers=headers)
+
+    headers["Content-Disposition"] = f'attachment; filename="{filename}.folded"'
+    return PlainTextResponse(to_collapsed(stacks), headers=headers)
+
+
+@router.get("/heap", include_in_schema=False)
+async def heap_endpoint(
+    seconds: float = Query(10, gt=0, le=300),
+    limit: int = Query(25, ge=1, le=200),
+    group_by: Literal["lineno", "traceback", "filename"] = "lineno",
+    user_id: int = Depends(verify_admin_mode)
+):
+    """
+    Allocation sites of this API worker that grew the most in N seconds (ADMIN only)
+
+    Diffs tracemalloc snapshots taken at the start and the end of the window
+
+    Requires valid Telegram WebApp initData in Authorization header
+    User must be in ADMIN mode
+    """
+    if _profiling.locked():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Another profile is running"
+        )
+
+    async with _profiling:
+        logger.info(f"User {user_id} tracing heap growth for {seconds}s")
+        return await asyncio.to_thread(heap_growth, seconds, limit, group_by)
+
+
+@router.get("/traces")
+async def get_traces_endpoint(
+    limit: int = Query(50, ge=1, le=500),
+    min_ms: float = Query(0, ge=0),
+    name: Optional[str] = None,
+    user_id: int = Depends(verify_admin_mode)
+):
+    """
+    Recent requests of this API worker, newest first (ADMIN only)
+
+    Returns the root span of each trace, filtered by minimum duration and
+    by a substring of its name (e.g. "POST /orders")
+
+    Requires valid Telegram WebApp initData in Authorization header
+    User must be in ADMIN mode
+    """
+    return get_traces(limit, min_ms, name)
+
+
+@router.get("/traces/{trace_id}")
+async def get_trace_endpoint(trace_id: str, user_id: int = Depends(verify_admin_mode)):
+    """
+    All spans of a trace, in start order (ADMIN only)
+
+    Requires valid Telegram WebApp initData in Authorization header
+    User must be in ADMIN mode
+    """
+    spans = get_trace(trace_id)
+    if not spans:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Trace {trace_id} not found in this worker's buffer"
+        )
+    return spans
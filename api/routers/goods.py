@@ -1,11 +1,11 @@
 import logging
 from pathlib import Path
-from datetime import datetime
-import uuid
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 
 from dependencies import verify_admin_mode
 from auth import verify_telegram_init_data
+from images import save_image
+from streaming import stream_json_array
 from models import GoodCardRequest, GoodDTO, ImageDTO, ImageReorderRequest
 from database import (
     create_good_card,
@@ -14,7 +14,7 @@ from database import (
     update_good_card,
     delete_good,
     update_good_status,
-    get_all_goods,
+    iter_all_goods,
     update_images_order,
     delete_good_image,
     get_category_by_title,
@@ -26,7 +26,6 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/goods", tags=["goods"])
 
 # Upload configuration
-UPLOAD_DIR = Path("/app/data/uploads")
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 
@@ -77,12 +76,10 @@ async def get_all_goods_endpoint(user_id: int = Depends(verify_telegram_init_dat
     logger.info(f"User {user_id} fetching all goods (all statuses)")
 
     try:
-        # Get all goods from database
-        goods = await get_all_goods()
-
-        # Convert to DTOs
-        return [
-            GoodDTO(
+        # Stream goods from database as they are read
+        return await stream_json_array(
+            iter_all_goods(),
+            lambda good: GoodDTO(
                 id=good["id"],
                 name=good["name"],
                 category=good["category"],
@@ -92,8 +89,7 @@ async def get_all_goods_endpoint(user_id: int = Depends(verify_telegram_init_dat
                 images=[ImageDTO(**img) for img in good["images"]],
                 status=good["status"]
             )
-            for good in goods
-        ]
+        )
     except Exception as e:
         logger.error(f"Failed to fetch all goods: {str(e)}")
         raise HTTPException(
@@ -226,7 +222,7 @@ async def add_good_images(
     """
     logger.info(f"User {user_id} adding {len(images)} images to good {good_id}")
 
-    uploaded_urls = []
+    uploaded_images = []
 
     # Upload all images first
     for image in images:
@@ -255,17 +251,9 @@ async def add_good_images(
                 detail=f"File {image.filename} size exceeds 5MB limit"
             )
 
-        # Generate unique filename
-        timestamp = int(datetime.now().timestamp())
-        unique_id = uuid.uuid4().hex[:8]
-        filename = f"{timestamp}-{unique_id}{file_ext}"
-        file_path = UPLOAD_DIR / filename
-
-        # Save file
+        # Save file and compute placeholder/dimensions off the event loop
         try:
-            with open(file_path, "wb") as f:
-                f.write(contents)
-            logger.info(f"Image saved: {filename}")
+            saved_image = await save_image(contents, file_ext)
         except Exception as e:
             logger.error(f"Failed to save image: {str(e)}")
             raise HTTPException(
@@ -273,13 +261,11 @@ async def add_good_images(
                 detail=f"Failed to save image {image.filename}"
             )
 
-        # Add URL to list
-        image_url = f"/api/static/{filename}"
-        uploaded_urls.append(image_url)
+        uploaded_images.append(saved_image)
 
-    # Save image URLs to database
+    # Save images to database
     try:
-        await save_good_images(good_id, uploaded_urls)
+        display_orders = await save_good_images(good_id, uploaded_images)
     except Exception as e:
         logger.error(f"Failed to save image URLs to database: {str(e)}")
         raise HTTPException(
@@ -290,7 +276,11 @@ async def add_good_images(
     return {
         "success": True,
         "goodId": good_id,
-        "imageUrls": uploaded_urls
+        "imageUrls": [image["image_url"] for image in uploaded_images],
+        "images": [
+            ImageDTO(**image, display_order=display_order)
+            for image, display_order in zip(uploaded_images, display_orders)
+        ]
     }
 
 
@@ -0,0 +1,42 @@
+import logging
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import FileResponse
+
+from images import resized_images
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/static/img", tags=["images"])
+
+# Variants are keyed by unique upload filenames, so they never change
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/{width}/{filename}")
+async def get_resized_image(width: int, filename: str):
+    """
+    Get uploaded image resized to the given width (public endpoint)
+
+    Width must be one of the allowed sizes. Variants are rendered on first
+    request and served from the on-disk cache afterwards
+    """
+    try:
+        path = await resized_images.get(width, filename)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found"
+        )
+    except Exception as e:
+        logger.error(f"Failed to resize image {width}/{filename}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to resize image"
+        )
+
+    return FileResponse(path, headers={"Cache-Control": CACHE_CONTROL})
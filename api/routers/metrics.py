@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from metrics import render_metrics
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus metrics
+
+    Not proxied by nginx - scraped from inside the Docker network
+    """
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
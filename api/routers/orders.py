@@ -1,37 +1,106 @@
+import asyncio
+import hashlib
 import logging
+from datetime import date, timedelta
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, Query
+from fastapi.responses import StreamingResponse
 
-from dependencies import verify_admin_mode
+from dependencies import get_current_user, verify_admin_mode
 from auth import verify_telegram_init_data
-from models import OrderRequest, OrderDTO, CartItemDTO
+from models import (
+    OrderRequest,
+    OrderDTO,
+    CartItemDTO,
+    SalesDailyDTO,
+    SalesByStatusDTO,
+    SalesByDeliveryTypeDTO,
+    SalesByGoodDTO
+)
 from database import (
     create_order,
     update_order,
     get_order_by_id,
     get_orders,
+    iter_orders,
     delete_order,
-    get_user
+    get_idempotency_key,
+    save_idempotency_response,
+    DuplicateIdempotencyKey,
+    GoodNotFound,
+    get_sales_daily,
+    get_sales_by_delivery_type,
+    get_sales_by_status,
+    get_top_goods,
+    rebuild_sales_rollups
 )
 from notifications import send_order_notification_to_manager, send_order_notification_to_email
+from order_events import order_events
+from idempotency import run_once
+from streaming import stream_json_array
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
+# Longest period the date based statistics can be requested for
+STATS_MAX_DAYS = 366
 
-@router.post("", response_model=OrderDTO)
-async def create_order_endpoint(
+# Comment line sent when there are no events, keeps proxies from closing the stream
+ORDER_EVENTS_HEARTBEAT = 15
+
+
+def _order_to_dto(order: dict) -> OrderDTO:
+    """Convert hydrated order dict to DTO"""
+    return OrderDTO(
+        id=order["id"],
+        status=order["status"],
+        user_id=order["user_id"],
+        user_phone=order["user_phone"],
+        createstamp=order["createstamp"],
+        changestamp=order["changestamp"],
+        createuser=order.get("createuser"),
+        changeuser=order.get("changeuser"),
+        delivery_type=order["delivery_type"],
+        delivery_address=order["delivery_address"],
+        total=order.get("total"),
+        cart_items=[CartItemDTO(**item) for item in order["cart_items"]]
+    )
+
+
+async def _replay_order(user_id: int, idempotency_key: str, request_hash: str) -> OrderDTO:
+    """Get the response of the order already created with this idempotency key"""
+    stored = await get_idempotency_key(user_id, idempotency_key)
+
+    if stored["request_hash"] != request_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different order"
+        )
+
+    logger.info(f"Replaying order #{stored['order_id']} for idempotency key of user {user_id}")
+
+    if stored["response"]:
+        return OrderDTO.model_validate_json(stored["response"])
+
+    # Response wasn't stored (e.g. the process stopped right after the commit)
+    return _order_to_dto(await get_order_by_id(stored["order_id"]))
+
+
+async def _create_order(
     order: OrderRequest,
-    user_id: int = Depends(verify_telegram_init_data)
-):
+    user_id: int,
+    idempotency_key: Optional[str] = None,
+    request_hash: Optional[str] = None
+) -> tuple[OrderDTO, bool]:
     """
-    Create a new order
+    Create order and notify the manager, or replay the stored order for a used key
 
-    Requires valid Telegram WebApp initData in Authorization header
-    Any authenticated user can create an order
+    Returns:
+        tuple: order and whether it was replayed
     """
-    logger.info(f"User {user_id} creating new order for user_id={order.user_id}")
+    if idempotency_key is not None and await get_idempotency_key(user_id, idempotency_key):
+        return await _replay_order(user_id, idempotency_key, request_hash), True
 
     try:
         # Convert cart items to dict format for database function
@@ -47,8 +116,15 @@ async def create_order_endpoint(
             delivery_type=order.delivery_type,
             delivery_address=order.delivery_address,
             cart_items=cart_items_dict,
-            createuser=user_id
+            createuser=user_id,
+            idempotency_key=idempotency_key,
+            request_hash=request_hash
         )
+        order_dto = _order_to_dto(created_order)
+
+        # Store the response for retries with the same key
+        if idempotency_key is not None:
+            await save_idempotency_response(user_id, idempotency_key, order_dto.model_dump_json())
 
         # Send notification to manager (non-blocking - don't fail if notification fails)
         try:
@@ -70,23 +146,14 @@ async def create_order_endpoint(
         except Exception as e:
             logger.error(f"Error sending email notification for order #{created_order['id']}: {str(e)}")
 
-        # Get user phone
-        user = await get_user(created_order["user_id"])
-        user_phone = user.get("phone") if user else None
-
-        # Return response
-        return OrderDTO(
-            id=created_order["id"],
-            status=created_order["status"],
-            user_id=created_order["user_id"],
-            user_phone=user_phone,
-            createstamp=created_order["createstamp"],
-            changestamp=created_order["changestamp"],
-            createuser=created_order.get("createuser"),
-            changeuser=created_order.get("changeuser"),
-            delivery_type=created_order["delivery_type"],
-            delivery_address=created_order["delivery_address"],
-            cart_items=[CartItemDTO(**item) for item in created_order["cart_items"]]
+        return order_dto, False
+    except DuplicateIdempotencyKey:
+        # Created by a request in another process meanwhile
+        return await _replay_order(user_id, idempotency_key, request_hash), True
+    except GoodNotFound as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Good with id {e.good_id} not found"
         )
     except Exception as e:
         logger.error(f"Failed to create order: {str(e)}")
@@ -96,6 +163,47 @@ async def create_order_endpoint(
         )
 
 
+@router.post("", response_model=OrderDTO)
+async def create_order_endpoint(
+    order: OrderRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    user_id: int = Depends(verify_telegram_init_data)
+):
+    """
+    Create a new order
+
+    Requires valid Telegram WebApp initData in Authorization header
+    Any authenticated user can create an order
+
+    Retries with the same Idempotency-Key header return the originally
+    created order without creating a new one or sending notifications again
+    """
+    logger.info(f"User {user_id} creating new order for user_id={order.user_id}")
+
+    if idempotency_key is None:
+        order_dto, _ = await _create_order(order, user_id)
+        return order_dto
+
+    if not 0 < len(idempotency_key) <= 255:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Idempotency-Key must be 1-255 characters"
+        )
+
+    request_hash = hashlib.sha256(order.model_dump_json().encode()).hexdigest()
+
+    # Concurrent retries in this process wait for the first one and are replays
+    (order_dto, replayed), joined = await run_once(
+        (user_id, idempotency_key, request_hash),
+        lambda: _create_order(order, user_id, idempotency_key, request_hash)
+    )
+
+    if replayed or joined:
+        response.headers["Idempotent-Replayed"] = "true"
+    return order_dto
+
+
 @router.put("/{order_id}", response_model=OrderDTO)
 async def update_order_endpoint(
     order_id: int,
@@ -127,24 +235,26 @@ async def update_order_endpoint(
             changeuser=user_id
         )
 
-        # Get user phone
-        user = await get_user(updated_order["user_id"])
-        user_phone = user.get("phone") if user else None
-
         # Return response
         return OrderDTO(
             id=updated_order["id"],
             status=updated_order["status"],
             user_id=updated_order["user_id"],
-            user_phone=user_phone,
+            user_phone=updated_order["user_phone"],
             createstamp=updated_order["createstamp"],
             changestamp=updated_order["changestamp"],
             createuser=updated_order.get("createuser"),
             changeuser=updated_order.get("changeuser"),
             delivery_type=updated_order["delivery_type"],
             delivery_address=updated_order["delivery_address"],
+            total=updated_order.get("total"),
             cart_items=[CartItemDTO(**item) for item in updated_order["cart_items"]]
         )
+    except GoodNotFound as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Good with id {e.good_id} not found"
+        )
     except ValueError as e:
         logger.error(f"Order not found: {str(e)}")
         raise HTTPException(
@@ -161,7 +271,8 @@ async def update_order_endpoint(
 
 @router.get("/my", response_model=list[OrderDTO])
 async def get_my_orders_endpoint(
-    user_id: int = Depends(verify_telegram_init_data)
+    user_id: int = Depends(verify_telegram_init_data),
+    user: Optional[dict] = Depends(get_current_user)
 ):
     """
     Get orders for current user
@@ -174,8 +285,6 @@ async def get_my_orders_endpoint(
     try:
         orders = await get_orders(user_id_filter=user_id)
 
-        # Get user phone
-        user = await get_user(user_id)
         user_phone = user.get("phone") if user else None
 
         return [
@@ -190,6 +299,7 @@ async def get_my_orders_endpoint(
                 changeuser=order.get("changeuser"),
                 delivery_type=order["delivery_type"],
                 delivery_address=order["delivery_address"],
+                total=order.get("total"),
                 cart_items=[CartItemDTO(**item) for item in order["cart_items"]]
             )
             for order in orders
@@ -202,6 +312,220 @@ async def get_my_orders_endpoint(
         )
 
 
+async def _order_event_stream(after_id: Optional[int]):
+    """
+    Subscribe to order events and format them as Server-Sent Events
+
+    The subscription is made once the body is being sent, so a response that
+    never gets sent (client gone, middleware error) leaves nothing behind
+    """
+    subscription = None
+    try:
+        try:
+            subscription, reset = await order_events.subscribe(after_id)
+        except Exception as e:
+            logger.error(f"Failed to subscribe to order events: {str(e)}")
+            raise
+
+        # Tell the client where it is, so reconnects resume from here
+        ready_event = "reset" if reset else "ready"
+        yield f"retry: 3000\nid: {subscription.after_id}\nevent: {ready_event}\ndata: {{}}\n\n"
+
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), ORDER_EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+
+            if event is None:
+                # Dropped as a slow consumer, the client reconnects with Last-Event-ID
+                return
+
+            data = _order_to_dto(event["order"]).model_dump_json()
+            yield f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+    finally:
+        if subscription is not None:
+            order_events.unsubscribe(subscription)
+
+
+@router.get("/events")
+async def order_events_endpoint(
+    last_event_id: Optional[str] = Header(None),
+    user_id: int = Depends(verify_admin_mode)
+):
+    """
+    Stream order.created / order.updated events (ADMIN only)
+
+    Server-Sent Events with the full order as data. Send the id of the
+    last received event in Last-Event-ID header to get missed events after
+    reconnecting. A "reset" event means too many events were missed and
+    the order list should be reloaded
+
+    Requires valid Telegram WebApp initData in Authorization header
+    User must be in ADMIN mode
+    """
+    logger.info(f"User {user_id} subscribing to order events after {last_event_id}")
+
+    after_id = None
+    if last_event_id:
+        try:
+            after_id = int(last_event_id)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid Last-Event-ID"
+            )
+
+    return StreamingResponse(
+        _order_event_stream(after_id),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Let nginx pass events through without buffering
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+def _stats_period(date_from: Optional[date], date_to: Optional[date]) -> tuple[str, str]:
+    """Resolve statistics period (last 30 days by default) to ISO dates"""
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=29)
+
+    if date_from > date_to or (date_to - date_from).days >= STATS_MAX_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Period must be from 1 to {STATS_MAX_DAYS} days"
+        )
+
+    return date_from.isoformat(), date_to.isoformat()
+
+
+@router.get("/stats/daily", response_model=list[SalesDailyDTO])
+async def get_sales_daily_endpoint(
+    date_from: Optional[date] = Query(None, description="First day (default: 29 days before date_to)"),
+    date_to: Optional[date] = Query(None, description="Last day (default: today)"),
+    user_id: int = Depends(verify_admin_mode)
+):
+    """
+    Get orders and revenue per day, cancelled orders excluded (ADMIN only)
+
+    Read from rollup tables, so the cost depends on the period, not on the
+    number of orders
+
+    Requires valid Telegram WebApp initData in Authorization header
+    User must be in ADMIN mode
+    """
+    day_from, day_to = _stats_period(date_from, date_to)
+    logger.info(f"User {user_id} fetching daily sales from {day_from} to {day_to}")
+
+    try:
+        rows = await get_sales_daily(day_from, day_to)
+        return [SalesDailyDTO(**row) for row in rows]
+    except Exception as e:
+        logger.error(f"Failed to fetch daily sales: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch statistics"
+        )
+
+
+@router.get("/stats/delivery", response_model=list[SalesByDeliveryTypeDTO])
+async def get_sales_by_delivery_type_endpoint(
+    date_from: Optional[date] = Query(None, description="First day (default: 29 days before date_to)"),
+    date_to: Optional[date] = Query(None, description="Last day (default: today)"),
+    user_id: int = Depends(verify_admin_mode)
+):
+    """
+    Get orders and revenue per delivery type, cancelled orders excluded (ADMIN only)
+
+    Requires valid Telegram WebApp initData in Authorization header
+    User must be in ADMIN mode
+    """
+    day_from, day_to = _stats_period(date_from, date_to)
+    logger.info(f"User {user_id} fetching sales by delivery type from {day_from} to {day_to}")
+
+    try:
+        rows = await get_sales_by_delivery_type(day_from, day_to)
+        return [SalesByDeliveryTypeDTO(**row) for row in rows]
+    except Exception as e:
+        logger.error(f"Failed to fetch sales by delivery type: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch statistics"
+        )
+
+
+@router.get("/stats/status", response_model=list[SalesByStatusDTO])
+async def get_sales_by_status_endpoint(user_id: int = Depends(verify_admin_mode)):
+    """
+    Get number of orders and their total per status (ADMIN only)
+
+    Requires valid Telegram WebApp initData in Authorization header
+    User must be in ADMIN mode
+    """
+    logger.info(f"User {user_id} fetching orders by status")
+
+    try:
+        rows = await get_sales_by_status()
+        return [SalesByStatusDTO(**row) for row in rows]
+    except Exception as e:
+        logger.error(f"Failed to fetch orders by status: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch statistics"
+        )
+
+
+@router.get("/stats/goods", response_model=list[SalesByGoodDTO])
+async def get_top_goods_endpoint(
+    limit: int = Query(10, ge=1, le=100, description="Number of goods"),
+    user_id: int = Depends(verify_admin_mode)
+):
+    """
+    Get best selling goods by units, cancelled orders excluded (ADMIN only)
+
+    Requires valid Telegram WebApp initData in Authorization header
+    User must be in ADMIN mode
+    """
+    logger.info(f"User {user_id} fetching top {limit} goods")
+
+    try:
+        rows = await get_top_goods(limit)
+        return [SalesByGoodDTO(**row) for row in rows]
+    except Exception as e:
+        logger.error(f"Failed to fetch top goods: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch statistics"
+        )
+
+
+@router.post("/stats/rebuild")
+async def rebuild_sales_rollups_endpoint(user_id: int = Depends(verify_admin_mode)):
+    """
+    Recompute statistics from all orders (ADMIN only)
+
+    Rollups are updated together with orders, this is only needed after
+    orders were changed directly in the database
+
+    Requires valid Telegram WebApp initData in Authorization header
+    User must be in ADMIN mode
+    """
+    logger.info(f"User {user_id} rebuilding sales rollups")
+
+    try:
+        await rebuild_sales_rollups()
+        return {"success": True, "message": "Statistics rebuilt"}
+    except Exception as e:
+        logger.error(f"Failed to rebuild sales rollups: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to rebuild statistics"
+        )
+
+
 @router.get("/{order_id}", response_model=OrderDTO)
 async def get_order_endpoint(
     order_id: int,
@@ -218,21 +542,18 @@ async def get_order_endpoint(
     try:
         order = await get_order_by_id(order_id)
 
-        # Get user phone
-        user = await get_user(order["user_id"])
-        user_phone = user.get("phone") if user else None
-
         return OrderDTO(
             id=order["id"],
             status=order["status"],
             user_id=order["user_id"],
-            user_phone=user_phone,
+            user_phone=order["user_phone"],
             createstamp=order["createstamp"],
             changestamp=order["changestamp"],
             createuser=order.get("createuser"),
             changeuser=order.get("changeuser"),
             delivery_type=order["delivery_type"],
             delivery_address=order["delivery_address"],
+            total=order.get("total"),
             cart_items=[CartItemDTO(**item) for item in order["cart_items"]]
         )
     except ValueError as e:
@@ -268,28 +589,11 @@ async def get_orders_endpoint(
     logger.info(f"User {user_id} fetching orders with filters: order_id={order_id}, status={status}")
 
     try:
-        orders = await get_orders(order_id_filter=order_id, status_filter=status)
-
-        # Build list with user phones
-        result = []
-        for order in orders:
-            user = await get_user(order["user_id"])
-            user_phone = user.get("phone") if user else None
-            result.append(OrderDTO(
-                id=order["id"],
-                status=order["status"],
-                user_id=order["user_id"],
-                user_phone=user_phone,
-                createstamp=order["createstamp"],
-                changestamp=order["changestamp"],
-                createuser=order.get("createuser"),
-                changeuser=order.get("changeuser"),
-                delivery_type=order["delivery_type"],
-                delivery_address=order["delivery_address"],
-                cart_items=[CartItemDTO(**item) for item in order["cart_items"]]
-            ))
-
-        return result
+        # Stream orders (with user phones joined in) as they are read
+        return await stream_json_array(
+            iter_orders(order_id_filter=order_id, status_filter=status),
+            _order_to_dto
+        )
     except Exception as e:
         logger.error(f"Failed to fetch orders: {str(e)}")
         raise HTTPException(
@@ -1,10 +1,9 @@
 import logging
 from pathlib import Path
-from datetime import datetime
-import uuid
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 
 from dependencies import verify_admin_mode
+from images import save_image
 from models import PromoBannerDTO
 from database import get_promo_banners, get_all_promo_banners, create_promo_banner, delete_promo_banner, update_promo_banner_status, update_promo_banner_link
 
@@ -13,7 +12,6 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/promo", tags=["promo"])
 
 # Upload configuration
-UPLOAD_DIR = Path("/app/data/uploads")
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 
@@ -38,7 +36,10 @@ async def get_promo():
                 status=banner["status"],
                 display_order=banner["display_order"],
                 image_url=banner["image_url"],
-                link=banner["link"]
+                link=banner["link"],
+                placeholder=banner["placeholder"],
+                width=banner["width"],
+                height=banner["height"]
             )
             for banner in banners
         ]
@@ -67,7 +68,10 @@ async def get_all_promo(user_id: int = Depends(verify_admin_mode)):
                 status=banner["status"],
                 display_order=banner["display_order"],
                 image_url=banner["image_url"],
-                link=banner["link"]
+                link=banner["link"],
+                placeholder=banner["placeholder"],
+                width=banner["width"],
+                height=banner["height"]
             )
             for banner in banners
         ]
@@ -114,17 +118,9 @@ async def create_promo_banner_endpoint(
             detail=f"File size exceeds 5MB limit"
         )
 
-    # Generate unique filename
-    timestamp = int(datetime.now().timestamp())
-    unique_id = uuid.uuid4().hex[:8]
-    filename = f"{timestamp}-{unique_id}{file_ext}"
-    file_path = UPLOAD_DIR / filename
-
-    # Save file
+    # Save file and compute placeholder/dimensions off the event loop
     try:
-        with open(file_path, "wb") as f:
-            f.write(contents)
-        logger.info(f"Promo banner image saved: {filename}")
+        saved_image = await save_image(contents, file_ext)
     except Exception as e:
         logger.error(f"Failed to save promo banner image: {str(e)}")
         raise HTTPException(
@@ -133,9 +129,13 @@ async def create_promo_banner_endpoint(
         )
 
     # Create promo banner record in database
-    image_url = f"/api/static/{filename}"
     try:
-        banner = await create_promo_banner(image_url)
+        banner = await create_promo_banner(
+            saved_image["image_url"],
+            placeholder=saved_image["placeholder"],
+            width=saved_image["width"],
+            height=saved_image["height"]
+        )
         logger.info(f"Created promo banner with id={banner['id']}")
 
         # Return as DTO
@@ -144,7 +144,10 @@ async def create_promo_banner_endpoint(
             status=banner["status"],
             display_order=banner["display_order"],
             image_url=banner["image_url"],
-            link=banner["link"]
+            link=banner["link"],
+            placeholder=banner["placeholder"],
+            width=banner["width"],
+            height=banner["height"]
         )
     except Exception as e:
         logger.error(f"Failed to create promo banner in database: {str(e)}")
@@ -201,7 +204,10 @@ async def block_promo_banner_endpoint(
             status=banner["status"],
             display_order=banner["display_order"],
             image_url=banner["image_url"],
-            link=banner["link"]
+            link=banner["link"],
+            placeholder=banner["placeholder"],
+            width=banner["width"],
+            height=banner["height"]
         )
     except ValueError as e:
         raise HTTPException(
@@ -235,7 +241,10 @@ async def activate_promo_banner_endpoint(
             status=banner["status"],
             display_order=banner["display_order"],
             image_url=banner["image_url"],
-            link=banner["link"]
+            link=banner["link"],
+            placeholder=banner["placeholder"],
+            width=banner["width"],
+            height=banner["height"]
         )
     except ValueError as e:
         raise HTTPException(
@@ -270,7 +279,10 @@ async def update_promo_banner_link_endpoint(
             status=banner["status"],
             display_order=banner["display_order"],
             image_url=banner["image_url"],
-            link=banner["link"]
+            link=banner["link"],
+            placeholder=banner["placeholder"],
+            width=banner["width"],
+            height=banner["height"]
         )
     except ValueError as e:
         raise HTTPException(
@@ -0,0 +1,42 @@
+import logging
+from fastapi import APIRouter, Header, HTTPException, status
+
+from auth import verify_telegram_init_data, issue_session_token
+from models import SessionTokenDTO
+from user_cache import get_cached_user
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/auth", tags=["auth"])
+
+
+@router.post("/session", response_model=SessionTokenDTO)
+async def create_session(authorization: str = Header(...)):
+    """
+    Exchange Telegram WebApp initData for a short-lived session token
+
+    Requires initData in Authorization header ("tma <initData>").
+    Send the token as "Bearer <token>" instead of initData afterwards.
+    The token carries no role, so role and mode changes apply to it at once
+    """
+    # Sessions can only be started from initData, not extended with a token
+    if not authorization.startswith("tma "):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="initData required"
+        )
+
+    user_id = await verify_telegram_init_data(authorization)
+
+    user = await get_cached_user(user_id)
+    role = user["role"] if user else "USER"
+
+    token, expires_at = issue_session_token(user_id)
+    logger.info(f"Issued session token for user {user_id}")
+
+    return SessionTokenDTO(
+        token=token,
+        expires_at=expires_at,
+        user_id=user_id,
+        role=role
+    )
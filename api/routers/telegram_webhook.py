@@ -0,0 +1,67 @@
+import asyncio
+import hmac
+import logging
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Request, status
+from pydantic import ValidationError
+
+from aiogram.types import Update
+
+from bot import bot, dp, WEBHOOK_PATH_SECRET, WEBHOOK_SECRET_TOKEN, WEBHOOK_MAX_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/telegram", tags=["telegram"])
+
+# Only imported and mounted by fastapi_app when BOT_MODE=webhook
+
+# Bounds updates processed at once by this worker, extra requests wait
+# (Telegram holds at most max_connections requests open anyway)
+_update_slots = asyncio.Semaphore(WEBHOOK_MAX_CONCURRENCY)
+
+
+@router.post("/webhook/{path_secret}", include_in_schema=False)
+async def telegram_webhook(
+    path_secret: str,
+    request: Request,
+    x_telegram_bot_api_secret_token: Optional[str] = Header(None)
+):
+    """
+    Receive a Telegram update and pass it to the bot's Dispatcher
+
+    Telegram sends the secret token configured in setWebhook in the
+    X-Telegram-Bot-Api-Secret-Token header. Update JSON recorded from
+    Telegram can be posted here locally to exercise the handlers
+    """
+    if not hmac.compare_digest(path_secret, WEBHOOK_PATH_SECRET):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not Found"
+        )
+
+    if not x_telegram_bot_api_secret_token or not hmac.compare_digest(
+        x_telegram_bot_api_secret_token, WEBHOOK_SECRET_TOKEN
+    ):
+        logger.warning("Telegram webhook called with invalid secret token")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid secret token"
+        )
+
+    try:
+        update = Update.model_validate(await request.json(), context={"bot": bot})
+    except (ValueError, ValidationError) as e:
+        logger.error(f"Invalid Telegram update: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid update"
+        )
+
+    async with _update_slots:
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            # Answer 200 anyway, otherwise Telegram keeps redelivering the update
+            logger.error(f"Failed to process Telegram update {update.update_id}: {str(e)}")
+
+    return {"ok": True}
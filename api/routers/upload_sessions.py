@@ -0,0 +1,296 @@
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Header
+
+from dependencies import verify_admin_mode
+from images import save_image, delete_images
+from metrics import track_upload
+from models import UploadSessionRequest, UploadSessionDTO
+from database import (
+    create_upload_session,
+    get_upload_session,
+    update_upload_session_offset,
+    claim_upload_session,
+    release_upload_session,
+    complete_upload_session,
+    delete_expired_upload_sessions
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/uploads/sessions", tags=["uploads"])
+
+# Upload configuration
+# Partial files live outside the statically served uploads directory
+UPLOAD_TMP_DIR = Path(os.getenv("UPLOAD_TMP_DIR", "/app/data/tmp/uploads"))
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+SESSION_TTL = timedelta(hours=24)
+# A session FINALIZING for longer lost its request (e.g. the worker died) and can be finalized again
+FINALIZE_TIMEOUT = timedelta(minutes=5)
+
+
+def _session_to_dto(session: dict) -> UploadSessionDTO:
+    """Convert upload session row to DTO"""
+    return UploadSessionDTO(
+        id=session["id"],
+        status=session["status"],
+        filename=session["filename"],
+        size=session["size"],
+        offset=session["upload_offset"],
+        good_id=session["good_id"],
+        expirestamp=session["expirestamp"],
+        image_url=session["image_url"]
+    )
+
+
+def _write_chunk(path: Path, offset: int, data: bytes) -> None:
+    """Write chunk at offset and drop anything after it (runs in a worker thread)"""
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(data)
+        f.truncate()
+
+
+async def _get_owned_session(session_id: str, user_id: int) -> dict:
+    """Get active upload session created by user, raise 404 otherwise"""
+    session = await get_upload_session(session_id)
+    if not session or session["createuser"] != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Upload session {session_id} not found or expired"
+        )
+    return session
+
+
+async def _remove_expired_sessions() -> None:
+    """Delete expired sessions together with their partial files"""
+    for session_id in await delete_expired_upload_sessions():
+        (UPLOAD_TMP_DIR / session_id).unlink(missing_ok=True)
+
+
+@router.post("", response_model=UploadSessionDTO)
+async def create_upload_session_endpoint(
+    request: UploadSessionRequest,
+    user_id: int = Depends(verify_admin_mode)
+):
+    """
+    Start a resumable image upload (ADMIN only)
+
+    Protocol:
+    1. POST /uploads/sessions with filename, size and optional good_id
+    2. PATCH /uploads/sessions/{id} with raw chunk bytes and Upload-Offset header,
+       GET /uploads/sessions/{id} returns the offset to resume from
+    3. POST /uploads/sessions/{id}/finalize saves the image (and attaches it to the good)
+    """
+    logger.info(f"User {user_id} starting upload session for {request.filename} ({request.size} bytes)")
+
+    # Validate file extension
+    file_ext = Path(request.filename).suffix.lower()
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Only images are allowed ({', '.join(ALLOWED_EXTENSIONS)})"
+        )
+
+    # Validate file size
+    if request.size <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File {request.filename} is empty"
+        )
+    if request.size > MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File {request.filename} size exceeds 5MB limit"
+        )
+
+    try:
+        await _remove_expired_sessions()
+
+        session_id = uuid.uuid4().hex
+        UPLOAD_TMP_DIR.mkdir(parents=True, exist_ok=True)
+        (UPLOAD_TMP_DIR / session_id).touch()
+
+        session = await create_upload_session(
+            session_id=session_id,
+            filename=request.filename,
+            size=request.size,
+            good_id=request.good_id,
+            expirestamp=(datetime.now() + SESSION_TTL).isoformat(),
+            createuser=user_id
+        )
+        return _session_to_dto(session)
+    except Exception as e:
+        logger.error(f"Failed to create upload session: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create upload session"
+        )
+
+
+@router.get("/{session_id}", response_model=UploadSessionDTO)
+async def get_upload_session_endpoint(
+    session_id: str,
+    response: Response,
+    user_id: int = Depends(verify_admin_mode)
+):
+    """
+    Get upload session state (ADMIN only)
+
+    offset (also sent as Upload-Offset header) is where the next chunk must start
+    """
+    session = await _get_owned_session(session_id, user_id)
+    response.headers["Upload-Offset"] = str(session["upload_offset"])
+    return _session_to_dto(session)
+
+
+@router.patch("/{session_id}", response_model=UploadSessionDTO)
+async def upload_chunk_endpoint(
+    session_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+    user_id: int = Depends(verify_admin_mode)
+):
+    """
+    Upload next chunk of the file (ADMIN only)
+
+    Body is raw chunk bytes, Upload-Offset header is the chunk position.
+    Returns 409 with the current offset if the position doesn't match
+    """
+    session = await _get_owned_session(session_id, user_id)
+
+    if session["status"] != "NEW":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload session {session_id} is already finalized"
+        )
+
+    if upload_offset != session["upload_offset"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Offset mismatch, expected {session['upload_offset']}",
+            headers={"Upload-Offset": str(session["upload_offset"])}
+        )
+
+    # Stop reading as soon as the chunk runs past the declared size
+    remaining = session["size"] - upload_offset
+    parts = []
+    received = 0
+    async for part in request.stream():
+        received += len(part)
+        if received > remaining:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Chunk exceeds declared size of {session['size']} bytes"
+            )
+        parts.append(part)
+    data = b"".join(parts)
+    new_offset = upload_offset + len(data)
+
+    try:
+        with track_upload("chunk", len(data)):
+            await asyncio.to_thread(_write_chunk, UPLOAD_TMP_DIR / session_id, upload_offset, data)
+        updated = await update_upload_session_offset(session_id, upload_offset, new_offset)
+    except Exception as e:
+        logger.error(f"Failed to write chunk for upload session {session_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to save chunk"
+        )
+
+    if not updated:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload session was changed by another request"
+        )
+
+    session["upload_offset"] = new_offset
+    response.headers["Upload-Offset"] = str(new_offset)
+    return _session_to_dto(session)
+
+
+async def _finalized_by_other_request(session_id: str, user_id: int) -> UploadSessionDTO:
+    """Return the session if another request completed it, 409 while it's still finalizing"""
+    session = await _get_owned_session(session_id, user_id)
+    if session["status"] == "COMPLETED":
+        return _session_to_dto(session)
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Upload session {session_id} is being finalized by another request"
+    )
+
+
+@router.post("/{session_id}/finalize", response_model=UploadSessionDTO)
+async def finalize_upload_session_endpoint(
+    session_id: str,
+    user_id: int = Depends(verify_admin_mode)
+):
+    """
+    Finish upload and hand the file to the regular image pipeline (ADMIN only)
+
+    Saves the image like a multipart upload and attaches it to good_id if the
+    session has one. Repeated calls return the already finalized session,
+    calls made while another one is finalizing get 409 (unless it has been
+    finalizing for longer than FINALIZE_TIMEOUT)
+    """
+    session = await _get_owned_session(session_id, user_id)
+
+    if session["status"] == "COMPLETED":
+        return _session_to_dto(session)
+
+    if session["upload_offset"] != session["size"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload incomplete: {session['upload_offset']} of {session['size']} bytes received",
+            headers={"Upload-Offset": str(session["upload_offset"])}
+        )
+
+    # Only the request that claims the session saves the image
+    claimed_at = await claim_upload_session(session_id, (datetime.now() - FINALIZE_TIMEOUT).isoformat())
+    if claimed_at is None:
+        return await _finalized_by_other_request(session_id, user_id)
+
+    logger.info(f"User {user_id} finalizing upload session {session_id}")
+
+    partial_path = UPLOAD_TMP_DIR / session_id
+    file_ext = Path(session["filename"]).suffix.lower()
+
+    try:
+        contents = await asyncio.to_thread(partial_path.read_bytes)
+        saved_image = await save_image(contents, file_ext)
+    except Exception as e:
+        logger.error(f"Failed to save image from upload session {session_id}: {str(e)}")
+        await release_upload_session(session_id, claimed_at)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to save image {session['filename']}"
+        )
+
+    # Image and session status are saved together, a retry can't attach the image twice
+    try:
+        completed = await complete_upload_session(session_id, claimed_at, saved_image, session["good_id"])
+    except Exception as e:
+        logger.error(f"Failed to save image from upload session {session_id} to database: {str(e)}")
+        await delete_images([saved_image])
+        await release_upload_session(session_id, claimed_at)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to associate image with good"
+        )
+
+    if not completed:
+        # Took longer than FINALIZE_TIMEOUT and another request reclaimed the session
+        await delete_images([saved_image])
+        return await _finalized_by_other_request(session_id, user_id)
+
+    partial_path.unlink(missing_ok=True)
+
+    session["status"] = "COMPLETED"
+    session["image_url"] = saved_image["image_url"]
+    return _session_to_dto(session)
@@ -1,15 +1,19 @@
+import asyncio
 import logging
+import os
 import uuid
 from pathlib import Path
 from datetime import datetime
 from fastapi import APIRouter, HTTPException, status, UploadFile, File
 
+from metrics import track_upload
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/shop", tags=["uploads"])
 
 # Upload configuration
-UPLOAD_DIR = Path("/app/data/uploads")
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "/app/data/uploads"))
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 
@@ -60,8 +64,8 @@ async def upload_images(images: list[UploadFile] = File(...)):
 
         # Save file
         try:
-            with open(file_path, "wb") as f:
-                f.write(contents)
+            with track_upload("file", len(contents)):
+                await asyncio.to_thread(file_path.write_bytes, contents)
             logger.info(f"Image saved: {filename}")
         except Exception as e:
             logger.error(f"Failed to save image: {str(e)}")
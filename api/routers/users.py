@@ -1,9 +1,14 @@
+import asyncio
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 
-from auth import verify_telegram_init_data, verify_admin_mode
+from auth import verify_telegram_init_data
+from dependencies import get_current_user, verify_admin_mode
 from models import UserInfoDTO, UserModeUpdateRequest, PhoneUpdateRequest, SettingDTO, SettingRequest
 from database import get_user, update_user_mode, add_or_update_user, get_all_settings, upsert_setting, delete_setting
+from user_cache import get_cached_user, invalidate_user
+from user_events import watch_user_changes
 
 logger = logging.getLogger(__name__)
 
@@ -11,7 +16,10 @@ router = APIRouter(prefix="/users", tags=["users"])
 
 
 @router.get("/me", response_model=UserInfoDTO)
-async def get_current_user(user_id: int = Depends(verify_telegram_init_data)):
+async def get_current_user_info(
+    user_id: int = Depends(verify_telegram_init_data),
+    user: Optional[dict] = Depends(get_current_user)
+):
     """
     Get current user information
 
@@ -19,9 +27,6 @@ async def get_current_user(user_id: int = Depends(verify_telegram_init_data)):
     """
     logger.info(f"Fetching user info for user_id={user_id}")
 
-    # Get user from database
-    user = await get_user(user_id)
-
     if not user:
         logger.warning(f"User {user_id} not found in database")
         raise HTTPException(
@@ -43,7 +48,8 @@ async def get_current_user(user_id: int = Depends(verify_telegram_init_data)):
 @router.put("/me/mode", response_model=UserInfoDTO)
 async def update_current_user_mode(
     request: UserModeUpdateRequest,
-    user_id: int = Depends(verify_admin_mode)
+    user_id: int = Depends(verify_admin_mode),
+    user: Optional[dict] = Depends(get_current_user)
 ):
     """
     Update current user mode (ADMIN only)
@@ -62,15 +68,8 @@ async def update_current_user_mode(
     # Update user mode
     await update_user_mode(user_id, request.mode)
 
-    # Get updated user info
-    user = await get_user(user_id)
-
-    if not user:
-        logger.error(f"User {user_id} not found after mode update")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
+    # verify_admin_mode already loaded the user, only mode changed
+    user["mode"] = request.mode
 
     # Return updated user info
     return UserInfoDTO(
@@ -96,20 +95,62 @@ async def update_current_user_phone(
     """
     logger.info(f"Updating phone for user_id={user_id}")
 
-    # Update user phone
-    await add_or_update_user(user_id, phone=request.phone)
+    # Update user phone (returns the saved row, no extra lookup needed)
+    user = await add_or_update_user(user_id, phone=request.phone)
 
-    # Get updated user info
-    user = await get_user(user_id)
+    # Return updated user info
+    return UserInfoDTO(
+        id=user["id"],
+        role=user["role"],
+        mode=user["mode"],
+        status=user["status"],
+        username=user.get("username"),
+        phone=user.get("phone")
+    )
+
+
+@router.get("/me/events", response_model=UserInfoDTO)
+async def wait_for_current_user_phone(
+    timeout: float = Query(15, ge=1, le=30),
+    user_id: int = Depends(verify_telegram_init_data)
+):
+    """
+    Wait until the current user has a phone number (long polling)
+
+    Requires valid Telegram WebApp initData in Authorization header
+    Returns as soon as the phone is saved (e.g. after requestContact()),
+    or the current user info once the timeout (seconds) expires. A phone
+    saved by the bot process wakes the request within
+    USER_CHANGES_POLL_INTERVAL (see user_events)
+    """
+    logger.info(f"Waiting for phone of user_id={user_id} (timeout={timeout}s)")
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    # Registered before the first read, so a phone saved right after it still wakes the request
+    with watch_user_changes(user_id) as changes:
+        user = await get_cached_user(user_id)
+
+        while not (user and user.get("phone")):
+            remaining = deadline - loop.time()
+            timed_out = remaining <= 0 or not await changes.wait(remaining)
+
+            # Read the database on timeout too: the feed may not have delivered the save yet
+            user = await get_user(user_id)
+            if user and user.get("phone"):
+                # GET /users/me of the next "Заказать" click must not get a
+                # cached row without the phone
+                invalidate_user(user_id)
+            if timed_out:
+                break
 
     if not user:
-        logger.error(f"User {user_id} not found after phone update")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
 
-    # Return updated user info
     return UserInfoDTO(
         id=user["id"],
         role=user["role"],
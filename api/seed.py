@@ -0,0 +1,372 @@
+"""
+Synthetic data generator for performance work
+
+Creates a fresh database with the real schema (init_db) and fills it with
+data shaped like the production shop: a long tail of goods with skewed
+image counts and popularity, users with and without phones, and orders
+whose cart sizes and statuses depend on their age. Timestamps are counted
+back from --now, the start of the current day by default, so the same
+--seed and --now always produce the same data.
+
+Usage (from the api directory):
+    python seed.py --db /tmp/shop.db [--goods 1000 --images 5000 --orders 20000]
+        [--users 2000 --phone-ratio 0.6] [--image-files --upload-dir /tmp/uploads]
+        [--seed 42] [--now 2025-01-01T00:00:00] [--force]
+"""
+import io
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import sqlite3
+from bisect import bisect
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image, ImageDraw
+
+import database
+from images import compute_image_metadata
+
+logger = logging.getLogger(__name__)
+
+ADMIN_ID = 1
+# Telegram user ids of generated customers start here
+FIRST_USER_ID = 100000000
+MAX_IMAGES_PER_GOOD = 20
+IMAGE_POOL_SIZE = 12
+
+# Items per cart and units per item, as (value, weight)
+CART_SIZES = [(1, 55), (2, 25), (3, 12), (4, 5), (5, 3)]
+ITEM_COUNTS = [(1, 80), (2, 15), (3, 5)]
+# Orders of the last days are still being worked on, older ones are closed
+OPEN_ORDER_DAYS = 3
+OPEN_STATUSES = [("NEW", 40), ("PROCESSING", 35), ("SENT", 15), ("COMPLETED", 5), ("CANCELLED", 5)]
+CLOSED_STATUSES = [("COMPLETED", 88), ("CANCELLED", 12)]
+# Relative number of orders per hour of the day
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 6, 8, 9, 10, 10, 10, 10, 10, 10, 11, 12, 12, 10, 8, 5, 3, 2]
+
+CATEGORY_NAMES = ["Розы", "Тюльпаны", "Пионы", "Хризантемы", "Лилии", "Орхидеи", "Гортензии",
+                  "Сборные букеты", "Композиции в коробке", "Монобукеты", "Свадебные", "Комнатные растения"]
+FLOWERS = ["роз", "тюльпанов", "пионов", "хризантем", "лилий", "ромашек", "гербер", "ирисов", "эустом"]
+ADJECTIVES = ["Нежный", "Яркий", "Весенний", "Классический", "Пышный", "Летний", "Воздушный", "Королевский"]
+STREETS = ["Цветочная", "Садовая", "Ленина", "Мира", "Центральная", "Полевая", "Лесная"]
+
+
+def _pick(rng: random.Random, choices: list[tuple]) -> object:
+    """Weighted choice from (value, weight) pairs"""
+    return rng.choices([value for value, _ in choices], [weight for _, weight in choices])[0]
+
+
+def _render_image_pool(rng: random.Random) -> list[tuple[bytes, dict]]:
+    """A few distinct JPEGs with their metadata, reused for every image row"""
+    pool = []
+    for i in range(IMAGE_POOL_SIZE):
+        width, height = rng.choice([(1200, 1600), (1600, 1200), (1200, 1200)])
+        color = tuple(rng.randrange(80, 256) for _ in range(3))
+        image = Image.new("RGB", (width, height), color)
+        draw = ImageDraw.Draw(image)
+        for _ in range(20):
+            x, y, r = rng.randrange(width), rng.randrange(height), rng.randrange(40, 200)
+            draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=80)
+        contents = buffer.getvalue()
+        pool.append((contents, compute_image_metadata(contents) or {}))
+    return pool
+
+
+def _write_image_files(upload_dir: Path, filenames: list[str], pool: list[tuple[bytes, dict]]) -> None:
+    """Write the pool once and hard link every image row to one of its files"""
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    sources = []
+    for i, (contents, _) in enumerate(pool):
+        source = upload_dir / f"seed-pool-{i}.jpg"
+        source.write_bytes(contents)
+        sources.append(source)
+
+    for i, filename in enumerate(filenames):
+        target = upload_dir / filename
+        target.unlink(missing_ok=True)
+        source = sources[i % len(sources)]
+        try:
+            os.link(source, target)
+        except OSError:
+            target.write_bytes(source.read_bytes())
+
+
+def _image_counts(rng: random.Random, goods: int, images: int) -> list[int]:
+    """Images per good: at least one, a few goods have many (Pareto weights)"""
+    weights = [rng.paretovariate(1.5) for _ in range(goods)]
+    total_weight = sum(weights)
+    return [
+        max(1, min(MAX_IMAGES_PER_GOOD, round(images * weight / total_weight)))
+        for weight in weights
+    ]
+
+
+def generate(
+    db_path: str,
+    categories: int = 12,
+    goods: int = 1000,
+    images: int = 5000,
+    banners: int = 5,
+    users: int = 2000,
+    phone_ratio: float = 0.6,
+    orders: int = 20000,
+    days: int = 365,
+    seed: int = 42,
+    upload_dir: Optional[Path] = None,
+    now: Optional[datetime] = None
+) -> dict:
+    """
+    Fill a database created by init_db with synthetic rows
+
+    Rows are inserted in one transaction with executemany. Image files are
+    only written if upload_dir is given. All timestamps are at or before
+    now (default: start of the current day).
+
+    Returns:
+        dict: number of rows generated per table
+    """
+    rng = random.Random(seed)
+    now = (now or datetime.now().replace(hour=0, minute=0, second=0)).replace(microsecond=0)
+    stamp = now.isoformat()
+    pool = _render_image_pool(rng)
+    image_files: list[str] = []
+
+    def image_row(prefix: str) -> tuple[str, dict]:
+        index = len(image_files)
+        filename = f"{prefix}-{index}.jpg"
+        image_files.append(filename)
+        return f"/api/static/{filename}", pool[index % len(pool)][1]
+
+    category_rows = [
+        (i, CATEGORY_NAMES[(i - 1) % len(CATEGORY_NAMES)] + ("" if i <= len(CATEGORY_NAMES) else f" {i}"), "NEW", stamp, stamp)
+        for i in range(1, categories + 1)
+    ]
+
+    goods_rows = []
+    prices = {}
+    names = {}
+    for good_id in range(1, goods + 1):
+        price = rng.choice([1500, 2500, 3500, 4500, 5500, 7000, 9000, 12000, 15000, 25000]) + rng.randrange(0, 10) * 100
+        name = f"{rng.choice(ADJECTIVES)} букет из {rng.randint(3, 101)} {rng.choice(FLOWERS)}"
+        prices[good_id] = price
+        names[good_id] = name
+        created = (now - timedelta(days=rng.randrange(days))).isoformat()
+        goods_rows.append((
+            good_id, created, created, "NEW" if rng.random() > 0.08 else "BLOCKED", name,
+            rng.randint(1, categories) if categories else None, price,
+            round(price * 1.2, -2) if rng.random() < 0.15 else None,
+            f"{name}. Свежие цветы с доставкой в день заказа."
+        ))
+
+    image_rows = []
+    for good_id, count in zip(range(1, goods + 1), _image_counts(rng, goods, images)):
+        for display_order in range(count):
+            url, metadata = image_row(f"seed-good-{good_id}")
+            image_rows.append((good_id, url, display_order, metadata.get("placeholder"), metadata.get("width"), metadata.get("height")))
+
+    banner_rows = []
+    for display_order in range(banners):
+        url, metadata = image_row("seed-banner")
+        banner_rows.append((
+            stamp, stamp, "NEW", display_order, url, rng.randint(1, goods) if goods else None,
+            metadata.get("placeholder"), metadata.get("width"), metadata.get("height")
+        ))
+
+    user_rows = [(ADMIN_ID, "NEW", stamp, stamp, "ADMIN", "ADMIN", "admin", "+79000000001")]
+    buyers = []
+    for i in range(users):
+        user_id = FIRST_USER_ID + i
+        joined = (now - timedelta(days=rng.randrange(days))).isoformat()
+        phone = f"+79{rng.randrange(10 ** 9):09d}" if rng.random() < phone_ratio else None
+        user_rows.append((user_id, "NEW", joined, joined, "USER", "USER", f"user{user_id}", phone))
+        if phone:
+            buyers.append(user_id)
+
+    # Popularity of goods follows a Zipf-like curve
+    popularity = list(range(1, goods + 1))
+    rng.shuffle(popularity)
+    cumulative = []
+    running = 0.0
+    for rank in range(1, goods + 1):
+        running += 1 / rank ** 0.9
+        cumulative.append(running)
+
+    order_rows = []
+    cart_rows = []
+    for order_id in range(1, (orders if buyers and goods else 0) + 1):
+        age_days = rng.randrange(days)
+        hour = rng.choices(range(24), HOUR_WEIGHTS)[0]
+        created = (now - timedelta(days=age_days)).replace(hour=hour, minute=rng.randrange(60), second=rng.randrange(60))
+        created = min(created, now)
+        status = _pick(rng, OPEN_STATUSES if age_days < OPEN_ORDER_DAYS else CLOSED_STATUSES)
+        user_id = rng.choice(buyers)
+        delivery_type = "COURIER" if rng.random() < 0.45 else "PICK_UP"
+        address = f"ул. {rng.choice(STREETS)}, {rng.randint(1, 120)}" if delivery_type == "COURIER" else "Самовывоз"
+
+        good_ids = set()
+        cart_size = _pick(rng, CART_SIZES)
+        while len(good_ids) < min(cart_size, goods):
+            good_ids.add(popularity[bisect(cumulative, rng.random() * running)])
+
+        total = 0
+        for good_id in sorted(good_ids):
+            count = _pick(rng, ITEM_COUNTS)
+            line_total = prices[good_id] * count
+            total += line_total
+            cart_rows.append((order_id, good_id, count, names[good_id], prices[good_id], line_total))
+
+        changed = min(created + timedelta(hours=rng.randint(0, 48)), now) if status != "NEW" else created
+        order_rows.append((
+            order_id, status, user_id, created.isoformat(), changed.isoformat(), user_id,
+            ADMIN_ID if status != "NEW" else user_id, delivery_type, address, total
+        ))
+
+    address_rows = [(f"г. Москва, ул. {street}, {i + 1}",) for i, street in enumerate(STREETS[:3])]
+
+    connection = sqlite3.connect(db_path)
+    try:
+        # Nothing to lose if the seed is interrupted, skip fsyncs
+        connection.execute("PRAGMA synchronous = OFF")
+        with connection:
+            connection.executemany(
+                "INSERT INTO categories (id, title, status, createstamp, changestamp) VALUES (?, ?, ?, ?, ?)",
+                category_rows
+            )
+            connection.executemany(
+                """INSERT INTO goods (id, createstamp, changestamp, status, name, category_id, price, non_discount_price, description)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                goods_rows
+            )
+            connection.executemany(
+                """INSERT INTO goods_images (good_id, image_url, display_order, placeholder, width, height)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                image_rows
+            )
+            connection.executemany(
+                """INSERT INTO promo_banner (createstamp, changestamp, status, display_order, image_url, link, placeholder, width, height)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                banner_rows
+            )
+            connection.executemany(
+                """INSERT INTO user_info (id, status, createstamp, changestamp, role, mode, username, phone)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                user_rows
+            )
+            connection.executemany("INSERT INTO shop_addresses (address) VALUES (?)", address_rows)
+            connection.executemany(
+                """INSERT INTO orders (id, status, user_id, createstamp, changestamp, createuser, changeuser, delivery_type, delivery_address, total)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                order_rows
+            )
+            connection.executemany(
+                "INSERT INTO cart (order_id, good_id, count, good_name, price, line_total) VALUES (?, ?, ?, ?, ?, ?)",
+                cart_rows
+            )
+    finally:
+        connection.close()
+
+    if upload_dir is not None:
+        _write_image_files(upload_dir, image_files, pool)
+
+    return {
+        "categories": len(category_rows),
+        "goods": len(goods_rows),
+        "goods_images": len(image_rows),
+        "promo_banner": len(banner_rows),
+        "user_info": len(user_rows),
+        "users_with_phone": len(buyers),
+        "shop_addresses": len(address_rows),
+        "orders": len(order_rows),
+        "cart": len(cart_rows),
+        "image_files": len(image_files) if upload_dir is not None else 0
+    }
+
+
+def count_rows(db_path: str) -> dict:
+    """Number of rows per table of an existing database, same keys as generate() returns"""
+    connection = sqlite3.connect(db_path)
+    try:
+        counts = {
+            table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("categories", "goods", "goods_images", "promo_banner", "user_info",
+                          "shop_addresses", "orders", "cart")
+        }
+        counts["users_with_phone"] = connection.execute(
+            "SELECT COUNT(*) FROM user_info WHERE phone IS NOT NULL AND id != ?", (ADMIN_ID,)
+        ).fetchone()[0]
+        return counts
+    finally:
+        connection.close()
+
+
+async def seed_database(db_path: str, **options) -> dict:
+    """Create the schema, generate data and build the sales rollups"""
+    database.DB_PATH = db_path
+    await database.init_db()
+    counts = await asyncio.to_thread(generate, db_path, **options)
+    # init_db built the rollups while the tables were empty
+    await database.rebuild_sales_rollups()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=database.DB_PATH, help="database file to create")
+    parser.add_argument("--categories", type=int, default=12)
+    parser.add_argument("--goods", type=int, default=1000)
+    parser.add_argument("--images", type=int, default=5000, help="total goods images, spread unevenly")
+    parser.add_argument("--banners", type=int, default=5)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--phone-ratio", type=float, default=0.6, help="share of users who shared their phone")
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=365, help="orders are spread over this many days")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--now", type=datetime.fromisoformat,
+                        help="timestamps are generated up to this moment, default: start of today")
+    parser.add_argument("--image-files", action="store_true", help="also write placeholder image files")
+    parser.add_argument("--upload-dir", default=os.getenv("UPLOAD_DIR", "/app/data/uploads"))
+    parser.add_argument("--force", action="store_true", help="replace an existing database file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    db_path = Path(args.db)
+    if db_path.exists():
+        if not args.force:
+            logger.error(f"{db_path} already exists, use --force to replace it")
+            sys.exit(1)
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+
+    started = time.monotonic()
+    counts = asyncio.run(seed_database(
+        str(db_path),
+        categories=args.categories,
+        goods=args.goods,
+        images=args.images,
+        banners=args.banners,
+        users=args.users,
+        phone_ratio=args.phone_ratio,
+        orders=args.orders,
+        days=args.days,
+        seed=args.seed,
+        upload_dir=Path(args.upload_dir) if args.image_files else None,
+        now=args.now
+    ))
+
+    logger.info(f"Seeded {db_path} in {time.monotonic() - started:.1f}s: "
+                + ", ".join(f"{table}={count}" for table, count in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
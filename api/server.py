@@ -0,0 +1,52 @@
+import asyncio
+import logging
+import os
+import shutil
+from dotenv import load_dotenv
+import uvicorn
+
+from database import init_db
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Number of uvicorn worker processes
+API_WORKERS = int(os.getenv("API_WORKERS", "2"))
+
+# Keep idle connections open longer than nginx's upstream keepalive_timeout (60s)
+# so nginx never reuses a connection the worker is about to close
+KEEP_ALIVE_TIMEOUT = int(os.getenv("API_KEEP_ALIVE_TIMEOUT", "75"))
+
+
+# Workers write metrics here so /metrics can sum them up (see metrics.py)
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+
+def main():
+    """Run database migrations once, then start the FastAPI workers"""
+    asyncio.run(init_db())
+
+    if PROMETHEUS_MULTIPROC_DIR:
+        # Counters of the previous run would be added to the new ones
+        shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+        os.makedirs(PROMETHEUS_MULTIPROC_DIR)
+
+    logger.info(f"Starting FastAPI server on port 8000 with {API_WORKERS} workers...")
+    uvicorn.run(
+        "fastapi_app:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=API_WORKERS,
+        timeout_keep_alive=KEEP_ALIVE_TIMEOUT,
+        # fastapi_app logs requests with AccessLogMiddleware
+        access_log=False,
+        log_level="info"
+    )
+
+
+if __name__ == "__main__":
+    main()
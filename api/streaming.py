@@ -0,0 +1,54 @@
+"""
+Streaming JSON responses for large listings
+"""
+import logging
+from typing import AsyncIterator, Callable
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Flush serialized items to the client in chunks of this size
+CHUNK_SIZE = 64 * 1024
+
+
+async def _json_array_chunks(first: dict, items: AsyncIterator[dict], to_model: Callable[[dict], BaseModel]):
+    """Serialize items one by one as elements of a JSON array"""
+    if first is None:
+        yield b"[]"
+        return
+
+    chunk = bytearray(b"[")
+    count = 1
+    try:
+        chunk += to_model(first).model_dump_json().encode()
+
+        async for item in items:
+            chunk += b","
+            chunk += to_model(item).model_dump_json().encode()
+            count += 1
+
+            if len(chunk) >= CHUNK_SIZE:
+                yield bytes(chunk)
+                chunk.clear()
+    except Exception as e:
+        # The status is already sent: re-raising makes the server drop the
+        # connection without ending the body, so the client sees a failed
+        # download instead of a complete but truncated array
+        logger.error(f"Failed to stream JSON array after {count} items: {str(e)}")
+        raise
+
+    chunk += b"]"
+    yield bytes(chunk)
+
+
+async def stream_json_array(items: AsyncIterator[dict], to_model: Callable[[dict], BaseModel]) -> StreamingResponse:
+    """
+    Stream items as a JSON array, converting each one with to_model
+
+    Memory use stays constant regardless of the number of items. The first
+    item is fetched before the response starts, so database errors can still
+    be reported with a proper status code. Later errors abort the response
+    """
+    first = await anext(items, None)
+    return StreamingResponse(_json_array_chunks(first, items, to_model), media_type="application/json")
@@ -0,0 +1,219 @@
+"""
+Lightweight request tracing
+
+TracingMiddleware starts a trace per HTTP request and returns its id in the
+X-Trace-Id header. Spans opened while handling the request (database calls,
+cache lookups, notification delivery) find their parent through a
+contextvar, so they also follow the request into asyncio.to_thread() and
+tasks it starts. Outside a request span() does nothing.
+
+Finished spans are kept in an in-memory ring buffer (GET /debug/traces) and
+appended to TRACE_FILE as JSON lines if it is set.
+"""
+import os
+import re
+import json
+import time
+import logging
+import secrets
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from database import add_call_observer
+from access_log import redact_path
+
+logger = logging.getLogger(__name__)
+span_logger = logging.getLogger("tracing.spans")
+
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "5000"))
+TRACE_FILE = os.getenv("TRACE_FILE")
+
+TRACE_ID_HEADER = b"x-trace-id"
+_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class Span:
+    """One timed operation of a trace"""
+
+    __slots__ = ("trace_id", "span_id", "parent", "name", "attributes", "start", "error", "_started")
+
+    def __init__(self, trace_id: str, name: str, parent: Optional["Span"] = None, attributes: Optional[dict] = None):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent = parent
+        self.name = name
+        self.attributes = attributes or {}
+        self.start = time.time()
+        self.error: Optional[str] = None
+        self._started = time.perf_counter()
+
+    def set(self, key: str, value) -> None:
+        """Set an attribute of the span"""
+        self.attributes[key] = value
+
+    def to_dict(self, duration: float) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(duration * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+# Finished spans, oldest first
+_spans: deque[dict] = deque(maxlen=TRACE_BUFFER_SIZE)
+_spans_lock = threading.Lock()
+
+if TRACE_FILE:
+    _file_handler = logging.FileHandler(TRACE_FILE)
+    _file_handler.setFormatter(logging.Formatter("%(message)s"))
+    span_logger.addHandler(_file_handler)
+    span_logger.setLevel(logging.INFO)
+    span_logger.propagate = False
+
+
+def _export(span: Span) -> None:
+    """Store a finished span"""
+    record = span.to_dict(time.perf_counter() - span._started)
+    with _spans_lock:
+        _spans.append(record)
+    if TRACE_FILE:
+        span_logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+def current_trace_id() -> Optional[str]:
+    """Trace id of the current request, None outside a request"""
+    span = _current_span.get()
+    return span.trace_id if span else None
+
+
+def current_span() -> Optional[Span]:
+    """Innermost open span, None outside a request"""
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time the block as a child of the current span (no-op outside a trace)"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(parent.trace_id, name, parent, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        _export(child)
+
+
+def get_traces(limit: int = 50, min_ms: float = 0, name: Optional[str] = None) -> list[dict]:
+    """Root spans of recent traces, newest first"""
+    with _spans_lock:
+        spans = list(_spans)
+
+    roots = [
+        record for record in reversed(spans)
+        if record["parent_id"] is None
+        and record["duration_ms"] >= min_ms
+        and (name is None or name in record["name"])
+    ]
+    return roots[:limit]
+
+
+def get_trace(trace_id: str) -> list[dict]:
+    """All buffered spans of a trace, in start order"""
+    with _spans_lock:
+        spans = [record for record in _spans if record["trace_id"] == trace_id]
+    return sorted(spans, key=lambda record: record["start"])
+
+
+def _db_call_started(function: str) -> None:
+    parent = _current_span.get()
+    if parent is not None:
+        _current_span.set(Span(parent.trace_id, f"db.{function}", parent))
+
+
+def _db_call_finished(function: str, duration: float, statements: int) -> None:
+    # Called in the same context as _db_call_started, the span is still current
+    child = _current_span.get()
+    if child is None or child.name != f"db.{function}":
+        return
+    child.set("statements", statements)
+    _export(child)
+    _current_span.set(child.parent)
+
+
+class TracingMiddleware:
+    """
+    Start a trace per HTTP request and echo its id in X-Trace-Id
+
+    A valid 32 hex digit X-Trace-Id request header is used as the trace id,
+    so a client can correlate its own logs
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = None
+        for key, value in scope.get("headers") or []:
+            if key == TRACE_ID_HEADER:
+                trace_id = value.decode("latin-1").lower()
+                break
+        if not trace_id or not _TRACE_ID.match(trace_id):
+            trace_id = secrets.token_hex(16)
+
+        root = Span(trace_id, scope["method"])
+        # request.state.trace_id for handlers and the access log
+        scope.setdefault("state", {})["trace_id"] = trace_id
+        status_code = 500
+
+        async def send_with_trace_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((TRACE_ID_HEADER, trace_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current_span.set(root)
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        except BaseException as e:
+            root.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+
+            path = redact_path(scope["path"], scope.get("path_params") or {})
+            route = scope.get("route")
+            root.name = f"{scope['method']} {route.path if route is not None else path}"
+            endpoint = scope.get("endpoint")
+            if route is not None and endpoint is not None:
+                root.set("handler", endpoint.__name__)
+            root.set("path", path)
+            root.set("status", status_code)
+            _export(root)
+
+
+add_call_observer(_db_call_started, _db_call_finished)
@@ -0,0 +1,126 @@
+"""
+Small in-process cache of user rows with a per-request lookup counter
+"""
+import os
+import time
+import logging
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Optional
+
+from database import get_user, add_user_change_listener
+from metrics import cache_hit, cache_miss
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Users saved by other processes (other API workers, the bot) are
+# invalidated through user_events.user_change_feed. Entries also expire on
+# their own, for rows changed outside the database functions
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1000"))
+
+# user_id -> (user row or None, expires_at), least recently used first
+_users: OrderedDict[int, tuple[Optional[dict], float]] = OrderedDict()
+
+# user_id -> [loads in flight, generation] of users being read from the
+# database, invalidate_user bumps the generation so loads that started
+# before the change don't store the row they read
+_loading: dict[int, list[int]] = {}
+
+# Number of user rows loaded from the database during the current request
+_request_lookups: ContextVar[Optional[list[int]]] = ContextVar("user_lookups", default=None)
+
+
+def start_lookup_counter() -> list[int]:
+    """Start counting user lookups for the current request, returns the counter"""
+    counter = [0]
+    _request_lookups.set(counter)
+    return counter
+
+
+async def get_cached_user(user_id: int) -> Optional[dict]:
+    """Get user information by user_id, loading it from the database on cache miss"""
+    now = time.monotonic()
+
+    cached = _users.get(user_id)
+    if cached is not None and cached[1] > now:
+        _users.move_to_end(user_id)
+        cache_hit("user")
+        user = cached[0]
+        return dict(user) if user else None
+
+    cache_miss("user")
+    counter = _request_lookups.get()
+    if counter is not None:
+        counter[0] += 1
+
+    loading = _loading.setdefault(user_id, [0, 0])
+    loading[0] += 1
+    generation = loading[1]
+    try:
+        with span("cache.user.miss", user_id=user_id):
+            user = await get_user(user_id)
+    finally:
+        loading[0] -= 1
+        if not loading[0]:
+            del _loading[user_id]
+
+    # The row may predate a change saved while it was being read
+    if loading[1] == generation:
+        _store(user_id, user, now)
+
+    return dict(user) if user else None
+
+
+def _store(user_id: int, user: Optional[dict], now: float) -> None:
+    _users[user_id] = (user, now + USER_CACHE_TTL)
+    _users.move_to_end(user_id)
+    if len(_users) > USER_CACHE_SIZE:
+        _users.popitem(last=False)
+
+
+def invalidate_user(user_id: int) -> None:
+    """Drop cached user row and discard loads of it still in flight"""
+    _users.pop(user_id, None)
+    loading = _loading.get(user_id)
+    if loading is not None:
+        loading[1] += 1
+
+
+class UserLookupCounterMiddleware:
+    """
+    Count user rows loaded from the database per request
+
+    Reports the count in the X-User-Lookups response header and warns when
+    a request loads more than one user
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        counter = start_lookup_counter()
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-user-lookups", str(counter[0]).encode()))
+                message = {**message, "headers": headers}
+                if counter[0] > 1:
+                    logger.warning(f"{scope['method']} {scope['path']} loaded {counter[0]} users")
+            await send(message)
+
+        await self.app(scope, receive, send_with_count)
+
+
+def _on_user_changed(user_id: int, changes: dict) -> None:
+    """Invalidate cached row whenever a user is saved"""
+    invalidate_user(user_id)
+
+
+add_user_change_listener(_on_user_changed)
@@ -0,0 +1,147 @@
+"""
+Notifications about saved users
+
+Users saved by this process notify the listeners registered with
+add_user_change_listener right away. Users saved by other processes (the
+bot, other API workers) are picked up from the user_changes table by
+user_change_feed within USER_CHANGES_POLL_INTERVAL, so cached rows and
+long-polling requests of every worker see them too.
+"""
+import asyncio
+import logging
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+from database import (
+    add_user_change_listener,
+    notify_user_changed,
+    get_user_changes,
+    get_last_user_change_id,
+    delete_user_changes_before
+)
+
+logger = logging.getLogger(__name__)
+
+# How often the table is checked for users saved by other processes
+USER_CHANGES_POLL_INTERVAL = float(os.getenv("USER_CHANGES_POLL_INTERVAL", "1"))
+USER_CHANGES_RETENTION_HOURS = int(os.getenv("USER_CHANGES_RETENTION_HOURS", "24"))
+
+PRUNE_INTERVAL = 3600
+
+# user_id -> waiters of requests waiting for that user to change
+_waiters: dict[int, set["UserChangeWaiter"]] = {}
+
+
+class UserChangeWaiter:
+    """Wakes up when the user is saved, see watch_user_changes"""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self._event = asyncio.Event()
+
+    def notify(self) -> None:
+        """Mark the user as saved"""
+        self._event.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """
+        Wait until the user is saved or the timeout expires
+
+        A save made since the previous wait (or since registration) returns
+        right away
+
+        Returns:
+            bool: True if the user was saved, False on timeout
+        """
+        try:
+            async with asyncio.timeout(timeout):
+                await self._event.wait()
+        except TimeoutError:
+            return False
+        self._event.clear()
+        return True
+
+
+@contextmanager
+def watch_user_changes(user_id: int) -> Iterator[UserChangeWaiter]:
+    """
+    Register a waiter for saves of the user
+
+    Enter before reading the user, so a save made between the read and the
+    wait isn't missed. Users saved by other processes are seen once
+    user_change_feed reads them, provided it's running
+    """
+    waiter = UserChangeWaiter(user_id)
+    _waiters.setdefault(user_id, set()).add(waiter)
+    try:
+        yield waiter
+    finally:
+        waiters = _waiters.get(user_id)
+        if waiters is not None:
+            waiters.discard(waiter)
+            if not waiters:
+                del _waiters[user_id]
+
+
+def _on_user_changed(user_id: int, changes: dict) -> None:
+    """Wake up requests waiting for this user"""
+    for waiter in _waiters.get(user_id, ()):
+        waiter.notify()
+
+
+class UserChangeFeed:
+    """
+    Tail the user_changes table and notify listeners of this process
+
+    One query per poll interval per process, however many users are cached
+    or waited for
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the background task (call from a running event loop)"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        position = None
+        last_prune = 0.0
+        loop = asyncio.get_running_loop()
+
+        while True:
+            try:
+                if position is None:
+                    # Changes made before this process started don't matter
+                    position = await get_last_user_change_id()
+
+                changes, position = await get_user_changes(position)
+                for change in changes:
+                    notify_user_changed(change["user_id"], dict.fromkeys(change["fields"]))
+
+                if loop.time() - last_prune > PRUNE_INTERVAL:
+                    last_prune = loop.time()
+                    before = (datetime.now() - timedelta(hours=USER_CHANGES_RETENTION_HOURS)).isoformat()
+                    deleted = await delete_user_changes_before(before)
+                    if deleted:
+                        logger.info(f"Deleted {deleted} old user changes")
+            except Exception as e:
+                logger.error(f"Failed to read user changes: {str(e)}")
+
+            await asyncio.sleep(USER_CHANGES_POLL_INTERVAL)
+
+
+user_change_feed = UserChangeFeed()
+add_user_change_listener(_on_user_changed)
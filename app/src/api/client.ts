@@ -27,6 +27,9 @@ export interface GoodCardData {
 export interface ImageDTO {
   image_url: string;
   display_order: number;
+  placeholder?: string | null;  // Tiny base64 WebP data URI shown while the image loads
+  width?: number | null;
+  height?: number | null;
 }
 
 // Good DTO for public goods listing
@@ -48,6 +51,9 @@ export interface PromoBannerDTO {
   display_order: number;
   image_url: string;
   link?: number | null;
+  placeholder?: string | null;
+  width?: number | null;
+  height?: number | null;
 }
 
 // Category from backend
@@ -84,6 +90,81 @@ export interface SettingRequest {
 // In development with Vite proxy or production with nginx, both route /api to backend
 const API_BASE_URL = import.meta.env.VITE_API_URL || '/api';
 
+// Session token exchanged for initData, see authHeader()
+let session: { initData: string; token: string; expiresAt: number } | null = null;
+let sessionRequest: Promise<string> | null = null;
+
+/**
+ * Exchange initData for a short-lived session token
+ *
+ * @param initData - Telegram WebApp initData string
+ * @returns Promise<string> - Session token
+ * @throws Error if request fails
+ */
+async function createSession(initData: string): Promise<string> {
+  const response = await fetch(`${API_BASE_URL}/auth/session`, {
+    method: 'POST',
+    headers: {
+      'Authorization': `tma ${initData}`,
+    },
+  });
+
+  if (!response.ok) {
+    const errorText = await response.text();
+    throw new Error(`Failed to create session: ${response.status} ${errorText}`);
+  }
+
+  const data = await response.json();
+  session = { initData, token: data.token, expiresAt: data.expires_at };
+  return data.token;
+}
+
+/**
+ * Build Authorization header value for API requests
+ *
+ * Sends a compact session token instead of the full initData. The token is
+ * requested once and reused until shortly before it expires. Falls back to
+ * initData if the token can't be obtained
+ *
+ * @param initData - Telegram WebApp initData string
+ * @returns Promise<string> - Authorization header value
+ */
+async function authHeader(initData: string): Promise<string> {
+  if (session && session.initData === initData && session.expiresAt - 60 > Date.now() / 1000) {
+    return `Bearer ${session.token}`;
+  }
+
+  if (!sessionRequest) {
+    sessionRequest = createSession(initData).finally(() => {
+      sessionRequest = null;
+    });
+  }
+
+  try {
+    return `Bearer ${await sessionRequest}`;
+  } catch (error) {
+    console.error('Failed to create session, sending initData:', error);
+    return `tma ${initData}`;
+  }
+}
+
+// Widths served by /static/img/{width}/{filename} (must match RESIZE_WIDTHS in api/images.py)
+const RESIZE_WIDTHS = [160, 320, 480, 640, 960, 1280];
+
+/**
+ * Build srcSet with resized variants of an uploaded image
+ *
+ * @param imageUrl - Uploaded image URL (/api/static/<filename>)
+ * @returns string | undefined - srcSet value, undefined for non-uploaded images
+ */
+export function resizedImageSrcSet(imageUrl: string): string | undefined {
+  const match = imageUrl.match(/^(.*\/static\/)([^/]+)$/);
+  if (!match) {
+    return undefined;
+  }
+  return RESIZE_WIDTHS.map(width => `${match[1]}img/${width}/${match[2]} ${width}w`).join(', ');
+}
+
 /**
  * Fetch current user information from backend
  *
@@ -95,7 +176,7 @@ export async function fetchUserInfo(initData: string): Promise<UserInfo> {
   const response = await fetch(`${API_BASE_URL}/users/me`, {
     method: 'GET',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
   });
@@ -109,6 +190,35 @@ export async function fetchUserInfo(initData: string): Promise<UserInfo> {
   return data as UserInfo;
 }
 
+/**
+ * Wait until the current user has a phone number (long polling)
+ *
+ * The request is held by the backend until the bot saves the phone
+ * shared via requestContact(), or until the timeout expires.
+ *
+ * @param initData - Telegram WebApp initData string
+ * @param timeoutSeconds - How long the backend may hold the request
+ * @returns Promise<UserInfo> - User information (phone is null on timeout)
+ * @throws Error if request fails
+ */
+export async function waitForUserPhone(initData: string, timeoutSeconds: number = 15): Promise<UserInfo> {
+  const response = await fetch(`${API_BASE_URL}/users/me/events?timeout=${timeoutSeconds}`, {
+    method: 'GET',
+    headers: {
+      'Authorization': await authHeader(initData),
+      'Content-Type': 'application/json',
+    },
+  });
+
+  if (!response.ok) {
+    const errorText = await response.text();
+    throw new Error(`Failed to wait for user phone: ${response.status} ${errorText}`);
+  }
+
+  const data = await response.json();
+  return data as UserInfo;
+}
+
 /**
  * Create a new good card (ADMIN only)
  *
@@ -124,7 +234,7 @@ export async function createGoodCard(
   const response = await fetch(`${API_BASE_URL}/goods/card`, {
     method: 'POST',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
     body: JSON.stringify(goodCardData),
@@ -156,7 +266,7 @@ export async function updateGoodCard(
   const response = await fetch(`${API_BASE_URL}/goods/${goodId}`, {
     method: 'PUT',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
     body: JSON.stringify(goodCardData),
@@ -198,9 +308,132 @@ export async function uploadImages(files: File[]): Promise<string[]> {
   return data.imageUrls;
 }
 
+// Chunk size and retry policy for resumable uploads over flaky mobile links
+const UPLOAD_CHUNK_SIZE = 256 * 1024;
+const UPLOAD_MAX_RETRIES = 5;
+
+interface UploadSessionDTO {
+  id: string;
+  status: string;
+  filename: string;
+  size: number;
+  offset: number;
+  good_id?: number | null;
+  expirestamp: string;
+  image_url?: string | null;
+}
+
+/**
+ * Call an upload session endpoint, retrying network failures with backoff
+ */
+async function uploadSessionRequest(
+  url: string,
+  init: RequestInit,
+  errorMessage: string
+): Promise<UploadSessionDTO> {
+  for (let attempt = 0; ; attempt++) {
+    let response: Response;
+    try {
+      response = await fetch(url, init);
+    } catch (error) {
+      if (attempt >= UPLOAD_MAX_RETRIES) {
+        throw error;
+      }
+      await new Promise(resolve => setTimeout(resolve, 500 * 2 ** attempt));
+      continue;
+    }
+
+    if (!response.ok) {
+      const errorText = await response.text();
+      throw new Error(`${errorMessage}: ${response.status} ${errorText}`);
+    }
+
+    return (await response.json()) as UploadSessionDTO;
+  }
+}
+
+/**
+ * Upload one image in chunks through a resumable upload session (ADMIN only)
+ *
+ * After a dropped connection only the unconfirmed chunk is re-sent
+ *
+ * @param file - Image file to upload
+ * @param goodId - ID of the good to attach the image to
+ * @param initData - Telegram WebApp initData string
+ * @returns Promise<string> - Uploaded image URL
+ * @throws Error if upload fails
+ */
+async function uploadImageResumable(
+  file: File,
+  goodId: number,
+  initData: string
+): Promise<string> {
+  const sessionUrl = `${API_BASE_URL}/uploads/sessions`;
+
+  let session = await uploadSessionRequest(sessionUrl, {
+    method: 'POST',
+    headers: {
+      'Authorization': await authHeader(initData),
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({ filename: file.name, size: file.size, good_id: goodId }),
+  }, 'Failed to start image upload');
+
+  let failures = 0;
+  while (session.offset < session.size) {
+    const chunk = file.slice(session.offset, session.offset + UPLOAD_CHUNK_SIZE);
+    let response: Response | null = null;
+    try {
+      response = await fetch(`${sessionUrl}/${session.id}`, {
+        method: 'PATCH',
+        headers: {
+          'Authorization': await authHeader(initData),
+          'Content-Type': 'application/offset+octet-stream',
+          'Upload-Offset': String(session.offset),
+        },
+        body: chunk,
+      });
+    } catch (error) {
+      if (++failures > UPLOAD_MAX_RETRIES) {
+        throw error;
+      }
+      await new Promise(resolve => setTimeout(resolve, 500 * 2 ** failures));
+    }
+
+    if (response && response.ok) {
+      session = (await response.json()) as UploadSessionDTO;
+      failures = 0;
+      continue;
+    }
+    if (response && response.status !== 409) {
+      const errorText = await response.text();
+      throw new Error(`Failed to upload image chunk: ${response.status} ${errorText}`);
+    }
+
+    // Connection dropped or offset mismatch - ask the server where to resume
+    session = await uploadSessionRequest(`${sessionUrl}/${session.id}`, {
+      method: 'GET',
+      headers: {
+        'Authorization': await authHeader(initData),
+      },
+    }, 'Failed to resume image upload');
+  }
+
+  session = await uploadSessionRequest(`${sessionUrl}/${session.id}/finalize`, {
+    method: 'POST',
+    headers: {
+      'Authorization': await authHeader(initData),
+    },
+  }, 'Failed to finalize image upload');
+
+  return session.image_url as string;
+}
+
 /**
  * Add images to an existing good (ADMIN only)
  *
+ * Images are uploaded one by one in resumable chunks
+ *
  * @param goodId - ID of the good to add images to
  * @param files - Array of image files to upload
  * @param initData - Telegram WebApp initData string
@@ -212,26 +445,11 @@ export async function addGoodImages(
   files: File[],
   initData: string
 ): Promise<string[]> {
-  const formData = new FormData();
-  files.forEach(file => {
-    formData.append('images', file);
-  });
-
-  const response = await fetch(`${API_BASE_URL}/goods/${goodId}/images`, {
-    method: 'POST',
-    headers: {
-      'Authorization': `tma ${initData}`,
-    },
-    body: formData,
-  });
-
-  if (!response.ok) {
-    const errorText = await response.text();
-    throw new Error(`Failed to add images to good: ${response.status} ${errorText}`);
+  const imageUrls: string[] = [];
+  for (const file of files) {
+    imageUrls.push(await uploadImageResumable(file, goodId, initData));
   }
-
-  const data = await response.json();
-  return data.imageUrls;
+  return imageUrls;
 }
 
 /**
@@ -268,7 +486,7 @@ export async function fetchAllGoods(initData: string): Promise<GoodDTO[]> {
   const response = await fetch(`${API_BASE_URL}/goods/all`, {
     method: 'GET',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
   });
@@ -297,7 +515,7 @@ export async function deleteGood(
   const response = await fetch(`${API_BASE_URL}/goods/${goodId}`, {
     method: 'DELETE',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
   });
@@ -323,7 +541,7 @@ export async function blockGood(
   const response = await fetch(`${API_BASE_URL}/goods/${goodId}/block`, {
     method: 'PUT',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
   });
@@ -352,7 +570,7 @@ export async function activateGood(
   const response = await fetch(`${API_BASE_URL}/goods/${goodId}/activate`, {
     method: 'PUT',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
   });
@@ -400,7 +618,7 @@ export async function fetchAllPromoBanners(initData: string): Promise<PromoBanne
   const response = await fetch(`${API_BASE_URL}/promo/all`, {
     method: 'GET',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
   });
@@ -432,7 +650,7 @@ export async function createPromoBanner(
   const response = await fetch(`${API_BASE_URL}/promo`, {
     method: 'POST',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
     },
     body: formData,
   });
@@ -465,7 +683,7 @@ export async function deletePromoBanner(
   const response = await fetch(url, {
     method: 'DELETE',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
       'Cache-Control': 'no-cache',
     },
@@ -497,7 +715,7 @@ export async function blockPromoBanner(
   const response = await fetch(`${API_BASE_URL}/promo/${bannerId}/block`, {
     method: 'PUT',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
   });
@@ -526,7 +744,7 @@ export async function activatePromoBanner(
   const response = await fetch(`${API_BASE_URL}/promo/${bannerId}/activate`, {
     method: 'PUT',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
   });
@@ -561,7 +779,7 @@ export async function updatePromoBannerLink(
   const response = await fetch(url, {
     method: 'PUT',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
   });
@@ -613,7 +831,7 @@ export async function createShopAddress(
   const response = await fetch(`${API_BASE_URL}/shop/addresses`, {
     method: 'POST',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
     body: JSON.stringify({ address }),
@@ -645,7 +863,7 @@ export async function updateShopAddress(
   const response = await fetch(`${API_BASE_URL}/shop/addresses/${addressId}`, {
     method: 'PUT',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
     body: JSON.stringify({ address }),
@@ -675,7 +893,7 @@ export async function deleteShopAddress(
   const response = await fetch(`${API_BASE_URL}/shop/addresses/${addressId}`, {
     method: 'DELETE',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
   });
@@ -703,7 +921,7 @@ export async function reorderGoodImages(
   const response = await fetch(`${API_BASE_URL}/goods/${goodId}/images/reorder`, {
     method: 'PUT',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
     body: JSON.stringify({ imageUrls }),
@@ -735,7 +953,7 @@ export async function deleteGoodImage(
   const response = await fetch(`${API_BASE_URL}/goods/${goodId}/images?image_url=${encodeURIComponent(imageUrl)}`, {
     method: 'DELETE',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
   });
@@ -780,7 +998,7 @@ export async function fetchAllCategories(initData: string): Promise<CategoryDTO[
   const response = await fetch(`${API_BASE_URL}/categories/all`, {
     method: 'GET',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
   });
@@ -809,7 +1027,7 @@ export async function createCategory(
   const response = await fetch(`${API_BASE_URL}/categories`, {
     method: 'POST',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
     body: JSON.stringify({ title }),
@@ -841,7 +1059,7 @@ export async function updateCategory(
   const response = await fetch(`${API_BASE_URL}/categories/${categoryId}`, {
     method: 'PUT',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
     body: JSON.stringify({ title }),
@@ -871,7 +1089,7 @@ export async function deleteCategory(
   const response = await fetch(`${API_BASE_URL}/categories/${categoryId}`, {
     method: 'DELETE',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
   });
@@ -897,7 +1115,7 @@ export async function updateUserMode(
   const response = await fetch(`${API_BASE_URL}/users/me/mode`, {
     method: 'PUT',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
     body: JSON.stringify({ mode }),
@@ -908,6 +1126,9 @@ export async function updateUserMode(
     throw new Error(`Failed to update user mode: ${response.status} ${errorText}`);
   }
 
+  // Server revokes session tokens when the mode changes
+  session = null;
+
   const data = await response.json();
   return data as UserInfo;
 }
@@ -927,7 +1148,7 @@ export async function updateUserPhone(
   const response = await fetch(`${API_BASE_URL}/users/me/phone`, {
     method: 'PUT',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
     body: JSON.stringify({ phone }),
@@ -953,7 +1174,7 @@ export async function fetchSettings(initData: string): Promise<Setting[]> {
   const response = await fetch(`${API_BASE_URL}/users/settings`, {
     method: 'GET',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
   });
@@ -984,7 +1205,7 @@ export async function upsertSetting(
   const response = await fetch(`${API_BASE_URL}/users/settings`, {
     method: 'POST',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
     body: JSON.stringify({ type, value }),
@@ -1014,7 +1235,7 @@ export async function deleteSetting(
   const response = await fetch(`${API_BASE_URL}/users/settings/${type}`, {
     method: 'DELETE',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
   });
@@ -1044,6 +1265,7 @@ export interface CartItemDTO {
   good_name: string;
   count: number;
   price: number;
+  line_total?: number | null;
 }
 
 /**
@@ -1071,12 +1293,16 @@ export interface OrderDTO {
   changeuser: number | null;
   delivery_type: string;
   delivery_address: string;
+  total?: number | null;
   cart_items: CartItemDTO[];
 }
 
 /**
  * Create a new order
  *
+ * Network failures are retried with the same Idempotency-Key, so a retry
+ * of a request that actually reached the backend doesn't create a second order.
+ *
  * @param orderData - Order data to create
  * @param initData - Telegram WebApp initData string
  * @returns Promise<OrderDTO> - Created order data
@@ -1086,14 +1312,29 @@ export async function createOrder(
   orderData: OrderRequest,
   initData: string
 ): Promise<OrderDTO> {
-  const response = await fetch(`${API_BASE_URL}/orders`, {
-    method: 'POST',
-    headers: {
-      'Authorization': `tma ${initData}`,
-      'Content-Type': 'application/json',
-    },
-    body: JSON.stringify(orderData),
-  });
+  const idempotencyKey = crypto.randomUUID();
+  const maxAttempts = 3;
+  let response: Response;
+
+  for (let attempt = 1; ; attempt++) {
+    try {
+      response = await fetch(`${API_BASE_URL}/orders`, {
+        method: 'POST',
+        headers: {
+          'Authorization': await authHeader(initData),
+          'Content-Type': 'application/json',
+          'Idempotency-Key': idempotencyKey,
+        },
+        body: JSON.stringify(orderData),
+      });
+      break;
+    } catch (error) {
+      if (attempt >= maxAttempts) {
+        throw error;
+      }
+      await new Promise(resolve => setTimeout(resolve, 1000 * attempt));
+    }
+  }
 
   if (!response.ok) {
     const errorText = await response.text();
@@ -1115,7 +1356,7 @@ export async function fetchMyOrders(initData: string): Promise<OrderDTO[]> {
   const response = await fetch(`${API_BASE_URL}/orders/my`, {
     method: 'GET',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
   });
@@ -1140,7 +1381,7 @@ export async function fetchAllOrders(initData: string): Promise<OrderDTO[]> {
   const response = await fetch(`${API_BASE_URL}/orders`, {
     method: 'GET',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
   });
@@ -1154,6 +1395,114 @@ export async function fetchAllOrders(initData: string): Promise<OrderDTO[]> {
   return data as OrderDTO[];
 }
 
+export type OrderEventType = 'order.created' | 'order.updated';
+
+/**
+ * Subscribe to the admin order feed (ADMIN only)
+ *
+ * Reads Server-Sent Events from /orders/events with fetch (EventSource can't
+ * send the Authorization header) and reconnects with Last-Event-ID, so events
+ * missed while disconnected are delivered after reconnecting.
+ *
+ * @param initData - Telegram WebApp initData string
+ * @param onEvent - Called with each created/updated order
+ * @param onReset - Called when too many events were missed and the list should be reloaded
+ * @returns Function that closes the subscription
+ */
+export function subscribeOrderEvents(
+  initData: string,
+  onEvent: (type: OrderEventType, order: OrderDTO) => void,
+  onReset: () => void
+): () => void {
+  const controller = new AbortController();
+  let lastEventId: string | null = null;
+  let retryMs = 3000;
+
+  const handleEvent = (id: string | null, type: string, data: string) => {
+    if (id !== null) {
+      lastEventId = id;
+    }
+    if (type === 'reset') {
+      onReset();
+    } else if (type === 'order.created' || type === 'order.updated') {
+      onEvent(type, JSON.parse(data) as OrderDTO);
+    }
+  };
+
+  const connect = async () => {
+    const headers: Record<string, string> = {
+      'Authorization': await authHeader(initData),
+      'Accept': 'text/event-stream',
+    };
+    if (lastEventId !== null) {
+      headers['Last-Event-ID'] = lastEventId;
+    }
+
+    const response = await fetch(`${API_BASE_URL}/orders/events`, {
+      method: 'GET',
+      headers,
+      signal: controller.signal,
+    });
+
+    if (!response.ok || !response.body) {
+      throw new Error(`Failed to subscribe to order events: ${response.status}`);
+    }
+
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    let id: string | null = null;
+    let type = 'message';
+    let data = '';
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) {
+        return;
+      }
+
+      buffer += value;
+      const lines = buffer.split('\n');
+      buffer = lines.pop() ?? '';
+
+      for (const line of lines) {
+        if (line === '') {
+          if (data || type !== 'message') {
+            handleEvent(id, type, data);
+          }
+          id = null;
+          type = 'message';
+          data = '';
+        } else if (line.startsWith('id: ')) {
+          id = line.slice(4);
+        } else if (line.startsWith('event: ')) {
+          type = line.slice(7);
+        } else if (line.startsWith('data: ')) {
+          data += line.slice(6);
+        } else if (line.startsWith('retry: ')) {
+          retryMs = Number(line.slice(7)) || retryMs;
+        }
+      }
+    }
+  };
+
+  const run = async () => {
+    while (!controller.signal.aborted) {
+      try {
+        await connect();
+      } catch (error) {
+        if (controller.signal.aborted) {
+          return;
+        }
+        console.error('Order events stream failed:', error);
+      }
+      await new Promise(resolve => setTimeout(resolve, retryMs));
+    }
+  };
+
+  run();
+  return () => controller.abort();
+}
+
 /**
  * Update order status (ADMIN only)
  *
@@ -1172,7 +1521,7 @@ export async function updateOrderStatus(
   const currentOrderResponse = await fetch(`${API_BASE_URL}/orders/${orderId}`, {
     method: 'GET',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
   });
@@ -1187,7 +1536,7 @@ export async function updateOrderStatus(
   const response = await fetch(`${API_BASE_URL}/orders/${orderId}`, {
     method: 'PUT',
     headers: {
-      'Authorization': `tma ${initData}`,
+      'Authorization': await authHeader(initData),
       'Content-Type': 'application/json',
     },
     body: JSON.stringify({
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import AppHeader from './AppHeader';
-import { fetchAllOrders, OrderDTO, fetchAllGoods, GoodDTO, updateOrderStatus } from '../api/client';
+import { fetchAllOrders, OrderDTO, fetchAllGoods, GoodDTO, updateOrderStatus, subscribeOrderEvents } from '../api/client';
 
 interface AdminOrdersProps {
   isOpen: boolean;
@@ -67,6 +67,33 @@ const AdminOrders: React.FC<AdminOrdersProps> = ({
     loadData();
   }, [isOpen, initData]);
 
+  // Live updates: new orders and status changes are pushed by the backend
+  useEffect(() => {
+    if (!isOpen || !initData) return;
+
+    return subscribeOrderEvents(
+      initData,
+      (type, order) => {
+        setOrders(prev => {
+          if (type === 'order.created' && !prev.some(o => o.id === order.id)) {
+            return [order, ...prev];
+          }
+          return prev.map(o => (o.id === order.id ? order : o));
+        });
+      },
+      () => {
+        // Too many events missed - reload the whole list
+        fetchAllOrders(initData)
+          .then(setOrders)
+          .catch(err => console.error('Failed to reload orders:', err));
+      }
+    );
+  }, [isOpen, initData]);
+
+  const applyUpdatedOrder = (updated: OrderDTO) => {
+    setOrders(prev => prev.map(o => (o.id === updated.id ? updated : o)));
+  };
+
   const formatDate = (dateString: string) => {
     const date = new Date(dateString);
     const day = String(date.getDate()).padStart(2, '0');
@@ -147,10 +174,8 @@ const AdminOrders: React.FC<AdminOrdersProps> = ({
     }
 
     try {
-      await updateOrderStatus(orderId, 'CANCELLED', initData);
-      // Reload orders
-      const ordersData = await fetchAllOrders(initData);
-      setOrders(ordersData);
+      const updated = await updateOrderStatus(orderId, 'CANCELLED', initData);
+      applyUpdatedOrder(updated);
       alert('Заказ отменён');
     } catch (err) {
       console.error('Failed to cancel order:', err);
@@ -171,10 +196,8 @@ const AdminOrders: React.FC<AdminOrdersProps> = ({
     }
 
     try {
-      await updateOrderStatus(statusPopupOrderId, selectedStatus, initData);
-      // Reload orders
-      const ordersData = await fetchAllOrders(initData);
-      setOrders(ordersData);
+      const updated = await updateOrderStatus(statusPopupOrderId, selectedStatus, initData);
+      applyUpdatedOrder(updated);
       setStatusPopupOrderId(null);
       alert('Статус заказа изменён');
     } catch (err) {
@@ -286,7 +309,7 @@ const AdminOrders: React.FC<AdminOrdersProps> = ({
                     <div className="mt-3 pt-3 border-t border-gray-200 flex justify-between items-center">
                       <div className="font-semibold">Итого:</div>
                       <div className="text-lg font-bold text-teal">
-                        {order.cart_items.reduce((sum, item) => sum + (item.count * item.price), 0)} руб.
+                        {order.total ?? order.cart_items.reduce((sum, item) => sum + (item.count * item.price), 0)} руб.
                       </div>
                     </div>
 
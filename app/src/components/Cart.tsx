@@ -4,7 +4,7 @@ import CartItem from './CartItem';
 import { useTelegramWebApp } from '../hooks/useTelegramWebApp';
 import { CartItemData } from '../App';
 import { useLockBodyScroll } from '../hooks/useLockBodyScroll';
-import { createOrder, OrderRequest, fetchUserInfo } from '../api/client';
+import { createOrder, OrderRequest, fetchUserInfo, waitForUserPhone } from '../api/client';
 
 interface CartProps {
   cartItems: CartItemData[];
@@ -114,38 +114,28 @@ const Cart: React.FC<CartProps> = ({
             'Сейчас откроется чат с ботом. Пожалуйста, поделитесь своим контактом, нажав на кнопку.'
           );
           
-          // Запускаем проверку обновления данных на верхнем уровне
-          let attempts = 0;
-          const maxAttempts = 15; // 15 попыток * 1 секунду = 15 секунд
-          
-          const checkInterval = setInterval(async () => {
-            attempts++;
-            
-            try {
-              // Проверяем, сохранился ли телефон
-              const updatedUserInfo = await fetchUserInfo(initData);
-              
+          // Ждем, пока бот сохранит телефон (сервер держит запрос до 15 секунд)
+          waitForUserPhone(initData, 15)
+            .then((updatedUserInfo) => {
               if (updatedUserInfo.phone) {
-                clearInterval(checkInterval);
                 // Haptic feedback перед показом сообщения
                 webApp?.HapticFeedback.notificationOccurred('success');
                 // Показываем успешное сообщение на верхнем уровне
                 webApp?.showAlert(
                   '✅ Номер телефона получен! Теперь нажмите "Заказать" еще раз для оформления заказа.'
                 );
-              } else if (attempts >= maxAttempts) {
-                clearInterval(checkInterval);
+              } else {
                 webApp?.showAlert(
                   'Не удалось получить номер телефона. Пожалуйста, убедитесь, что вы поделились своим контактом в чате с ботом, затем нажмите "Заказать" еще раз.'
                 );
               }
-            } catch (error) {
+            })
+            .catch((error) => {
               console.error('Failed to check updated user info:', error);
-              if (attempts >= maxAttempts) {
-                clearInterval(checkInterval);
-              }
-            }
-          }, 1000); // Проверяем каждую секунду
+              webApp?.showAlert(
+                'Не удалось проверить номер телефона. Если вы поделились контактом в чате с ботом, нажмите "Заказать" еще раз.'
+              );
+            });
         } else {
           webApp?.showAlert('Ваш Telegram не поддерживает запрос контакта. Обновите приложение.');
         }
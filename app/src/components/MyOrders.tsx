@@ -245,7 +245,7 @@ const MyOrders: React.FC<MyOrdersProps> = ({
                     <div className="mt-3 pt-3 border-t border-gray-200 flex justify-between items-center">
                       <div className="font-semibold">Итого:</div>
                       <div className="text-lg font-bold text-teal">
-                        {order.cart_items.reduce((sum, item) => sum + (item.count * item.price), 0)} руб.
+                        {order.total ?? order.cart_items.reduce((sum, item) => sum + (item.count * item.price), 0)} руб.
                       </div>
                     </div>
                   </div>
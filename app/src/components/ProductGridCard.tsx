@@ -1,5 +1,6 @@
 import React, { useState } from 'react';
 import { Product } from './ProductGrid';
+import { resizedImageSrcSet } from '../api/client';
 
 interface ProductGridCardProps {
   product: Product;
@@ -73,6 +74,7 @@ const ProductGridCard: React.FC<ProductGridCardProps> = ({ product, onClick, isP
       <div className="relative rounded-[20px] overflow-hidden h-[200px]">
         <img
           src={images[currentImageIndex]}
+          srcSet={resizedImageSrcSet(images[currentImageIndex])}
           alt={product.alt}
           className="w-full h-full object-cover bg-gray-100"
           loading={isPriority ? 'eager' : 'lazy'}